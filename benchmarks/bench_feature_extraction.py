@@ -0,0 +1,66 @@
+"""Сравнение извлечения ORB одним вызовом и по ячейкам в пуле потоков
+
+Пример:
+    python benchmarks/bench_feature_extraction.py --dataset /data/MH_05_difficult/mav0 --threads 1 2 4 8
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "python"))
+
+from dataset_index import DatasetIndex  # noqa: E402
+from tiled_orb import TiledORBExtractor  # noqa: E402
+
+
+def coverage(keypoints, shape, cells=(8, 6)):
+    """Доля занятых ячеек сетки - грубая мера равномерности распределения"""
+    if not keypoints:
+        return 0.0
+    points = np.float32([kp.pt for kp in keypoints])
+    cx = np.minimum((points[:, 0] / shape[1] * cells[0]).astype(int), cells[0] - 1)
+    cy = np.minimum((points[:, 1] / shape[0] * cells[1]).astype(int), cells[1] - 1)
+    return len(np.unique(cy * cells[0] + cx)) / (cells[0] * cells[1])
+
+
+def run(extract, frames):
+    start = time.perf_counter()
+    total = 0
+    cover = []
+    for frame in frames:
+        keypoints, _ = extract(frame)
+        total += len(keypoints)
+        cover.append(coverage(keypoints, frame.shape))
+    elapsed = (time.perf_counter() - start) / len(frames)
+    return elapsed, total / len(frames), float(np.mean(cover))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tiled ORB extraction benchmark')
+    parser.add_argument('--dataset', type=str, required=True, help='Path to EuRoC mav0 folder')
+    parser.add_argument('--frames', type=int, default=50, help='Frames to process')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4], help='Thread counts')
+    parser.add_argument('--grid', type=int, nargs=2, default=[4, 3], help='Cell grid (cols rows)')
+    args = parser.parse_args()
+
+    index = DatasetIndex(Path(args.dataset) / "cam0")
+    frames = [index.read(i) for i in range(min(args.frames, len(index)))]
+
+    orb = cv2.ORB_create(nfeatures=2000, scaleFactor=1.2, nlevels=8)
+    elapsed, count, cover = run(lambda image: orb.detectAndCompute(image, None), frames)
+    print(f"{'режим':>16} {'мс/кадр':>10} {'точек':>8} {'покрытие':>9}")
+    print(f"{'один вызов':>16} {elapsed * 1e3:>10.1f} {count:>8.0f} {cover:>9.2f}")
+
+    for threads in args.threads:
+        extractor = TiledORBExtractor(grid=tuple(args.grid), threads=threads)
+        elapsed, count, cover = run(extractor.detect_and_compute, frames)
+        extractor.close()
+        print(f"{f'ячейки x{threads}':>16} {elapsed * 1e3:>10.1f} {count:>8.0f} {cover:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Сравнение синхронного и опережающего чтения кадров EuRoC с трекингом MonoSLAM
+
+Пример:
+    python benchmarks/bench_frame_reader.py --dataset /data/MH_05_difficult/mav0 --frames 300
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "python"))
+
+from euroc_processor import EurocDatasetProcessor  # noqa: E402
+from frame_reader import PrefetchFrameReader  # noqa: E402
+from real_slam_processor import MonoSLAM  # noqa: E402
+
+
+def run_sync(processor, frames):
+    slam = MonoSLAM()
+    slam.camera_matrix = processor.get_camera_matrix()
+    start = time.perf_counter()
+    for frame_idx in range(frames):
+        frame, _ = processor._load_frame(frame_idx)
+        slam.process_frame(frame, frame_idx)
+    return time.perf_counter() - start
+
+
+def run_prefetch(processor, frames, prefetch, workers):
+    slam = MonoSLAM()
+    slam.camera_matrix = processor.get_camera_matrix()
+    start = time.perf_counter()
+    reader = PrefetchFrameReader(processor._load_frame, range(frames),
+                                 prefetch=prefetch, workers=workers)
+    for frame_idx, (frame, _) in reader:
+        slam.process_frame(frame, frame_idx)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Frame reader benchmark')
+    parser.add_argument('--dataset', type=str, required=True, help='Path to EuRoC mav0 folder')
+    parser.add_argument('--frames', type=int, default=300, help='Frames to process')
+    parser.add_argument('--prefetch', type=int, default=8, help='Frames decoded ahead')
+    parser.add_argument('--workers', type=int, default=4, help='Decode threads')
+    args = parser.parse_args()
+
+    processor = EurocDatasetProcessor(args.dataset)
+    # Кэш отключен, чтобы каждый прогон честно декодировал PNG
+    processor.cam0_index.cache_size = 0
+    frames = min(args.frames, processor.get_total_frames())
+
+    sync_time = run_sync(processor, frames)
+    prefetch_time = run_prefetch(processor, frames, args.prefetch, args.workers)
+
+    print(f"Кадров: {frames}")
+    print(f"Синхронно:   {sync_time:.3f} с ({frames / sync_time:.1f} FPS)")
+    print(f"С опережением: {prefetch_time:.3f} с ({frames / prefetch_time:.1f} FPS)")
+    print(f"Ускорение: {sync_time / prefetch_time:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
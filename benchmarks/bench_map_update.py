@@ -0,0 +1,56 @@
+"""Время обратной проекции точек карты: поточечная против пакетной (MonoSLAM.back_project)
+
+Пример:
+    python benchmarks/bench_map_update.py --points 50 500 2000
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "python"))
+
+from real_slam_processor import MonoSLAM  # noqa: E402
+
+
+def project_per_point(camera_matrix, pose, points_2d, depth=5.0):
+    """Прежняя реализация: обращение матрицы и умножение на каждую точку"""
+    points_3d = []
+    for point_2d in points_2d:
+        point_normalized = np.linalg.inv(camera_matrix) @ np.array([point_2d[0], point_2d[1], 1.0])
+        point_world = pose @ np.append(point_normalized * depth, 1.0)
+        points_3d.append(point_world[:3])
+    return np.asarray(points_3d)
+
+
+def time_call(fn, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Map update microbenchmark')
+    parser.add_argument('--points', type=int, nargs='+', default=[50, 500, 2000],
+                        help='New points per frame')
+    parser.add_argument('--repeats', type=int, default=200, help='Repeats per measurement')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    slam = MonoSLAM()
+    slam.current_pose[:3, 3] = [1.0, 2.0, 3.0]
+
+    print(f"{'точек':>8} {'до, мкс':>12} {'после, мкс':>12} {'ускорение':>10}")
+    for count in args.points:
+        points_2d = rng.uniform([0, 0], [752, 480], size=(count, 2))
+        before = time_call(lambda: project_per_point(slam.camera_matrix, slam.current_pose, points_2d),
+                           args.repeats)
+        after = time_call(lambda: slam.back_project(points_2d, 5.0), args.repeats)
+        print(f"{count:>8} {before * 1e6:>12.1f} {after * 1e6:>12.1f} {before / after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
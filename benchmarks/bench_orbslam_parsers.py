@@ -0,0 +1,119 @@
+"""Загрузка траектории и PLY облака ORB-SLAM3: построчный разбор против NumPy загрузчиков
+
+Пример:
+    python benchmarks/bench_orbslam_parsers.py --points 1000000 --poses 20000
+"""
+import argparse
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "python"))
+
+from orbslam_wrapper import ORBSLAMWrapper  # noqa: E402
+from results_stream import POINT_DTYPE  # noqa: E402
+
+
+def parse_trajectory_per_line(file_path):
+    """Прежняя реализация: словарь на каждую строку"""
+    trajectory = []
+    with open(file_path, 'r') as f:
+        for line in f:
+            if line.startswith('#'):
+                continue
+            values = list(map(float, line.strip().split()))
+            if len(values) >= 8:
+                trajectory.append({
+                    'timestamp': values[0],
+                    'x': values[1], 'y': values[2], 'z': values[3],
+                    'qx': values[4], 'qy': values[5], 'qz': values[6], 'qw': values[7],
+                    'frame_id': len(trajectory)
+                })
+    return trajectory
+
+
+def parse_point_cloud_per_line(file_path):
+    """Прежняя реализация: readlines и словарь на каждую точку (только ASCII)"""
+    points = []
+    with open(file_path, 'r') as f:
+        lines = f.readlines()
+    data_start = 0
+    for i, line in enumerate(lines):
+        if "end_header" in line:
+            data_start = i + 1
+            break
+    for line in lines[data_start:]:
+        values = list(map(float, line.strip().split()))
+        if len(values) >= 6:
+            points.append({
+                'x': values[0], 'y': values[1], 'z': values[2],
+                'r': int(values[3]), 'g': int(values[4]), 'b': int(values[5])
+            })
+    return points
+
+
+def write_files(directory: Path, points: int, poses: int, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    trajectory = np.column_stack([np.arange(poses) / 20.0, rng.normal(size=(poses, 3)),
+                                  rng.normal(size=(poses, 4))])
+    paths = {'trajectory': directory / "trajectory.txt"}
+    np.savetxt(paths['trajectory'], trajectory, fmt='%.9f', header='timestamp x y z qx qy qz qw')
+
+    cloud = np.zeros(points, dtype=POINT_DTYPE)
+    for name in ('x', 'y', 'z'):
+        cloud[name] = rng.normal(size=points)
+    for name in ('r', 'g', 'b'):
+        cloud[name] = rng.integers(0, 256, points)
+    header = ("ply\nformat {}\nelement vertex {}\nproperty float x\nproperty float y\nproperty float z\n"
+              "property uchar red\nproperty uchar green\nproperty uchar blue\nend_header\n")
+    paths['ascii'] = directory / "cloud_ascii.ply"
+    with open(paths['ascii'], 'w') as f:
+        f.write(header.format('ascii 1.0', points))
+        np.savetxt(f, np.column_stack([cloud[name] for name in POINT_DTYPE.names]),
+                   fmt='%.6f %.6f %.6f %d %d %d')
+    paths['binary'] = directory / "cloud_binary.ply"
+    with open(paths['binary'], 'wb') as f:
+        f.write(header.format('binary_little_endian 1.0', points).encode('ascii'))
+        f.write(cloud.tobytes())
+    return paths
+
+
+def measure(function, *args):
+    """Время и пик выделенной Python памяти одного вызова"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ORB-SLAM3 output parser benchmark')
+    parser.add_argument('--points', type=int, default=1000000, help='Points in the PLY cloud')
+    parser.add_argument('--poses', type=int, default=20000, help='Poses in the trajectory')
+    args = parser.parse_args()
+
+    wrapper = ORBSLAMWrapper(None, None)
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_files(Path(directory), args.points, args.poses)
+        cases = (
+            ('Траектория, построчно', parse_trajectory_per_line, paths['trajectory']),
+            ('Траектория, loadtxt', wrapper._parse_trajectory, paths['trajectory']),
+            ('PLY ASCII, построчно', parse_point_cloud_per_line, paths['ascii']),
+            ('PLY ASCII, fromstring', wrapper._parse_point_cloud, paths['ascii']),
+            ('PLY binary, memmap', wrapper._parse_point_cloud, paths['binary'])
+        )
+        print(f"Поз: {args.poses}, точек: {args.points}")
+        for name, function, path in cases:
+            result, elapsed, peak = measure(function, path)
+            print(f"{name:<24} {elapsed:8.3f} с, пик памяти {peak:8.1f} МБ, записей {len(result)}")
+
+
+if __name__ == "__main__":
+    main()
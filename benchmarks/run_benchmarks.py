@@ -0,0 +1,224 @@
+"""Воспроизводимый прогон SLAM на синтетических последовательностях со сравнением с базой
+
+Каждый сценарий идет в отдельном процессе (spawn), чтобы пиковая память
+(ru_maxrss) относилась только к нему. Отчет: кадры/с, перцентили стадий
+StageProfiler, пиковый RSS, размер выходных файлов и ATE относительно
+ground truth синтетической последовательности.
+
+Пример:
+    python benchmarks/run_benchmarks.py --save-baseline benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --baseline benchmarks/baseline.json
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "python"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from synthetic import ensure_sequences  # noqa: E402
+
+CASES = ('monoslam_orb', 'monoslam_klt', 'euroc', 'video')
+
+# Стадии короче этого порога (мс) не сравниваются - там доминирует шум таймера
+MIN_STAGE_MS = 5.0
+
+
+def output_size(output_path: Path) -> int:
+    """Суммарный размер JSON и файлов потока результатов"""
+    return sum(path.stat().st_size for path in output_path.parent.glob(output_path.stem + ".*"))
+
+
+def trajectory_ate(trajectory, paths: dict, timestamps) -> float:
+    """RMSE ATE траектории (позы сопоставляются с ground truth по меткам кадров)"""
+    from trajectory_eval import evaluate_trajectory, find_groundtruth, load_groundtruth
+
+    evaluation = evaluate_trajectory(trajectory, load_groundtruth(find_groundtruth(paths['euroc'])), timestamps)
+    return evaluation['ate']['rmse'] if 'ate' in evaluation else None
+
+
+def run_monoslam(paths: dict, work_dir: Path, frontend: str) -> dict:
+    from dataset_index import DatasetIndex
+    from real_slam_processor import MonoSLAM
+
+    # Кадры декодируются заранее: замеряется только SLAM
+    index = DatasetIndex(paths['euroc'] / "cam0", cache_size=0)
+    frames = [index.read(i) for i in range(len(index))]
+    slam = MonoSLAM(frontend=frontend)
+    slam.profiler.enabled = True
+    start = time.perf_counter()
+    for frame_id, frame in enumerate(frames):
+        slam.process_frame(frame, frame_id)
+    elapsed = time.perf_counter() - start
+    slam.close()
+    return {'frames': len(frames), 'elapsed': elapsed, 'stages': slam.profiler.summary(),
+            'points': slam.point_cloud.active_count, 'output_bytes': 0,
+            'ate_rmse': trajectory_ate(slam.trajectory.data, paths, index.timestamps)}
+
+
+def run_euroc(paths: dict, work_dir: Path) -> dict:
+    from euroc_processor import EurocDatasetProcessor
+
+    output_path = work_dir / "euroc_results.json"
+    processor = EurocDatasetProcessor(paths['euroc'])
+    start = time.perf_counter()
+    results = processor.process_sequence(output_path=output_path, profile=True)
+    elapsed = time.perf_counter() - start
+    return {'frames': results['processed_frames'], 'elapsed': elapsed,
+            'stages': results['profile']['stages'], 'points': len(results['point_cloud']),
+            'output_bytes': output_size(output_path),
+            'ate_rmse': results['evaluation']['ate']['rmse'] if 'ate' in results['evaluation'] else None}
+
+
+def run_video(paths: dict, work_dir: Path) -> dict:
+    from dataset_index import DatasetIndex
+    from real_slam_processor import SLAMProcessor
+
+    output_path = work_dir / "video_results.json"
+    processor = SLAMProcessor()
+    start = time.perf_counter()
+    results = processor.process_video(str(paths['video']), str(output_path), checkpoint_interval=0,
+                                      profile=True)
+    elapsed = time.perf_counter() - start
+    # Кадры видео совпадают с кадрами EuRoC копии, метки берутся оттуда
+    timestamps = DatasetIndex(paths['euroc'] / "cam0", cache_size=0).timestamps
+    return {'frames': results['processed_frames'], 'elapsed': elapsed,
+            'stages': results['profile']['stages'], 'points': len(results['point_cloud']),
+            'output_bytes': output_size(output_path),
+            'ate_rmse': trajectory_ate(results['trajectory'], paths, timestamps)}
+
+
+def run_case(case: str, paths: dict, work_dir: str) -> dict:
+    """Один сценарий в рабочем процессе; вывод процессоров подавляется"""
+    work_dir = Path(work_dir)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        if case == 'euroc':
+            metrics = run_euroc(paths, work_dir)
+        elif case == 'video':
+            metrics = run_video(paths, work_dir)
+        else:
+            metrics = run_monoslam(paths, work_dir, case.split('_')[1])
+    metrics['fps'] = metrics['frames'] / metrics['elapsed'] if metrics['elapsed'] > 0 else 0.0
+    # ru_maxrss в Linux - КиБ, в macOS - байты
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    metrics['peak_rss_mb'] = peak / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10)
+    return metrics
+
+
+def run_benchmarks(cases, frames: int, seed: int, data_dir: str) -> dict:
+    paths = ensure_sequences(data_dir, frames, seed)
+    report = {
+        'frames': frames,
+        'seed': seed,
+        'machine': {'platform': platform.platform(), 'python': platform.python_version(),
+                    'cpus': os.cpu_count()},
+        'cases': {}
+    }
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as work_dir:
+        for case in cases:
+            case_dir = Path(work_dir) / case
+            case_dir.mkdir()
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                report['cases'][case] = pool.submit(run_case, case, paths, str(case_dir)).result()
+            metrics = report['cases'][case]
+            print(f"{case}: {metrics['fps']:.1f} кадр/с, {metrics['peak_rss_mb']:.0f} МБ")
+    return report
+
+
+def compare(report: dict, baseline: dict, tolerance: float, stage_tolerance: float,
+            ate_tolerance: float) -> list:
+    """Регрессии относительно базы: падение FPS, рост памяти, выхода, ATE и p95 стадий"""
+    regressions = []
+    for case, current in report['cases'].items():
+        base = baseline.get('cases', {}).get(case)
+        if base is None:
+            continue
+        if current['fps'] < base['fps'] * (1 - tolerance):
+            regressions.append(f"{case}: fps {current['fps']:.1f} < {base['fps']:.1f}")
+        if current['peak_rss_mb'] > base['peak_rss_mb'] * (1 + tolerance):
+            regressions.append(f"{case}: peak RSS {current['peak_rss_mb']:.0f} > {base['peak_rss_mb']:.0f} MB")
+        if current['output_bytes'] > base['output_bytes'] * (1 + tolerance):
+            regressions.append(f"{case}: output {current['output_bytes']} > {base['output_bytes']} bytes")
+        if current.get('ate_rmse') is not None and base.get('ate_rmse') is not None \
+                and current['ate_rmse'] > base['ate_rmse'] * (1 + ate_tolerance):
+            regressions.append(f"{case}: ATE {current['ate_rmse']:.3f} > {base['ate_rmse']:.3f} m")
+        for stage, stats in current['stages'].items():
+            base_stats = base['stages'].get(stage)
+            if base_stats is None or base_stats['p95_ms'] < MIN_STAGE_MS:
+                continue
+            if stats['p95_ms'] > base_stats['p95_ms'] * (1 + stage_tolerance):
+                regressions.append(f"{case}/{stage}: p95 {stats['p95_ms']:.2f} > {base_stats['p95_ms']:.2f} ms")
+    return regressions
+
+
+def print_report(report: dict, baseline: dict = None):
+    print(f"\n{'Сценарий':<16}{'Кадр/с':>9}{'База':>9}{'RSS, МБ':>10}{'Выход, КБ':>12}{'Точек':>8}"
+          f"{'ATE, м':>9}")
+    for case, metrics in report['cases'].items():
+        base = (baseline or {}).get('cases', {}).get(case)
+        base_fps = f"{base['fps']:.1f}" if base else "-"
+        ate = f"{metrics['ate_rmse']:.3f}" if metrics.get('ate_rmse') is not None else "-"
+        print(f"{case:<16}{metrics['fps']:>9.1f}{base_fps:>9}{metrics['peak_rss_mb']:>10.0f}"
+              f"{metrics['output_bytes'] / 1024:>12.0f}{metrics['points']:>8}{ate:>9}")
+        slowest = sorted(metrics['stages'].items(), key=lambda item: -item[1]['total_ms'])[:4]
+        print("    " + ", ".join(f"{stage} p50 {stats['p50_ms']:.1f}/p95 {stats['p95_ms']:.1f} мс"
+                                  for stage, stats in slowest))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SLAM benchmark suite on synthetic sequences')
+    parser.add_argument('--cases', type=str, nargs='+', choices=CASES, default=list(CASES),
+                        help='Scenarios to run')
+    parser.add_argument('--frames', type=int, default=200, help='Frames in the synthetic sequence')
+    parser.add_argument('--seed', type=int, default=0, help='Texture and noise seed')
+    parser.add_argument('--data-dir', type=str,
+                        default=str(Path(tempfile.gettempdir()) / "hakslam_synthetic"),
+                        help='Where synthetic sequences are generated and cached')
+    parser.add_argument('--output', type=str, default=None, help='Write the report JSON here')
+    parser.add_argument('--baseline', type=str, default=None, help='Baseline report to compare against')
+    parser.add_argument('--save-baseline', type=str, default=None, help='Store this run as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='Allowed relative drop in FPS / growth in memory and output')
+    parser.add_argument('--stage-tolerance', type=float, default=0.3,
+                        help='Allowed relative growth of per-stage p95 latency')
+    parser.add_argument('--ate-tolerance', type=float, default=0.5,
+                        help='Allowed relative growth of ATE RMSE')
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.cases, args.frames, args.seed, args.data_dir)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('frames') != report['frames'] or baseline.get('seed') != report['seed']:
+            print("Внимание: база снята на другой последовательности")
+    print_report(report, baseline)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2)
+
+    if baseline:
+        regressions = compare(report, baseline, args.tolerance, args.stage_tolerance,
+                              args.ate_tolerance)
+        if regressions:
+            print("\nРегрессии:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nРегрессий нет")
+
+
+if __name__ == "__main__":
+    main()
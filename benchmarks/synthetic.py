@@ -0,0 +1,208 @@
+"""Детерминированные синтетические последовательности для бенчмарков
+
+Камера с известной траекторией летит по комнате из текстурированных
+плоскостей (пол, стены); кадры рендерятся трассировкой лучей до
+плоскостей и выборкой из текстуры. Одинаковые параметры дают
+побайтно одинаковые кадры.
+
+Пример:
+    python benchmarks/synthetic.py --output /tmp/synthetic --frames 200
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "python"))
+
+from se3 import matrix_to_quaternion  # noqa: E402
+
+# Внутренние параметры как у cam0 EuRoC, без дисторсии
+CAMERA_INTRINSICS = (458.654, 457.296, 367.215, 248.375)
+RESOLUTION = (752, 480)
+FRAME_RATE = 20.0
+START_TIMESTAMP_NS = 1403636579763555584
+
+# Плоскости комнаты: ось нормали, координата, оси текстуры, сдвиг в текстуре.
+# Камера смотрит вдоль +z, ось y направлена вниз
+PLANES = (
+    (1, 1.5, (0, 2), (0, 0)),       # пол
+    (1, -2.5, (0, 2), (300, 700)),   # потолок
+    (2, 14.0, (0, 1), (600, 100)),  # дальняя стена
+    (0, -5.0, (2, 1), (200, 500)),  # левая стена
+    (0, 5.0, (2, 1), (800, 900)),   # правая стена
+)
+TEXELS_PER_METER = 120.0
+
+
+def make_texture(seed: int = 0, size: int = 1024) -> np.ndarray:
+    """Текстура с мелким шумом и контрастными фигурами - материал для ORB и KLT"""
+    rng = np.random.default_rng(seed)
+    texture = cv2.GaussianBlur((rng.random((size, size)) * 255).astype(np.uint8), (0, 0), 1.5)
+    coarse = cv2.resize((rng.random((size // 32, size // 32)) * 120).astype(np.uint8), (size, size),
+                        interpolation=cv2.INTER_CUBIC)
+    texture = cv2.addWeighted(texture, 0.5, coarse, 0.5, 0)
+    for _ in range(400):
+        center = tuple(int(c) for c in rng.integers(0, size, 2))
+        color = int(rng.integers(0, 256))
+        if rng.random() < 0.5:
+            cv2.circle(texture, center, int(rng.integers(4, 30)), color, -1)
+        else:
+            corner = tuple(int(c) for c in np.add(center, rng.integers(8, 50, 2)))
+            cv2.rectangle(texture, center, corner, color, -1)
+    return texture
+
+
+def camera_matrix() -> np.ndarray:
+    fx, fy, cx, cy = CAMERA_INTRINSICS
+    return np.array([[fx, 0, cx], [0, fy, cy], [0, 0, 1]])
+
+
+def trajectory(frames: int) -> np.ndarray:
+    """Позы камера -> мир (N,4,4): плавный пролет вперед с покачиванием и рысканием"""
+    phase = np.linspace(0.0, 1.0, frames)
+    poses = np.tile(np.eye(4), (frames, 1, 1))
+    yaw = 0.2 * np.sin(2 * np.pi * phase)
+    pitch = 0.05 * np.sin(4 * np.pi * phase)
+    for pose, a, b in zip(poses, yaw, pitch):
+        ry = np.array([[np.cos(a), 0, np.sin(a)], [0, 1, 0], [-np.sin(a), 0, np.cos(a)]])
+        rx = np.array([[1, 0, 0], [0, np.cos(b), -np.sin(b)], [0, np.sin(b), np.cos(b)]])
+        pose[:3, :3] = ry @ rx
+    poses[:, 0, 3] = 1.5 * np.sin(2 * np.pi * phase)
+    poses[:, 1, 3] = 0.3 * np.sin(4 * np.pi * phase)
+    poses[:, 2, 3] = 6.0 * phase
+    return poses
+
+
+class PlaneRenderer:
+    """Рендер комнаты из плоскостей для заданной позы камеры"""
+
+    def __init__(self, texture: np.ndarray, width: int = RESOLUTION[0], height: int = RESOLUTION[1]):
+        self.texture = texture
+        self.width = width
+        self.height = height
+        u, v = np.meshgrid(np.arange(width, dtype=np.float64), np.arange(height, dtype=np.float64))
+        pixels = np.stack([u.ravel(), v.ravel(), np.ones(u.size)], axis=1)
+        # Лучи камеры считаются один раз, на кадр - только поворот
+        self.rays = pixels @ np.linalg.inv(camera_matrix()).T
+
+    def render(self, pose: np.ndarray, noise: np.random.Generator = None) -> np.ndarray:
+        rays = self.rays @ pose[:3, :3].T
+        origin = pose[:3, 3]
+        depth = np.full(len(rays), np.inf)
+        map_x = np.zeros(len(rays))
+        map_y = np.zeros(len(rays))
+        size = self.texture.shape[0]
+        for axis, offset, (a, b), (shift_x, shift_y) in PLANES:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                t = (offset - origin[axis]) / rays[:, axis]
+            hit = (t > 0) & (t < depth)
+            t = t[hit]
+            points = origin + rays[hit] * t[:, None]
+            depth[hit] = t
+            map_x[hit] = np.mod(points[:, a] * TEXELS_PER_METER + shift_x, size)
+            map_y[hit] = np.mod(points[:, b] * TEXELS_PER_METER + shift_y, size)
+
+        image = cv2.remap(self.texture, map_x.reshape(self.height, self.width).astype(np.float32),
+                          map_y.reshape(self.height, self.width).astype(np.float32),
+                          cv2.INTER_LINEAR, borderMode=cv2.BORDER_WRAP)
+        # Затемнение с расстоянием, чтобы плоскости различались по яркости
+        shading = np.clip(1.2 - 0.04 * depth, 0.4, 1.0).reshape(self.height, self.width)
+        image = image * shading
+        if noise is not None:
+            image = image + noise.normal(0.0, 2.0, image.shape)
+        return np.clip(image, 0, 255).astype(np.uint8)
+
+
+def render_sequence(frames: int, seed: int = 0):
+    """Генератор (кадр, поза камера -> мир)"""
+    renderer = PlaneRenderer(make_texture(seed))
+    noise = np.random.default_rng(seed + 1)
+    for pose in trajectory(frames):
+        yield renderer.render(pose, noise), pose
+
+
+def write_sequences(root, frames: int, seed: int = 0) -> dict:
+    """Последовательность в раскладке EuRoC (mav0/cam0, sensor.yaml, ground truth) и MP4
+
+    Каждый кадр рендерится один раз и пишется в обе копии.
+    """
+    root = Path(root)
+    mav0 = root / "euroc" / "mav0"
+    data_dir = mav0 / "cam0" / "data"
+    data_dir.mkdir(parents=True, exist_ok=True)
+    groundtruth_dir = mav0 / "state_groundtruth_estimate0"
+    groundtruth_dir.mkdir(parents=True, exist_ok=True)
+    paths = {'euroc': mav0, 'video': root / "sequence.mp4"}
+
+    writer = cv2.VideoWriter(str(paths['video']), cv2.VideoWriter_fourcc(*'mp4v'),
+                             FRAME_RATE, RESOLUTION, False)
+    if not writer.isOpened():
+        raise RuntimeError(f"Cannot open video writer: {paths['video']}")
+
+    step_ns = int(1e9 / FRAME_RATE)
+    # Ground truth в раскладке ASL: позиция и кватернион (w, x, y, z) всей траектории сразу
+    poses = trajectory(frames)
+    groundtruth_values = np.column_stack([poses[:, :3, 3],
+                                          matrix_to_quaternion(poses[:, :3, :3])[:, [3, 0, 1, 2]]])
+    try:
+        with open(mav0 / "cam0" / "data.csv", 'w') as images, \
+                open(groundtruth_dir / "data.csv", 'w') as groundtruth:
+            images.write("#timestamp [ns],filename\n")
+            groundtruth.write("#timestamp, p_RS_R_x [m], p_RS_R_y [m], p_RS_R_z [m], "
+                              "q_RS_w [], q_RS_x [], q_RS_y [], q_RS_z []\n")
+            for index, (frame, _) in enumerate(render_sequence(frames, seed)):
+                timestamp_ns = START_TIMESTAMP_NS + index * step_ns
+                cv2.imwrite(str(data_dir / f"{timestamp_ns}.png"), frame)
+                images.write(f"{timestamp_ns},{timestamp_ns}.png\n")
+                values = groundtruth_values[index]
+                groundtruth.write(f"{timestamp_ns}," + ",".join(f"{value:.9f}" for value in values) + "\n")
+                writer.write(frame)
+    finally:
+        writer.release()
+
+    with open(mav0 / "cam0" / "sensor.yaml", 'w') as f:
+        f.write("sensor_type: camera\n")
+        f.write(f"rate_hz: {FRAME_RATE:g}\n")
+        f.write(f"resolution: [{RESOLUTION[0]}, {RESOLUTION[1]}]\n")
+        f.write(f"intrinsics: [{', '.join(str(value) for value in CAMERA_INTRINSICS)}]\n")
+        f.write("distortion_coefficients: [0.0, 0.0, 0.0, 0.0]\n")
+    return paths
+
+
+def ensure_sequences(root, frames: int, seed: int = 0) -> dict:
+    """EuRoC папка и MP4 в root; повторная генерация только при смене параметров"""
+    root = Path(root)
+    params = {'frames': frames, 'seed': seed, 'resolution': list(RESOLUTION)}
+    meta_path = root / "synthetic.json"
+    paths = {'euroc': root / "euroc" / "mav0", 'video': root / "sequence.mp4"}
+    if meta_path.exists() and json.loads(meta_path.read_text()) == params \
+            and all(path.exists() for path in paths.values()):
+        return paths
+
+    if paths['euroc'].exists():
+        # Кадры прежней длины не должны остаться в индексе
+        for image in (paths['euroc'] / "cam0" / "data").glob("*.png"):
+            image.unlink()
+    paths = write_sequences(root, frames, seed)
+    meta_path.write_text(json.dumps(params))
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic EuRoC/MP4 sequences')
+    parser.add_argument('--output', type=str, required=True, help='Output folder')
+    parser.add_argument('--frames', type=int, default=200, help='Frames to render')
+    parser.add_argument('--seed', type=int, default=0, help='Texture and noise seed')
+    args = parser.parse_args()
+
+    paths = ensure_sequences(args.output, args.frames, args.seed)
+    print(f"EuRoC: {paths['euroc']}")
+    print(f"Видео: {paths['video']}")
+
+
+if __name__ == "__main__":
+    main()
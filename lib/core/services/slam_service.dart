@@ -1,4 +1,6 @@
 
+import 'dart:convert';
+import 'dart:io';
 import 'dart:math';
 import 'package:flutter/material.dart';
 import '../models/slam_data.dart';
@@ -11,6 +13,17 @@ class SlamService extends ChangeNotifier {
   String _status = "Готов к работе";
   List<String> _processingLog = [];
   
+  // Состояние канала push от Python процессора (NDJSON на stdout)
+  Process? _process;
+  final List<CameraPose> _liveTrajectory = [];
+  final List<Point3D> _livePointCloud = [];
+  int _totalFrames = 0;
+  // Обрабатываемый диапазон кадров [_startFrame, _endFrame) из сообщения start
+  int _startFrame = 0;
+  int _endFrame = 0;
+  int _processedFrames = 0;
+  int _lastSeq = 0;
+  
   // Геттеры
   SlamData? get currentData => _currentData;
   bool get isProcessing => _isProcessing;
@@ -59,28 +72,17 @@ class SlamService extends ChangeNotifier {
         _addLog("Используется кастомный процессор");
       }
       
-      // Имитация процесса обработки для демонстрации
-      for (int i = 0; i <= 100; i += 5) {
-        if (!_isProcessing) break;
-        
-        await Future.delayed(Duration(milliseconds: 200));
-        _progress = i / 100;
-        _status = "Обработка SLAM... ${i}%";
-        
-        // Генерация демонстрационных данных
-        if (i % 20 == 0) {
-          _currentData = _generateRealisticData(i);
-          _addLog("Обработано кадров: ${i * 10}");
-        }
-        
-        notifyListeners();
+      try {
+        // Позы и новые точки приходят построчно по мере обработки кадров
+        await _runProcessor(processorScript, arguments);
+      } on ProcessException catch (e) {
+        _addLog("Python процессор недоступен ($e), демонстрационный режим");
+        await _simulateProcessing();
       }
       
       if (_isProcessing) {
-        // Финальные данные
-        _currentData = _generateRealisticData(100);
         _status = "SLAM обработка завершена успешно";
-        _addLog("Результаты загружены: ${_currentData!.trajectory.length} поз, ${_currentData!.pointCloud.length} точек");
+        _addLog("Результаты загружены: ${_currentData?.trajectory.length ?? 0} поз, ${_currentData?.pointCloud.length ?? 0} точек");
       }
       
     } catch (e) {
@@ -133,6 +135,7 @@ class SlamService extends ChangeNotifier {
   
   void stopProcessing() {
     _isProcessing = false;
+    _process?.kill();
     _status = "Обработка остановлена";
     _addLog("Обработка принудительно остановлена пользователем");
     notifyListeners();
@@ -145,6 +148,127 @@ class SlamService extends ChangeNotifier {
     notifyListeners();
   }
   
+  Future<void> _simulateProcessing() async {
+    // Имитация процесса обработки для демонстрации
+    for (int i = 0; i <= 100; i += 5) {
+      if (!_isProcessing) break;
+      
+      await Future.delayed(Duration(milliseconds: 200));
+      _progress = i / 100;
+      _status = "Обработка SLAM... ${i}%";
+      
+      // Генерация демонстрационных данных
+      if (i % 20 == 0) {
+        _currentData = _generateRealisticData(i);
+        _addLog("Обработано кадров: ${i * 10}");
+      }
+      
+      notifyListeners();
+    }
+    
+    if (_isProcessing) {
+      // Финальные данные
+      _currentData = _generateRealisticData(100);
+    }
+  }
+  
+  Future<void> _runProcessor(String script, List<String> arguments) async {
+    _liveTrajectory.clear();
+    _livePointCloud.clear();
+    _totalFrames = 0;
+    _startFrame = 0;
+    _endFrame = 0;
+    _processedFrames = 0;
+    _lastSeq = 0;
+    
+    final process = await Process.start('python', ['python/$script', ...arguments, '--push']);
+    _process = process;
+    
+    // Обычный лог процессора идет в stderr
+    process.stderr
+        .transform(utf8.decoder)
+        .transform(const LineSplitter())
+        .listen((line) => _addLog(line));
+    
+    await for (final line in process.stdout
+        .transform(utf8.decoder)
+        .transform(const LineSplitter())) {
+      if (line.isEmpty) continue;
+      _handlePushMessage(jsonDecode(line) as Map<String, dynamic>);
+    }
+    
+    final exitCode = await process.exitCode;
+    _process = null;
+    if (exitCode != 0 && _isProcessing) {
+      throw Exception("Процессор завершился с кодом $exitCode");
+    }
+  }
+  
+  void _handlePushMessage(Map<String, dynamic> message) {
+    final seq = message['seq'] as int;
+    if (seq != _lastSeq + 1) {
+      _addLog("Пропущены сообщения SLAM: ${_lastSeq + 1}-${seq - 1}");
+    }
+    _lastSeq = seq;
+    
+    switch (message['type']) {
+      case 'start':
+        _totalFrames = message['total_frames'] ?? 0;
+        // При --start/--end процессор сообщает фактический диапазон кадров
+        _startFrame = message['start_frame'] ?? 0;
+        _endFrame = message['end_frame'] ?? _totalFrames;
+        break;
+      case 'pose':
+        final position = (message['position'] as List).cast<num>();
+        final orientation = (message['orientation'] as List).cast<num>();
+        _liveTrajectory.add(CameraPose(
+          x: position[0].toDouble(),
+          y: position[1].toDouble(),
+          z: position[2].toDouble(),
+          qx: orientation[0].toDouble(),
+          qy: orientation[1].toDouble(),
+          qz: orientation[2].toDouble(),
+          qw: orientation[3].toDouble(),
+          frameId: message['frame_id'],
+          timestamp: (message['timestamp'] as num).toDouble(),
+        ));
+        _processedFrames = message['processed_frames'] ?? _liveTrajectory.length;
+        break;
+      case 'points':
+        final xyz = (message['xyz'] as List).cast<num>();
+        final rgb = (message['rgb'] as List).cast<num>();
+        for (int i = 0; i < message['count']; i++) {
+          _livePointCloud.add(Point3D(
+            x: xyz[3 * i].toDouble(),
+            y: xyz[3 * i + 1].toDouble(),
+            z: xyz[3 * i + 2].toDouble(),
+            r: rgb[3 * i].toInt(),
+            g: rgb[3 * i + 1].toInt(),
+            b: rgb[3 * i + 2].toInt(),
+          ));
+        }
+        break;
+      case 'end':
+        _processedFrames = message['processed_frames'] ?? _processedFrames;
+        break;
+    }
+    
+    final frameRange = _endFrame - _startFrame;
+    if (frameRange > 0) {
+      _progress = ((_processedFrames - _startFrame) / frameRange).clamp(0.0, 1.0);
+    }
+    _status = "Обработка SLAM... кадр $_processedFrames";
+    _currentData = SlamData(
+      // Списки только дополняются, копирование на каждое сообщение не нужно
+      trajectory: _liveTrajectory,
+      pointCloud: _livePointCloud,
+      processedFrames: _processedFrames,
+      totalFrames: _totalFrames,
+      timestamp: DateTime.now(),
+    );
+    notifyListeners();
+  }
+  
   void _addLog(String message) {
     final timestamp = DateTime.now().toString().split(' ')[1].split('.')[0];
     _processingLog.add("[$timestamp] $message");
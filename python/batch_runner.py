@@ -0,0 +1,194 @@
+import contextlib
+import glob
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, List
+
+# Переменные потоков BLAS/OpenMP читаются при импорте numpy в рабочем процессе
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS')
+
+
+def expand_datasets(patterns: Iterable[str]) -> List[Path]:
+    """Папки последовательностей по списку путей и glob шаблонов, без повторов"""
+    folders = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) or [pattern]
+        for match in matches:
+            path = Path(match)
+            if path.is_dir() and path.resolve() not in [f.resolve() for f in folders]:
+                folders.append(path)
+    return folders
+
+
+def sequence_name(dataset_path: Path) -> str:
+    """Имя последовательности: для .../MH_01_easy/mav0 - MH_01_easy"""
+    dataset_path = Path(dataset_path)
+    return dataset_path.parent.name if dataset_path.name == 'mav0' else dataset_path.name
+
+
+def _init_worker(cv_threads: int):
+    import cv2
+    # Каждый процесс получает свою долю ядер, иначе пул OpenCV потоков
+    # в каждом из N процессов занимает все ядра
+    cv2.setNumThreads(cv_threads)
+
+
+def run_sequence(job: dict) -> dict:
+    """Обработка одной последовательности в рабочем процессе"""
+    dataset_path = Path(job['dataset'])
+    summary = {
+        'sequence': job['name'],
+        'dataset': str(dataset_path),
+        'output': job['output'],
+        'log': job['log'],
+        'pid': os.getpid(),
+        'status': 'failed'
+    }
+    start = time.time()
+    with open(job['log'], 'w') as log, contextlib.redirect_stdout(log):
+        try:
+            if job['dataset_type'] == 'euroc':
+                from euroc_processor import process_euroc_dataset
+                # Папка последовательности EuRoC содержит mav0
+                if (dataset_path / 'mav0').is_dir():
+                    dataset_path = dataset_path / 'mav0'
+                results = process_euroc_dataset(dataset_path, job['output'], job['start'], job['end'],
+                                                job['prefetch'], job['decode_threads'], job['frontend'],
+                                                job['extract_threads'])
+            else:
+                from tum_processor import process_tum_dataset
+                results = process_tum_dataset(dataset_path, job['output'], job['start'], job['end'],
+                                              job['prefetch'], job['decode_threads'], job['frontend'],
+                                              job['extract_threads'])
+            summary.update({
+                'status': 'ok',
+                'processed_frames': results['processed_frames'],
+                'total_frames': results['total_frames'],
+                'poses': len(results['trajectory']),
+                'points': len(results['point_cloud']),
+                'pipeline': results.get('pipeline')
+            })
+            if 'ate' in results.get('evaluation', {}):
+                summary['ate_rmse'] = results['evaluation']['ate']['rmse']
+                summary['rpe_rmse'] = results['evaluation']['rpe']['translation']['rmse']
+        except Exception as error:
+            summary['error'] = f"{type(error).__name__}: {error}"
+            import traceback
+            traceback.print_exc(file=log)
+    summary['wall_time'] = time.time() - start
+    if summary.get('processed_frames'):
+        summary['fps'] = summary['processed_frames'] / summary['wall_time']
+    return summary
+
+
+def run_batch(datasets: Iterable[str], dataset_type: str, output_dir: str, workers: int = None,
+              cv_threads: int = None, start_frame: int = 0, end_frame: int = None,
+              prefetch: int = 8, decode_threads: int = 2, frontend: str = "orb",
+              extract_threads: int = 0) -> dict:
+    """Параллельный прогон последовательностей в пуле процессов со сводкой"""
+    folders = expand_datasets(datasets)
+    if not folders:
+        raise ValueError(f"No dataset folders match: {list(datasets)}")
+
+    cores = os.cpu_count() or 1
+    workers = max(1, min(workers or cores, len(folders)))
+    cv_threads = cv_threads or max(1, cores // workers)
+    for name in THREAD_ENV_VARS:
+        os.environ.setdefault(name, str(cv_threads))
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    jobs = []
+    for folder in folders:
+        name = sequence_name(folder)
+        jobs.append({
+            'name': name,
+            'dataset': str(folder),
+            'dataset_type': dataset_type,
+            'output': str(output_dir / f"{name}_results.json"),
+            'log': str(output_dir / f"{name}.log"),
+            'start': start_frame,
+            'end': end_frame,
+            'prefetch': prefetch,
+            'decode_threads': decode_threads,
+            'frontend': frontend,
+            'extract_threads': extract_threads
+        })
+
+    print(f"Последовательностей: {len(jobs)}, процессов: {workers}, потоков OpenCV на процесс: {cv_threads}")
+    batch_start = time.time()
+    sequences = []
+    # spawn: рабочие процессы не наследуют потоки и состояние OpenCV родителя
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker, initargs=(cv_threads,)) as pool:
+        futures = [pool.submit(run_sequence, job) for job in jobs]
+        for future in as_completed(futures):
+            result = future.result()
+            sequences.append(result)
+            status = f"{result['wall_time']:.1f} сек" if result['status'] == 'ok' else result.get('error')
+            print(f"[{len(sequences)}/{len(jobs)}] {result['sequence']}: {status}")
+
+    wall_time = time.time() - batch_start
+    sequences.sort(key=lambda result: result['sequence'])
+    sequence_time = sum(result['wall_time'] for result in sequences)
+    summary = {
+        'dataset_type': dataset_type,
+        'started': datetime.fromtimestamp(batch_start).isoformat(),
+        'workers': workers,
+        'cv_threads': cv_threads,
+        'wall_time': wall_time,
+        'sequence_time': sequence_time,
+        'speedup': sequence_time / wall_time if wall_time > 0 else 0.0,
+        'succeeded': sum(result['status'] == 'ok' for result in sequences),
+        'failed': sum(result['status'] != 'ok' for result in sequences),
+        'processed_frames': sum(result.get('processed_frames', 0) for result in sequences),
+        'sequences': sequences
+    }
+    with open(output_dir / 'batch_summary.json', 'w') as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def print_summary(summary: dict):
+    print(f"\n{'Последовательность':<24}{'Статус':<8}{'Кадров':>8}{'Точек':>9}{'Время, с':>10}{'FPS':>8}"
+          f"{'ATE, м':>9}")
+    for result in summary['sequences']:
+        ate = f"{result['ate_rmse']:.3f}" if 'ate_rmse' in result else "-"
+        print(f"{result['sequence']:<24}{result['status']:<8}{result.get('processed_frames', 0):>8}"
+              f"{result.get('points', 0):>9}{result['wall_time']:>10.1f}{result.get('fps', 0.0):>8.1f}{ate:>9}")
+    print(f"\nВсего: {summary['wall_time']:.1f} сек при {summary['sequence_time']:.1f} сек суммарно "
+          f"(ускорение {summary['speedup']:.2f}x), ошибок: {summary['failed']}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Parallel batch processing of EuRoC/TUM sequences')
+    parser.add_argument('--datasets', type=str, nargs='+', required=True,
+                        help='Sequence folders or glob patterns')
+    parser.add_argument('--type', type=str, choices=['euroc', 'tum'], required=True, help='Dataset type')
+    parser.add_argument('--output-dir', type=str, required=True, help='Directory for results and summary')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default - CPU count)')
+    parser.add_argument('--cv-threads', type=int, default=None,
+                        help='OpenCV threads per worker (default - CPU count / workers)')
+    parser.add_argument('--start', type=int, default=0, help='Start frame')
+    parser.add_argument('--end', type=int, default=None, help='End frame')
+    parser.add_argument('--prefetch', type=int, default=8, help='Frames decoded ahead of tracking')
+    parser.add_argument('--decode-threads', type=int, default=2, help='Frame decode threads per worker')
+    parser.add_argument('--frontend', type=str, choices=['orb', 'klt'], default='orb',
+                        help='Tracking frontend')
+    parser.add_argument('--extract-threads', type=int, default=0,
+                        help='Threads for tiled ORB extraction (0 - single call)')
+
+    args = parser.parse_args()
+
+    summary = run_batch(args.datasets, args.type, args.output_dir, args.workers, args.cv_threads,
+                        args.start, args.end, args.prefetch, args.decode_threads, args.frontend,
+                        args.extract_threads)
+    print_summary(summary)
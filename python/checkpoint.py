@@ -0,0 +1,48 @@
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+CHECKPOINT_VERSION = 1
+
+
+def checkpoint_path(output_path) -> Path:
+    """Путь контрольной точки рядом с выходным JSON"""
+    return Path(output_path).with_suffix('.checkpoint.npz')
+
+
+def save_checkpoint(path, slam, **progress) -> Path:
+    """Запись состояния MonoSLAM и прогресса прогона в один .npz файл
+
+    Массивы хранятся как есть (без pickle), прогресс - JSON строкой.
+    Файл заменяется атомарно, поэтому сбой во время записи оставляет
+    предыдущую контрольную точку целой.
+    """
+    path = Path(path)
+    arrays = slam.get_state()
+    arrays['version'] = np.array(CHECKPOINT_VERSION)
+    arrays['progress'] = np.array(json.dumps(progress))
+
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+    return path
+
+
+def remove_checkpoint(path):
+    """Удаление контрольной точки завершенного прогона, чтобы --resume не продолжил его"""
+    Path(path).unlink(missing_ok=True)
+
+
+def load_checkpoint(path, slam) -> dict:
+    """Восстановление состояния MonoSLAM, возвращает сохраненный прогресс"""
+    with np.load(path, allow_pickle=False) as data:
+        state = {key: data[key] for key in data.files}
+    version = int(state.pop('version'))
+    if version != CHECKPOINT_VERSION:
+        raise ValueError(f"Unsupported checkpoint version: {version}")
+    progress = json.loads(str(state.pop('progress')))
+    slam.set_state(state)
+    return progress
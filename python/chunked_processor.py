@@ -0,0 +1,279 @@
+import contextlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from batch_runner import THREAD_ENV_VARS, _init_worker
+from results_stream import POINT_DTYPE, POSE_DTYPE, ResultsStreamWriter, to_dicts, to_records
+from se3 import matrix_to_quaternion, quaternion_to_matrix
+from trajectory_eval import align_sim3, evaluate_trajectory, find_groundtruth, format_evaluation, load_groundtruth
+
+
+def split_chunks(start_frame: int, end_frame: int, chunks: int, overlap: int) -> List[Tuple[int, int]]:
+    """Диапазоны [start, end) кусков; каждый захватывает `overlap` кадров следующего"""
+    total = end_frame - start_frame
+    chunks = max(1, min(chunks, total))
+    size = -(-total // chunks)
+    ranges = []
+    for index in range(chunks):
+        chunk_start = start_frame + index * size
+        # Хвост уже целиком покрыт перекрытием предыдущего куска
+        if chunk_start >= end_frame or (ranges and ranges[-1][1] >= end_frame):
+            break
+        ranges.append((chunk_start, min(end_frame, chunk_start + size + overlap)))
+    return ranges
+
+
+def transform_poses(poses: np.ndarray, scale: float, R: np.ndarray, t: np.ndarray) -> np.ndarray:
+    """Применение подобия к массиву POSE_DTYPE (позиции и ориентации)"""
+    poses = np.array(poses)
+    if len(poses) == 0:
+        return poses
+    positions = np.stack([poses['x'], poses['y'], poses['z']], axis=1)
+    positions = scale * positions @ R.T + t
+    poses['x'], poses['y'], poses['z'] = positions.T
+
+    quaternions = np.stack([poses['qx'], poses['qy'], poses['qz'], poses['qw']], axis=1)
+    rotated = matrix_to_quaternion(R @ quaternion_to_matrix(quaternions))
+    poses['qx'], poses['qy'], poses['qz'], poses['qw'] = rotated.T
+    return poses
+
+
+def transform_points(points: np.ndarray, scale: float, R: np.ndarray, t: np.ndarray) -> np.ndarray:
+    """Применение подобия к массиву точек облака"""
+    points = np.array(points)
+    if len(points) == 0:
+        return points
+    xyz = np.stack([points['x'], points['y'], points['z']], axis=1).astype(np.float64)
+    xyz = scale * xyz @ R.T + t
+    points['x'], points['y'], points['z'] = xyz.T
+    return points
+
+
+def run_chunk(job: dict) -> dict:
+    """Трекинг одного куска последовательности в рабочем процессе"""
+    summary = {'chunk': job['index'], 'start': job['start'], 'end': job['end'],
+               'output': job['output'], 'status': 'failed'}
+    start = time.time()
+    with open(job['log'], 'w') as log, contextlib.redirect_stdout(log):
+        try:
+            if job['dataset_type'] == 'euroc':
+                from euroc_processor import EurocDatasetProcessor as Processor
+            else:
+                from tum_processor import TUMDatasetProcessor as Processor
+            processor = Processor(job['dataset'], job['frontend'], job['extract_threads'])
+            results = processor.process_sequence(job['start'], job['end'], job['output'],
+                                                 job['prefetch'], job['decode_threads'])
+            summary.update({'status': 'ok', 'processed_frames': results['processed_frames']})
+        except Exception as error:
+            summary['error'] = f"{type(error).__name__}: {error}"
+            import traceback
+            traceback.print_exc(file=log)
+    summary['wall_time'] = time.time() - start
+    return summary
+
+
+def dedupe_points(points: np.ndarray, merged: np.ndarray, radius: float) -> np.ndarray:
+    """Точки points без тех, у кого в merged есть точка ближе radius"""
+    if len(points) == 0 or len(merged) == 0 or radius <= 0:
+        return points
+    xyz = np.stack([points['x'], points['y'], points['z']], axis=1)
+    merged_xyz = np.stack([merged['x'], merged['y'], merged['z']], axis=1)
+    distance, _ = cKDTree(merged_xyz).query(xyz, distance_upper_bound=radius)
+    return points[~np.isfinite(distance)]
+
+
+def load_submap(output) -> Tuple[np.ndarray, np.ndarray]:
+    """Итоговые позы и активное облако куска из его JSON результатов"""
+    with open(output) as f:
+        results = json.load(f)
+    return to_records(results['trajectory'], POSE_DTYPE), to_records(results['point_cloud'], POINT_DTYPE)
+
+
+def merge_submaps(chunk_outputs: List[str],
+                  merge_radius: float = None) -> Tuple[np.ndarray, np.ndarray, List[dict]]:
+    """Склейка подкарт: каждая выравнивается на уже собранную траекторию по общим кадрам
+
+    Берутся итоговые облака кусков (только активные точки после отбраковки
+    и BA), а не поток дозаписи. Точки нового куска, оказавшиеся ближе
+    merge_radius к уже собранным, считаются повторной триангуляцией
+    перекрытия и отбрасываются. По умолчанию радиус - большее из RMSE
+    выравнивания и тысячной доли размера облака.
+    """
+    merged_poses, merged_points, alignments = [], [], []
+    for output in chunk_outputs:
+        poses, points = load_submap(output)
+
+        if not merged_poses:
+            scale, R, t = 1.0, np.eye(3), np.zeros(3)
+            alignment = {'frames': 0, 'scale': 1.0, 'rmse': 0.0}
+            last_frame = -1
+        else:
+            previous = np.concatenate(merged_poses)
+            last_frame = int(previous['frame_id'].max())
+            _, previous_idx, current_idx = np.intersect1d(previous['frame_id'], poses['frame_id'],
+                                                          return_indices=True)
+            source = np.stack([poses['x'], poses['y'], poses['z']], axis=1)[current_idx]
+            target = np.stack([previous['x'], previous['y'], previous['z']], axis=1)[previous_idx]
+            scale, R, t = align_sim3(source, target)
+            residual = scale * source @ R.T + t - target
+            alignment = {
+                'frames': len(current_idx),
+                'scale': scale,
+                'rmse': float(np.sqrt(np.mean(np.sum(residual ** 2, axis=1)))) if len(residual) else None
+            }
+
+        # В перекрытии остаются позы предыдущего куска: он уже прошел инициализацию
+        poses = transform_poses(poses, scale, R, t)
+        merged_poses.append(poses[poses['frame_id'] > last_frame])
+
+        points = transform_points(points, scale, R, t)
+        if merged_points:
+            previous_points = np.concatenate(merged_points)
+            radius = merge_radius
+            if radius is None:
+                xyz = np.stack([previous_points['x'], previous_points['y'], previous_points['z']], axis=1)
+                extent = float(np.ptp(xyz, axis=0).max()) if len(xyz) else 0.0
+                radius = max(alignment['rmse'] or 0.0, extent / 1000)
+            kept = dedupe_points(points, previous_points, radius)
+            alignment['duplicate_points'] = len(points) - len(kept)
+            points = kept
+        merged_points.append(points)
+        alignments.append(alignment)
+
+    return np.concatenate(merged_poses), np.concatenate(merged_points), alignments
+
+
+def process_chunked(dataset_path, dataset_type: str, output_path: str, start_frame: int = 0,
+                    end_frame: int = None, chunks: int = None, overlap: int = 30,
+                    workers: int = None, cv_threads: int = None, prefetch: int = 8,
+                    decode_threads: int = 2, frontend: str = "orb", extract_threads: int = 0,
+                    merge_radius: float = None) -> dict:
+    """Параллельная обработка одной последовательности кусками с перекрытием"""
+    if dataset_type == 'euroc':
+        from euroc_processor import EurocDatasetProcessor as Processor
+    else:
+        from tum_processor import TUMDatasetProcessor as Processor
+    processor = Processor(dataset_path)
+    total_frames = processor.get_total_frames()
+    end_frame = total_frames if end_frame is None else min(end_frame, total_frames)
+
+    cores = os.cpu_count() or 1
+    ranges = split_chunks(start_frame, end_frame, chunks or cores, overlap)
+    workers = max(1, min(workers or cores, len(ranges)))
+    cv_threads = cv_threads or max(1, cores // workers)
+    for name in THREAD_ENV_VARS:
+        os.environ.setdefault(name, str(cv_threads))
+
+    output_path = Path(output_path)
+    chunk_dir = output_path.with_suffix('.chunks')
+    chunk_dir.mkdir(parents=True, exist_ok=True)
+    jobs = [{
+        'index': index,
+        'dataset': str(dataset_path),
+        'dataset_type': dataset_type,
+        'start': chunk_start,
+        'end': chunk_end,
+        'output': str(chunk_dir / f"chunk_{index:03d}.json"),
+        'log': str(chunk_dir / f"chunk_{index:03d}.log"),
+        'prefetch': prefetch,
+        'decode_threads': decode_threads,
+        'frontend': frontend,
+        'extract_threads': extract_threads
+    } for index, (chunk_start, chunk_end) in enumerate(ranges)]
+
+    print(f"Кадры {start_frame}-{end_frame}: {len(jobs)} кусков по ~{ranges[0][1] - ranges[0][0]} кадров, "
+          f"перекрытие {overlap}, процессов: {workers}")
+    processing_start = time.time()
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker, initargs=(cv_threads,)) as pool:
+        chunk_results = list(pool.map(run_chunk, jobs))
+    tracking_time = time.time() - processing_start
+
+    failed = [result for result in chunk_results if result['status'] != 'ok']
+    if failed:
+        raise RuntimeError(f"Chunks failed: {[(r['chunk'], r.get('error')) for r in failed]}")
+
+    poses, points, alignments = merge_submaps([job['output'] for job in jobs], merge_radius)
+    for result, alignment in zip(chunk_results, alignments):
+        result['alignment'] = alignment
+
+    results = {
+        'dataset': str(dataset_path),
+        'processed_frames': len(poses),
+        'total_frames': total_frames,
+        'processing_start': datetime.fromtimestamp(processing_start).isoformat(),
+        'processing_end': datetime.now().isoformat(),
+        'tracking_time': tracking_time,
+        'chunk_time': sum(result['wall_time'] for result in chunk_results),
+        'chunks': chunk_results,
+        'trajectory': to_dicts(poses),
+        'point_cloud': to_dicts(points)
+    }
+    # Точность склеенной траектории: ошибки выравнивания кусков видны в ATE
+    groundtruth_path = find_groundtruth(dataset_path)
+    if groundtruth_path:
+        results['evaluation'] = evaluate_trajectory(poses, load_groundtruth(groundtruth_path),
+                                                    processor.timestamps)
+    writer = ResultsStreamWriter(output_path, metadata={
+        key: results[key] for key in ('dataset', 'total_frames', 'processing_start')
+    })
+    writer.append_poses(poses)
+    writer.append_points(points)
+    writer.close(processed_frames=results['processed_frames'], processing_end=results['processing_end'])
+    with open(output_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Chunked parallel processing of one sequence')
+    parser.add_argument('--dataset', type=str, required=True, help='Path to dataset folder')
+    parser.add_argument('--type', type=str, choices=['euroc', 'tum'], required=True, help='Dataset type')
+    parser.add_argument('--output', type=str, required=True, help='Output JSON path')
+    parser.add_argument('--start', type=int, default=0, help='Start frame')
+    parser.add_argument('--end', type=int, default=None, help='End frame')
+    parser.add_argument('--chunks', type=int, default=None, help='Number of chunks (default - CPU count)')
+    parser.add_argument('--overlap', type=int, default=30, help='Frames shared by neighbouring chunks')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default - CPU count)')
+    parser.add_argument('--cv-threads', type=int, default=None,
+                        help='OpenCV threads per worker (default - CPU count / workers)')
+    parser.add_argument('--prefetch', type=int, default=8, help='Frames decoded ahead of tracking')
+    parser.add_argument('--decode-threads', type=int, default=2, help='Frame decode threads per worker')
+    parser.add_argument('--frontend', type=str, choices=['orb', 'klt'], default='orb',
+                        help='Tracking frontend')
+    parser.add_argument('--extract-threads', type=int, default=0,
+                        help='Threads for tiled ORB extraction (0 - single call)')
+    parser.add_argument('--merge-radius', type=float, default=None,
+                        help='Distance below which overlap points of a chunk are merged as duplicates '
+                             '(default - alignment RMSE or 1/1000 of the cloud extent)')
+
+    args = parser.parse_args()
+
+    results = process_chunked(args.dataset, args.type, args.output, args.start, args.end, args.chunks,
+                              args.overlap, args.workers, args.cv_threads, args.prefetch,
+                              args.decode_threads, args.frontend, args.extract_threads,
+                              args.merge_radius)
+
+    print(f"\nОбработка завершена за {results['tracking_time']:.1f} сек "
+          f"(суммарно по кускам {results['chunk_time']:.1f} сек)")
+    for chunk in results['chunks']:
+        alignment = chunk['alignment']
+        rmse = f"{alignment['rmse']:.4f}" if alignment['rmse'] is not None else "-"
+        print(f"Кусок {chunk['chunk']}: кадры {chunk['start']}-{chunk['end']}, "
+              f"выравнивание по {alignment['frames']} кадрам, масштаб {alignment['scale']:.3f}, RMSE {rmse}")
+    print(f"Поз в траектории: {len(results['trajectory'])}")
+    print(f"Точек в облаке: {len(results['point_cloud'])}")
+    if 'evaluation' in results:
+        print(format_evaluation(results['evaluation']))
@@ -0,0 +1,120 @@
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+class DatasetIndex:
+    """Индекс кадров одной камеры в EuRoC/ASL раскладке (camX/data.csv + camX/data/*.png)
+
+    По умолчанию кадры декодируются сразу в одноканальное изображение:
+    PNG в EuRoC и TUM VI 8-битные серые, и расширение до BGR только
+    утраивает объем памяти перед обратным преобразованием в трекере.
+    """
+
+    def __init__(self, camera_dir, cache_size: int = 64, default_fps: float = 20.0,
+                 read_flags: int = cv2.IMREAD_GRAYSCALE):
+        self.camera_dir = Path(camera_dir)
+        self.data_path = self.camera_dir / "data"
+        self.csv_path = self.camera_dir / "data.csv"
+        self.cache_size = cache_size
+        self.default_fps = default_fps
+        self.read_flags = read_flags
+
+        # Единственный проход по директории - дальше только доступ по индексу
+        self.timestamps_ns, self.image_paths = self._build_index()
+        self.timestamps = self.timestamps_ns / 1e9
+
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def _build_index(self) -> Tuple[np.ndarray, list]:
+        """Сканирование директории и соединение файлов с data.csv по наносекундной метке"""
+        files_by_ns = {}
+        unnamed_files = []
+        if self.data_path.is_dir():
+            for path in self.data_path.glob("*.png"):
+                try:
+                    files_by_ns[int(path.stem)] = path
+                except ValueError:
+                    unnamed_files.append(path)
+
+        if self.csv_path.exists():
+            timestamps_ns = []
+            image_paths = []
+            with open(self.csv_path, 'r') as f:
+                for line in f:
+                    if line.startswith('#') or not line.strip():
+                        continue
+                    parts = line.strip().split(',')
+                    timestamp_ns = int(parts[0])
+                    path = files_by_ns.get(timestamp_ns)
+                    if path is None and len(parts) > 1:
+                        candidate = self.data_path / parts[1].strip()
+                        if candidate.exists():
+                            path = candidate
+                    # Строки без соответствующего файла пропускаются
+                    if path is not None:
+                        timestamps_ns.append(timestamp_ns)
+                        image_paths.append(path)
+            order = np.argsort(np.asarray(timestamps_ns, dtype=np.int64), kind='stable')
+            return (np.asarray(timestamps_ns, dtype=np.int64)[order],
+                    [image_paths[i] for i in order])
+
+        if files_by_ns:
+            # data.csv нет, но имена файлов - наносекундные метки
+            timestamps_ns = np.array(sorted(files_by_ns), dtype=np.int64)
+            return timestamps_ns, [files_by_ns[ns] for ns in timestamps_ns]
+
+        # Иначе равномерная сетка времени с частотой по умолчанию
+        image_paths = sorted(unnamed_files)
+        step_ns = int(1e9 / self.default_fps)
+        return np.arange(len(image_paths), dtype=np.int64) * step_ns, image_paths
+
+    def __len__(self) -> int:
+        return len(self.image_paths)
+
+    def timestamp(self, frame_index: int) -> float:
+        """Временная метка кадра в секундах"""
+        return float(self.timestamps[frame_index])
+
+    def find(self, timestamp_ns: int) -> Optional[int]:
+        """Поиск индекса кадра с точно такой же наносекундной меткой"""
+        idx = int(np.searchsorted(self.timestamps_ns, timestamp_ns))
+        if idx < len(self.timestamps_ns) and self.timestamps_ns[idx] == timestamp_ns:
+            return idx
+        return None
+
+    def read(self, frame_index: int) -> Optional[np.ndarray]:
+        """Чтение кадра по индексу через LRU кэш декодированных изображений"""
+        if frame_index < 0 or frame_index >= len(self.image_paths):
+            return None
+
+        with self._cache_lock:
+            image = self._cache.get(frame_index)
+            if image is not None:
+                self._cache.move_to_end(frame_index)
+                self.cache_hits += 1
+                return image
+            self.cache_misses += 1
+
+        image = cv2.imread(str(self.image_paths[frame_index]), self.read_flags)
+        if image is None or self.cache_size <= 0:
+            return image
+
+        with self._cache_lock:
+            self._cache[frame_index] = image
+            self._cache.move_to_end(frame_index)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return image
+
+    def clear_cache(self):
+        """Очистка кэша декодированных кадров"""
+        with self._cache_lock:
+            self._cache.clear()
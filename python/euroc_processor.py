@@ -6,41 +6,34 @@ import yaml
 from pathlib import Path
 from datetime import datetime
 
+from checkpoint import checkpoint_path, load_checkpoint, remove_checkpoint, save_checkpoint
+from dataset_index import DatasetIndex
+from frame_reader import PrefetchFrameReader
+from profiler import format_profile
+from push_channel import stdout_channel
+from results_stream import ResultsStreamWriter, to_dicts
+from slam_pipeline import SLAMPipeline, format_metrics
+from trajectory_eval import evaluate_trajectory, find_groundtruth, format_evaluation, load_groundtruth
+
 class EurocDatasetProcessor:
-    def __init__(self, dataset_path):
+    def __init__(self, dataset_path, frontend="orb", extract_threads=0):
         self.dataset_path = Path(dataset_path)
+        self.frontend = frontend
+        self.extract_threads = extract_threads
         self.cam0_path = self.dataset_path / "cam0" / "data"
         self.cam1_path = self.dataset_path / "cam1" / "data"
         self.imu_path = self.dataset_path / "imu0" / "data.csv"
         
-        self.timestamps = self._load_timestamps()
+        # Директории камер сканируются один раз при инициализации
+        self.cam0_index = DatasetIndex(self.cam0_path.parent)
+        self.cam1_index = DatasetIndex(self.cam1_path.parent)
+        self.timestamps = self.cam0_index.timestamps
         self.camera_params = self._load_camera_parameters()
         self.current_frame = 0
         
         print(f"Инициализирован обработчик EuRoC датасета: {dataset_path}")
         print(f"Найдено кадров: {len(self.timestamps)}")
         
-    def _load_timestamps(self):
-        """Загрузка временных меток из EuRoC датасета"""
-        timestamps = []
-        timestamp_file = self.cam0_path / "../data.csv"
-        
-        if timestamp_file.exists():
-            with open(timestamp_file, 'r') as f:
-                lines = f.readlines()[1:]  # Пропускаем заголовок
-                for line in lines:
-                    parts = line.strip().split(',')
-                    if len(parts) >= 1:
-                        timestamp_ns = int(parts[0])
-                        timestamp_s = timestamp_ns / 1e9  # Конвертация в секунды
-                        timestamps.append(timestamp_s)
-        else:
-            # Если файл с временными метками не найден, используем имена файлов
-            image_files = sorted(self.cam0_path.glob("*.png"))
-            timestamps = [i * 0.05 for i in range(len(image_files))]  # 20 FPS
-        
-        return timestamps
-    
     def _load_camera_parameters(self):
         """Загрузка калибровочных параметров камеры"""
         camera_params = {
@@ -86,13 +79,7 @@ class EurocDatasetProcessor:
         if frame_index >= len(self.timestamps):
             return None, None
             
-        # Поиск файла изображения
-        image_files = sorted(self.cam0_path.glob("*.png"))
-        if frame_index >= len(image_files):
-            return None, None
-            
-        image_path = image_files[frame_index]
-        image = cv2.imread(str(image_path))
+        image = self.cam0_index.read(frame_index)
         
         if image is None:
             return None, None
@@ -108,17 +95,23 @@ class EurocDatasetProcessor:
         if image0 is None:
             return None, None, None
             
-        # Получение второго кадра для стерео
-        image_files1 = sorted(self.cam1_path.glob("*.png"))
-        if frame_index >= len(image_files1):
+        # Второй кадр ищется по наносекундной метке, а не по позиции
+        index1 = self.cam1_index.find(self.cam0_index.timestamps_ns[frame_index])
+        if index1 is None:
             return image0, None, timestamp
             
-        image1_path = image_files1[frame_index]
-        image1 = cv2.imread(str(image1_path))
+        image1 = self.cam1_index.read(index1)
         
         return image0, image1, timestamp
     
-    def process_sequence(self, start_frame=0, end_frame=None, output_path="euroc_results.json"):
+    def _load_frame(self, frame_index):
+        """Загрузка кадра без изменения состояния (вызывается из потоков декодирования)"""
+        return self.cam0_index.read(frame_index), self.timestamps[frame_index]
+    
+    def process_sequence(self, start_frame=0, end_frame=None, output_path="euroc_results.json",
+                         prefetch=8, decode_threads=4, push=None, checkpoint_interval=0,
+                         resume=False, voxel_size=None, max_points=None, profile=False,
+                         trace_path=None, groundtruth_path=None):
         """Обработка последовательности кадров"""
         if end_frame is None:
             end_frame = self.get_total_frames()
@@ -135,59 +128,109 @@ class EurocDatasetProcessor:
             'camera_parameters': self.camera_params['cam0']
         }
         
+        slam = self._get_slam_processor()
+        # Таймеры стадий: сводка в results['profile'], при trace_path - Chrome trace
+        slam.profiler.enabled = profile or trace_path is not None
+        # Позиции, с которых начинаются данные этого прогона
+        poses_before = len(slam.trajectory)
+        points_before = len(slam.point_cloud)
+        
+        # Продолжение прерванного прогона с последней контрольной точки
+        checkpoint_file = checkpoint_path(output_path)
+        progress = None
+        if resume and checkpoint_file.exists():
+            progress = load_checkpoint(checkpoint_file, slam)
+            poses_before = progress['poses_before']
+            points_before = progress['points_before']
+            start_frame = progress['frame_id'] + 1
+            results['processed_frames'] = progress['processed_frames']
+            print(f"Продолжение с контрольной точки {checkpoint_file}")
+        
         print(f"Начало обработки кадров {start_frame}-{end_frame}")
         
-        for frame_idx in range(start_frame, end_frame):
-            frame, timestamp = self.get_frame(frame_idx)
-            if frame is None:
-                continue
-                
-            # Здесь будет вызов SLAM обработки
-            frame_result = self._process_slam_frame(frame, frame_idx, timestamp)
-            
-            if frame_result:
-                results['trajectory'].append(frame_result['pose'])
-                if 'points' in frame_result:
-                    results['point_cloud'].extend(frame_result['points'])
-                    
+        # Позы и новые точки дописываются в бинарный поток вместо периодических JSON снимков
+        writer = ResultsStreamWriter(output_path, metadata={
+            key: results[key] for key in ('dataset', 'total_frames', 'processing_start', 'camera_parameters')
+        }, append=progress is not None)
+        if progress is not None:
+            # Записи после контрольной точки будут получены заново
+            writer.truncate(progress['pose_count'], progress['point_count'])
+        
+        def on_checkpoint(frame_idx):
+            save_checkpoint(checkpoint_file, slam, frame_id=frame_idx,
+                            processed_frames=results['processed_frames'],
+                            pose_count=writer.pose_count, point_count=writer.point_count,
+                            poses_before=poses_before, points_before=points_before)
+        
+        # Декодирование следующих кадров идет параллельно с SLAM обработкой
+        reader = PrefetchFrameReader(self._load_frame, range(start_frame, end_frame),
+                                     prefetch=prefetch, workers=decode_threads)
+        
+        def frames():
+            for frame_idx, (frame, timestamp) in reader:
+                if frame is None:
+                    continue
+                self.current_frame = frame_idx
+                yield frame_idx, frame
+        
+        if push:
+            push.start(dataset=results['dataset'], total_frames=results['total_frames'],
+                       start_frame=start_frame, end_frame=end_frame)
+        
+        def on_result(slam_result):
+            frame_idx = slam_result['pose']['frame_id']
             results['processed_frames'] = frame_idx + 1
-            
-            # Сохранение прогресса каждые 50 кадров
+            if push:
+                push.pose(slam_result['pose'], processed_frames=results['processed_frames'])
             if frame_idx % 50 == 0:
-                self._save_progress(results, output_path, frame_idx)
                 print(f"Обработано: {frame_idx}/{end_frame}")
+        
+        # Трекинг, картирование и запись результатов идут в отдельных потоках
+        pipeline = SLAMPipeline(slam, writer, flush_interval=50, on_result=on_result,
+                                on_points=push.points if push else None,
+                                checkpoint_interval=checkpoint_interval, on_checkpoint=on_checkpoint,
+                                start_frame=start_frame)
+        results['pipeline'] = pipeline.run(frames())
+        print(format_metrics(results['pipeline']))
                 
         results['processing_end'] = datetime.now().isoformat()
+        slam.close()
+        if slam.profiler.enabled:
+            results['profile'] = slam.profiler.report()
+            print(format_profile(results['profile']['stages']))
+            if trace_path:
+                slam.profiler.write_chrome_trace(trace_path)
+        # Траектория и облако хранятся в массивах MonoSLAM, словари создаются только для JSON
+        results['trajectory'] = slam.trajectory.to_dicts(poses_before)
+        results['point_cloud'] = to_dicts(slam.point_cloud.export(points_before, voxel_size, max_points))
+        # Точность по ground truth датасета: позы сопоставляются по меткам кадров
+        groundtruth_path = groundtruth_path or find_groundtruth(self.dataset_path)
+        if groundtruth_path:
+            results['evaluation'] = evaluate_trajectory(slam.trajectory.data[poses_before:],
+                                                        load_groundtruth(groundtruth_path), self.timestamps)
+            print(format_evaluation(results['evaluation']))
+        writer.close(processed_frames=results['processed_frames'],
+                     processing_end=results['processing_end'])
         self._save_results(results, output_path)
+        remove_checkpoint(checkpoint_file)
+        if push:
+            push.end(processed_frames=results['processed_frames'], output=str(output_path))
         
         return results
     
-    def _process_slam_frame(self, frame, frame_idx, timestamp):
-        """Обработка одного кадра через SLAM"""
+    def _get_slam_processor(self):
+        """SLAM процессор последовательности (создается при первом обращении)"""
         # Используем наш реальный SLAM процессор
         from real_slam_processor import MonoSLAM
         
-        # Инициализация SLAM при первом кадре
         if not hasattr(self, 'slam_processor'):
             camera_matrix = self.get_camera_matrix()
-            self.slam_processor = MonoSLAM()
+            self.slam_processor = MonoSLAM(frontend=self.frontend,
+                                           extract_threads=self.extract_threads)
             self.slam_processor.camera_matrix = camera_matrix
-            
-        # Обработка кадра
-        slam_result = self.slam_processor.process_frame(frame, frame_idx)
-        
-        if slam_result:
-            return {
-                'pose': slam_result['pose'],
-                'points': slam_result['points']
-            }
-        return None
-    
-    def _save_progress(self, results, output_path, frame_idx):
-        """Сохранение промежуточных результатов"""
-        progress_file = Path(output_path).with_suffix(f'.progress_{frame_idx}.json')
-        with open(progress_file, 'w') as f:
-            json.dump(results, f, indent=2, default=self._json_serializer)
+            # Позы траектории получают метки времени кадров датасета
+            self.slam_processor.frame_timestamps = self.timestamps
+        return self.slam_processor
     
     def _save_results(self, results, output_path):
         """Сохранение финальных результатов"""
@@ -208,10 +251,17 @@ class EurocDatasetProcessor:
             return str(obj)
         return str(obj)
 
-def process_euroc_dataset(dataset_path, output_path, start_frame=0, end_frame=None):
+def process_euroc_dataset(dataset_path, output_path, start_frame=0, end_frame=None,
+                          prefetch=8, decode_threads=4, frontend="orb",
+                          extract_threads=0, push=None, checkpoint_interval=0,
+                          resume=False, voxel_size=None, max_points=None, profile=False,
+                          trace_path=None, groundtruth_path=None):
     """Основная функция для обработки EuRoC датасета"""
-    processor = EurocDatasetProcessor(dataset_path)
-    results = processor.process_sequence(start_frame, end_frame, output_path)
+    processor = EurocDatasetProcessor(dataset_path, frontend, extract_threads)
+    results = processor.process_sequence(start_frame, end_frame, output_path,
+                                         prefetch, decode_threads, push,
+                                         checkpoint_interval, resume, voxel_size, max_points,
+                                         profile, trace_path, groundtruth_path)
     
     print(f"\nОбработка EuRoC датасета завершена!")
     print(f"Датасет: {dataset_path}")
@@ -229,7 +279,34 @@ if __name__ == "__main__":
     parser.add_argument('--output', type=str, required=True, help='Output JSON path')
     parser.add_argument('--start', type=int, default=0, help='Start frame')
     parser.add_argument('--end', type=int, default=None, help='End frame')
+    parser.add_argument('--prefetch', type=int, default=8, help='Frames decoded ahead of tracking')
+    parser.add_argument('--decode-threads', type=int, default=4, help='Frame decode threads')
+    parser.add_argument('--frontend', type=str, choices=['orb', 'klt'], default='orb',
+                        help='Tracking frontend')
+    parser.add_argument('--extract-threads', type=int, default=0,
+                        help='Threads for tiled ORB extraction (0 - single call)')
+    parser.add_argument('--push', action='store_true',
+                        help='Stream poses and new points to stdout as NDJSON, logs go to stderr')
+    parser.add_argument('--checkpoint-interval', type=int, default=500,
+                        help='Frames between state checkpoints (0 - disabled)')
+    parser.add_argument('--resume', action='store_true', help='Continue from the last checkpoint')
+    parser.add_argument('--voxel-size', type=float, default=None,
+                        help='Downsample exported and pushed points to one per voxel of this size')
+    parser.add_argument('--max-points', type=int, default=None,
+                        help='Upper bound on exported point cloud size')
+    parser.add_argument('--profile', action='store_true',
+                        help='Record per-stage timings and print p50/p95/p99 per stage')
+    parser.add_argument('--trace', type=str, default=None,
+                        help='Write a Chrome trace JSON of stage timings to this path')
+    parser.add_argument('--groundtruth', type=str, default=None,
+                        help='Ground truth for ATE/RPE (default - found in the dataset folder)')
     
     args = parser.parse_args()
     
-    process_euroc_dataset(args.dataset, args.output, args.start, args.end)
\ No newline at end of file
+    with stdout_channel(args.push, args.voxel_size) as push:
+        process_euroc_dataset(args.dataset, args.output, args.start, args.end,
+                              args.prefetch, args.decode_threads, args.frontend,
+                              args.extract_threads, push,
+                              args.checkpoint_interval, args.resume,
+                              args.voxel_size, args.max_points, args.profile, args.trace,
+                              args.groundtruth)
@@ -0,0 +1,219 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Tuple
+
+import cv2
+
+# Маркер конца потока кадров в очереди
+_END_OF_STREAM = object()
+
+
+class PrefetchFrameReader:
+    """Опережающее декодирование кадров по индексу в пуле потоков
+
+    cv2.imread отпускает GIL, поэтому декодирование следующих кадров идет
+    параллельно с обработкой текущего. Число кадров в работе ограничено
+    `prefetch`, новый кадр ставится в очередь только когда потребитель
+    забирает готовый.
+    """
+
+    def __init__(self, load_frame: Callable, indices: Iterable[int],
+                 prefetch: int = 8, workers: int = 4):
+        self.load_frame = load_frame
+        self.indices = iter(indices)
+        self.prefetch = max(1, prefetch)
+        self.workers = max(1, workers)
+        self._executor = None
+        self._pending = deque()
+
+    def __iter__(self) -> Iterator[Tuple[int, object]]:
+        self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                            thread_name_prefix="frame-decode")
+        try:
+            while len(self._pending) < self.prefetch and self._submit_next():
+                pass
+            while self._pending:
+                frame_index, future = self._pending.popleft()
+                self._submit_next()
+                yield frame_index, future.result()
+        finally:
+            self.close()
+
+    def _submit_next(self) -> bool:
+        frame_index = next(self.indices, None)
+        if frame_index is None:
+            return False
+        self._pending.append((frame_index, self._executor.submit(self.load_frame, frame_index)))
+        return True
+
+    def close(self):
+        """Остановка пула и отмена еще не начатых задач"""
+        for _, future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+class VideoFrameReader:
+    """Чтение видео в отдельном потоке с ограниченной очередью готовых кадров"""
+
+    def __init__(self, video_path: str, prefetch: int = 8, grayscale: bool = False, start_frame: int = 0):
+        self.cap = cv2.VideoCapture(video_path)
+        self.grayscale = grayscale
+        self.start_frame = start_frame
+        if start_frame:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        self.total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self._queue = queue.Queue(maxsize=max(1, prefetch))
+        self._stop = threading.Event()
+        self._thread = None
+
+    def isOpened(self) -> bool:
+        return self.cap.isOpened()
+
+    def __iter__(self) -> Iterator[Tuple[int, object]]:
+        self._thread = threading.Thread(target=self._read_loop, name="video-decode", daemon=True)
+        self._thread.start()
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _END_OF_STREAM:
+                    break
+                yield item
+        finally:
+            self.close()
+
+    def _read_loop(self):
+        frame_count = self.start_frame
+        try:
+            while not self._stop.is_set():
+                ret, frame = self.cap.read()
+                if not ret:
+                    break
+                if self.grayscale and frame.ndim == 3:
+                    # Преобразование выполняется в потоке чтения, а не в трекере
+                    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                # Блокирующий put дает обратное давление на декодер
+                while not self._stop.is_set():
+                    try:
+                        self._queue.put((frame_count, frame), timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                frame_count += 1
+        finally:
+            self._put_end()
+
+    def _put_end(self):
+        while True:
+            try:
+                self._queue.put(_END_OF_STREAM, timeout=0.1)
+                return
+            except queue.Full:
+                if self._stop.is_set():
+                    return
+
+    def close(self):
+        """Остановка потока чтения и освобождение VideoCapture"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.cap.release()
+
+
+class LiveFrameReader:
+    """Захват живого потока в отдельном потоке с выдачей только самого свежего кадра
+
+    Вместо очереди - одна ячейка: новый кадр вытесняет необработанный
+    предыдущий (он считается в `dropped_frames`), поэтому потребитель,
+    не успевающий за камерой, не копит задержку. Источник - URL
+    (RTSP/UDP/HTTP), номер устройства или локальный файл; файл по
+    умолчанию читается в темпе его FPS, как с камеры.
+    Итерация дает (номер кадра, кадр, время захвата time.monotonic()).
+    """
+
+    def __init__(self, source, grayscale: bool = False, realtime: bool = None):
+        if isinstance(source, str) and source.isdigit():
+            source = int(source)
+        self.source = source
+        self.cap = cv2.VideoCapture(source)
+        self.grayscale = grayscale
+        if realtime is None:
+            realtime = isinstance(source, str) and os.path.isfile(source)
+        # 0, если источник не сообщает частоту кадров
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.frame_interval = 1.0 / self.fps if realtime and self.fps > 0 else 0.0
+
+        self._condition = threading.Condition()
+        self._latest = None
+        self._ended = False
+        self._stop = threading.Event()
+        self._thread = None
+        self.captured_frames = 0
+        self.dropped_frames = 0
+
+    def isOpened(self) -> bool:
+        return self.cap.isOpened()
+
+    def __iter__(self) -> Iterator[Tuple[int, object, float]]:
+        self._thread = threading.Thread(target=self._capture_loop, name="live-capture", daemon=True)
+        self._thread.start()
+        try:
+            while True:
+                with self._condition:
+                    while self._latest is None and not self._ended and not self._stop.is_set():
+                        self._condition.wait(timeout=0.1)
+                    if self._stop.is_set() or self._latest is None:
+                        break
+                    item, self._latest = self._latest, None
+                yield item
+        finally:
+            self.close()
+
+    def _capture_loop(self):
+        frame_count = 0
+        next_time = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                ret, frame = self.cap.read()
+                if not ret:
+                    break
+                if self.frame_interval:
+                    # Файл отдает кадры с частотой исходной камеры
+                    next_time += self.frame_interval
+                    delay = next_time - time.monotonic()
+                    if delay > 0 and self._stop.wait(delay):
+                        break
+                capture_time = time.monotonic()
+                if self.grayscale and frame.ndim == 3:
+                    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                with self._condition:
+                    if self._latest is not None:
+                        self.dropped_frames += 1
+                    self._latest = (frame_count, frame, capture_time)
+                    self.captured_frames += 1
+                    self._condition.notify()
+                frame_count += 1
+        finally:
+            with self._condition:
+                self._ended = True
+                self._condition.notify()
+
+    def close(self):
+        """Остановка захвата (можно вызывать из другого потока) и освобождение VideoCapture"""
+        self._stop.set()
+        with self._condition:
+            self._condition.notify()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+            self._thread = None
+        self.cap.release()
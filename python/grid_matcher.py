@@ -0,0 +1,142 @@
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+class DescriptorGrid:
+    """Индекс особенностей по ячейкам изображения
+
+    Особенности сортируются по номеру ячейки один раз при построении,
+    после чего выборка особенностей прямоугольной области - это срезы
+    непрерывных диапазонов без перебора всех точек.
+    """
+
+    def __init__(self, points_xy: np.ndarray, descriptors: np.ndarray, cell_size: int = 48):
+        self.cell_size = cell_size
+        self.points_xy = np.asarray(points_xy, dtype=np.float32).reshape(-1, 2)
+        self.descriptors = descriptors
+
+        cells = np.floor(self.points_xy / cell_size).astype(np.int64)
+        self.cols = int(cells[:, 0].max()) + 1 if len(cells) else 1
+        self.rows = int(cells[:, 1].max()) + 1 if len(cells) else 1
+        cell_ids = cells[:, 1] * self.cols + cells[:, 0]
+
+        # CSR раскладка: индексы особенностей, отсортированные по ячейке
+        self.order = np.argsort(cell_ids, kind='stable')
+        counts = np.bincount(cell_ids, minlength=self.rows * self.cols)
+        self.cell_start = np.concatenate([[0], np.cumsum(counts)])
+
+    def __len__(self) -> int:
+        return len(self.points_xy)
+
+    def query_box(self, x0: float, y0: float, x1: float, y1: float) -> np.ndarray:
+        """Индексы особенностей в ячейках, пересекающих прямоугольник"""
+        cx0 = max(int(x0 // self.cell_size), 0)
+        cy0 = max(int(y0 // self.cell_size), 0)
+        cx1 = min(int(x1 // self.cell_size), self.cols - 1)
+        cy1 = min(int(y1 // self.cell_size), self.rows - 1)
+        if cx0 > cx1 or cy0 > cy1:
+            return np.zeros(0, dtype=np.int64)
+
+        # Ячейки одной строки сетки лежат в order подряд
+        parts = []
+        for cy in range(cy0, cy1 + 1):
+            start = self.cell_start[cy * self.cols + cx0]
+            stop = self.cell_start[cy * self.cols + cx1 + 1]
+            if stop > start:
+                parts.append(self.order[start:stop])
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+
+
+class GridMatcher:
+    """Сопоставление дескрипторов только в соседних ячейках с тестом Лоу
+
+    Для каждой ячейки текущего кадра кандидаты берутся из окна вокруг
+    предсказанной позиции в ключевом кадре, поэтому стоимость зависит от
+    локальной плотности особенностей, а не от N*M. Итоговые соответствия
+    прореживаются так, чтобы на ячейку приходилось не больше `max_per_cell`.
+    """
+
+    def __init__(self, cell_size: int = 48, search_radius: float = 32.0,
+                 wide_search_radius: float = 96.0, ratio: float = 0.8, max_distance: int = 64,
+                 max_per_cell: int = 5, max_matches: int = 500):
+        self.cell_size = cell_size
+        self.search_radius = search_radius
+        self.wide_search_radius = wide_search_radius
+        self.ratio = ratio
+        self.max_distance = max_distance
+        self.max_per_cell = max_per_cell
+        self.max_matches = max_matches
+
+    def build_index(self, points_xy: np.ndarray, descriptors: np.ndarray) -> DescriptorGrid:
+        return DescriptorGrid(points_xy, descriptors, self.cell_size)
+
+    def match(self, reference: DescriptorGrid, points_xy: np.ndarray, descriptors: np.ndarray,
+              offset: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Соответствия (индекс в reference, индекс в текущем кадре, расстояние Хэмминга)
+
+        offset - предсказанный сдвиг от текущего кадра к опорному; без него
+        поиск идет в широком окне вокруг той же позиции.
+        """
+        empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32))
+        if descriptors is None or reference.descriptors is None or len(reference) == 0:
+            return empty
+
+        points_xy = np.asarray(points_xy, dtype=np.float32).reshape(-1, 2)
+        if len(points_xy) == 0:
+            return empty
+        radius = self.search_radius if offset is not None else self.wide_search_radius
+        predicted = points_xy + (offset if offset is not None else 0.0)
+
+        cells = np.floor(points_xy / self.cell_size).astype(np.int64)
+        cell_ids = cells[:, 1] * (int(cells[:, 0].max()) + 1) + cells[:, 0]
+        order = np.argsort(cell_ids, kind='stable')
+        boundaries = np.flatnonzero(np.diff(cell_ids[order])) + 1
+
+        query_parts, train_parts, distance_parts = [], [], []
+        for members in np.split(order, boundaries):
+            box = predicted[members]
+            candidates = reference.query_box(box[:, 0].min() - radius, box[:, 1].min() - radius,
+                                             box[:, 0].max() + radius, box[:, 1].max() + radius)
+            if len(candidates) == 0:
+                continue
+
+            k = 2 if len(candidates) > 1 else 1
+            distances, nearest = cv2.batchDistance(
+                descriptors[members], reference.descriptors[candidates], cv2.CV_32S,
+                normType=cv2.NORM_HAMMING, K=k, update=0, crosscheck=False
+            )
+            best = distances[:, 0]
+            accepted = best <= self.max_distance
+            if k == 2:
+                # Тест Лоу: лучший кандидат заметно лучше второго
+                accepted &= best < self.ratio * distances[:, 1]
+            if not accepted.any():
+                continue
+
+            query_parts.append(candidates[nearest[accepted, 0]])
+            train_parts.append(members[accepted])
+            distance_parts.append(best[accepted])
+
+        if not query_parts:
+            return empty
+        query_idx = np.concatenate(query_parts)
+        train_idx = np.concatenate(train_parts)
+        distances = np.concatenate(distance_parts)
+
+        # Каждая особенность опорного кадра используется не больше одного раза
+        order = np.argsort(distances, kind='stable')
+        _, first = np.unique(query_idx[order], return_index=True)
+        keep = order[first]
+
+        # Равномерное распределение: не больше max_per_cell лучших соответствий на ячейку
+        keep_cells = cell_ids[train_idx[keep]]
+        by_cell = np.lexsort((distances[keep], keep_cells))
+        sorted_cells = keep_cells[by_cell]
+        group_start = np.concatenate([[0], np.flatnonzero(np.diff(sorted_cells)) + 1])
+        rank = np.arange(len(by_cell)) - np.repeat(group_start, np.diff(np.append(group_start, len(by_cell))))
+        keep = keep[by_cell[rank < self.max_per_cell]]
+
+        keep = keep[np.argsort(distances[keep], kind='stable')][:self.max_matches]
+        return query_idx[keep], train_idx[keep], distances[keep]
@@ -0,0 +1,129 @@
+from typing import Tuple
+
+import cv2
+import numpy as np
+
+from profiler import StageProfiler
+
+
+class KLTTracker:
+    """Фронтенд трекинга пирамидальным Лукасом-Канаде
+
+    Особенности ключевого кадра отслеживаются от кадра к кадру через
+    cv2.calcOpticalFlowPyrLK. Детектор (FAST или ORB) запускается только
+    когда число живых треков падает ниже `min_tracked`. Интерфейс
+    совпадает с FeatureMatcher: `track` и `set_keyframe`.
+    """
+
+    def __init__(self, max_features: int = 1000, min_tracked: int = 200, detector: str = "fast",
+                 win_size: int = 21, max_level: int = 3, fb_threshold: float = 1.0,
+                 min_distance: int = 10):
+        self.max_features = max_features
+        self.min_tracked = min_tracked
+        self.win_size = (win_size, win_size)
+        self.max_level = max_level
+        self.fb_threshold = fb_threshold
+        self.min_distance = min_distance
+        self.criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 30, 0.01)
+
+        if detector == "fast":
+            self.detector = cv2.FastFeatureDetector_create(threshold=20, nonmaxSuppression=True)
+        elif detector == "orb":
+            self.detector = cv2.ORB_create(nfeatures=max_features)
+        else:
+            raise ValueError(f"Unknown KLT detector: {detector}")
+
+        self.prev_gray = None
+        # Текущие позиции треков и индекс соответствующей особенности ключевого кадра (-1 - нет)
+        self.points = np.zeros((0, 2), dtype=np.float32)
+        self.keyframe_index = np.zeros(0, dtype=np.int64)
+        self.has_last_frame = False
+        self.detections = 0
+        self.profiler = StageProfiler()
+
+    def track(self, image: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Перенос треков на новый кадр, при нехватке - досыпание новых особенностей"""
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+        if self.prev_gray is not None and len(self.points):
+            with self.profiler.stage('klt_flow'):
+                self._flow(self.prev_gray, gray)
+
+        if len(self.points) < self.min_tracked:
+            with self.profiler.stage('klt_detect'):
+                self._detect(gray)
+
+        self.prev_gray = gray
+        matched = self.keyframe_index >= 0
+        return self.points, self.keyframe_index[matched], np.flatnonzero(matched)
+
+    def set_keyframe(self) -> np.ndarray:
+        """Все живые треки становятся особенностями нового ключевого кадра"""
+        self.keyframe_index = np.arange(len(self.points), dtype=np.int64)
+        self.has_last_frame = True
+        return self.points.copy()
+
+    def close(self):
+        """Фоновых потоков у трекера нет"""
+
+    def get_state(self) -> dict:
+        """Состояние трекера для контрольной точки"""
+        state = {
+            'points': self.points,
+            'keyframe_index': self.keyframe_index,
+            'has_last_frame': np.array(self.has_last_frame),
+            'detections': np.array(self.detections)
+        }
+        if self.prev_gray is not None:
+            state['prev_gray'] = self.prev_gray
+        return state
+
+    def set_state(self, state: dict):
+        self.points = state['points'].astype(np.float32)
+        self.keyframe_index = state['keyframe_index'].astype(np.int64)
+        self.has_last_frame = bool(state['has_last_frame'])
+        self.detections = int(state['detections'])
+        self.prev_gray = state.get('prev_gray')
+
+    def _flow(self, prev_gray: np.ndarray, gray: np.ndarray):
+        prev_points = self.points.reshape(-1, 1, 2)
+        next_points, status, _ = cv2.calcOpticalFlowPyrLK(
+            prev_gray, gray, prev_points, None,
+            winSize=self.win_size, maxLevel=self.max_level, criteria=self.criteria
+        )
+        good = status.ravel() == 1
+
+        if self.fb_threshold is not None:
+            # Проверка вперед-назад отсекает треки, уехавшие на соседнюю текстуру
+            back_points, back_status, _ = cv2.calcOpticalFlowPyrLK(
+                gray, prev_gray, next_points, None,
+                winSize=self.win_size, maxLevel=self.max_level, criteria=self.criteria
+            )
+            fb_error = np.linalg.norm((back_points - prev_points).reshape(-1, 2), axis=1)
+            good &= (back_status.ravel() == 1) & (fb_error < self.fb_threshold)
+
+        next_points = next_points.reshape(-1, 2)
+        height, width = gray.shape[:2]
+        good &= ((next_points[:, 0] >= 0) & (next_points[:, 0] < width)
+                 & (next_points[:, 1] >= 0) & (next_points[:, 1] < height))
+
+        self.points = next_points[good]
+        self.keyframe_index = self.keyframe_index[good]
+
+    def _detect(self, gray: np.ndarray):
+        """Детекция новых особенностей вдали от существующих треков"""
+        mask = np.full(gray.shape[:2], 255, dtype=np.uint8)
+        for x, y in self.points:
+            cv2.circle(mask, (int(x), int(y)), self.min_distance, 0, -1)
+
+        keypoints = self.detector.detect(gray, mask)
+        free_slots = self.max_features - len(self.points)
+        if not keypoints or free_slots <= 0:
+            return
+        keypoints = sorted(keypoints, key=lambda kp: kp.response, reverse=True)[:free_slots]
+        new_points = np.float32([kp.pt for kp in keypoints]).reshape(-1, 2)
+
+        self.points = np.vstack([self.points, new_points])
+        self.keyframe_index = np.concatenate([self.keyframe_index,
+                                              np.full(len(new_points), -1, dtype=np.int64)])
+        self.detections += 1
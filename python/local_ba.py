@@ -0,0 +1,333 @@
+import queue
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+from scipy.optimize import least_squares
+from scipy.sparse import lil_matrix
+
+from profiler import StageProfiler
+from se3 import invert, make_pose, matrix_to_rotvec, rotvec_to_matrix
+
+
+def rotate(points: np.ndarray, rot_vecs: np.ndarray) -> np.ndarray:
+    """Поворот (N,3) точек на (N,3) векторы Родрига (формула Родрига, пакетно)"""
+    theta = np.linalg.norm(rot_vecs, axis=1)[:, None]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        axis = rot_vecs / theta
+        axis = np.nan_to_num(axis)
+    dot = np.sum(points * axis, axis=1)[:, None]
+    cos_theta = np.cos(theta)
+    sin_theta = np.sin(theta)
+    return cos_theta * points + sin_theta * np.cross(axis, points) + dot * (1 - cos_theta) * axis
+
+
+def pose_to_params(pose_wc: np.ndarray) -> np.ndarray:
+    """Позы камера -> мир (..., 4, 4) в 6 параметров мир -> камера (rvec, t)"""
+    pose_cw = invert(pose_wc)
+    return np.concatenate([matrix_to_rotvec(pose_cw[..., :3, :3]), pose_cw[..., :3, 3]], axis=-1)
+
+
+def params_to_pose(params: np.ndarray) -> np.ndarray:
+    """Обратное преобразование (..., 6) параметров в позы камера -> мир"""
+    return invert(make_pose(rotvec_to_matrix(params[..., :3]), params[..., 3:6]))
+
+
+class SlidingWindowBA:
+    """Локальная bundle adjustment по последним K ключевым кадрам
+
+    Хранит только ключевые кадры окна, их наблюдения и видимые в окне
+    точки, поэтому память и время одной оптимизации не зависят от длины
+    последовательности. Оптимизация идет в рабочем потоке через
+    scipy.optimize.least_squares с разреженной структурой Якобиана,
+    трекинг забирает готовые результаты через `poll`.
+
+    Монокулярная карта определена с точностью до подобия, поэтому
+    фиксируются позы двух старейших кадров окна: одна задает систему
+    координат, расстояние между ними - масштаб. Ошибка оптимизации не
+    останавливает рабочий поток: запрос отбрасывается, а в `poll`
+    приходит результат с ключом 'error'.
+    """
+
+    def __init__(self, camera_matrix: np.ndarray, window_size: int = 7, fixed_keyframes: int = 2,
+                 max_iterations: int = 20, huber_px: float = 2.0, min_depth: float = 1e-3,
+                 background: bool = True):
+        self.camera_matrix = camera_matrix
+        self.window_size = window_size
+        self.fixed_keyframes = fixed_keyframes
+        self.max_iterations = max_iterations
+        self.huber_px = huber_px
+        self.min_depth = min_depth
+        self.background = background
+
+        self.keyframes = OrderedDict()  # id -> поза камера -> мир
+        self.observations = {}  # id ключевого кадра -> (landmark_ids, uv)
+        self.landmarks = {}  # id точки -> xyz в мире
+
+        self._lock = threading.Lock()
+        self._requests = queue.Queue(maxsize=1)
+        self._results = queue.Queue()
+        self._worker = None
+        self.optimizations = 0
+        self.failures = 0
+        self.profiler = StageProfiler()
+
+    def add_keyframe(self, keyframe_id: int, pose_wc: np.ndarray,
+                     landmark_ids: np.ndarray = None, uv: np.ndarray = None):
+        """Добавление ключевого кадра с наблюдениями; старые кадры выходят из окна"""
+        with self._lock:
+            self.keyframes[keyframe_id] = pose_wc.copy()
+            if landmark_ids is not None and len(landmark_ids):
+                self._append_observations(keyframe_id, landmark_ids, uv)
+            while len(self.keyframes) > self.window_size:
+                old_id, _ = self.keyframes.popitem(last=False)
+                self.observations.pop(old_id, None)
+            self._drop_unobserved_landmarks()
+
+    def add_observations(self, keyframe_id: int, landmark_ids: np.ndarray, uv: np.ndarray):
+        """Дополнительные наблюдения для ключевого кадра, уже находящегося в окне"""
+        with self._lock:
+            if keyframe_id in self.keyframes and len(landmark_ids):
+                self._append_observations(keyframe_id, landmark_ids, uv)
+
+    def add_landmarks(self, landmark_ids: np.ndarray, points_world: np.ndarray):
+        """Регистрация новых точек карты"""
+        with self._lock:
+            for landmark_id, point in zip(np.asarray(landmark_ids).tolist(), points_world):
+                self.landmarks[landmark_id] = np.asarray(point, dtype=np.float64)
+
+    def landmark_ids(self) -> np.ndarray:
+        """id точек, видимых из ключевых кадров окна"""
+        with self._lock:
+            return np.fromiter(self.landmarks, dtype=np.int64, count=len(self.landmarks))
+
+    def remove_landmarks(self, landmark_ids: np.ndarray):
+        """Удаление отбракованных точек вместе с их наблюдениями"""
+        with self._lock:
+            for landmark_id in np.asarray(landmark_ids).tolist():
+                self.landmarks.pop(landmark_id, None)
+            for keyframe_id, (ids, uv) in list(self.observations.items()):
+                keep = ~np.isin(ids, landmark_ids)
+                if not keep.all():
+                    self.observations[keyframe_id] = (ids[keep], uv[keep])
+
+    def _append_observations(self, keyframe_id, landmark_ids, uv):
+        landmark_ids = np.asarray(landmark_ids, dtype=np.int64)
+        uv = np.asarray(uv, dtype=np.float64).reshape(-1, 2)
+        if keyframe_id in self.observations:
+            old_ids, old_uv = self.observations[keyframe_id]
+            landmark_ids = np.concatenate([old_ids, landmark_ids])
+            uv = np.vstack([old_uv, uv])
+        self.observations[keyframe_id] = (landmark_ids, uv)
+
+    def _drop_unobserved_landmarks(self):
+        if not self.observations:
+            self.landmarks.clear()
+            return
+        observed = set(np.concatenate([ids for ids, _ in self.observations.values()]).tolist())
+        for landmark_id in [lid for lid in self.landmarks if lid not in observed]:
+            del self.landmarks[landmark_id]
+
+    def snapshot(self) -> Optional[dict]:
+        """Копия состояния окна для оптимизации"""
+        with self._lock:
+            if len(self.keyframes) <= self.fixed_keyframes or not self.observations:
+                return None
+            return {
+                'keyframes': OrderedDict((kid, pose.copy()) for kid, pose in self.keyframes.items()),
+                'observations': {kid: (ids.copy(), uv.copy()) for kid, (ids, uv) in self.observations.items()},
+                'landmarks': {lid: point.copy() for lid, point in self.landmarks.items()}
+            }
+
+    def get_state(self) -> dict:
+        """Состояние окна плоскими массивами для контрольной точки"""
+        with self._lock:
+            observations = [(kid, ids, uv) for kid, (ids, uv) in self.observations.items()]
+            return {
+                'keyframe_ids': np.array(list(self.keyframes), dtype=np.int64),
+                'keyframe_poses': np.array(list(self.keyframes.values())).reshape(-1, 4, 4),
+                'obs_keyframe': np.concatenate([np.full(len(ids), kid, dtype=np.int64)
+                                                for kid, ids, _ in observations] or [np.zeros(0, np.int64)]),
+                'obs_landmark': np.concatenate([ids for _, ids, _ in observations] or [np.zeros(0, np.int64)]),
+                'obs_uv': np.vstack([uv for _, _, uv in observations] or [np.zeros((0, 2))]),
+                'landmark_ids': np.array(list(self.landmarks), dtype=np.int64),
+                'landmark_points': np.array(list(self.landmarks.values())).reshape(-1, 3)
+            }
+
+    def set_state(self, state: dict):
+        """Восстановление окна из контрольной точки"""
+        with self._lock:
+            self.keyframes = OrderedDict(
+                (int(kid), pose.copy()) for kid, pose in zip(state['keyframe_ids'], state['keyframe_poses'])
+            )
+            self.observations = {}
+            for kid in self.keyframes:
+                mask = state['obs_keyframe'] == kid
+                if mask.any():
+                    self.observations[kid] = (state['obs_landmark'][mask].copy(), state['obs_uv'][mask].copy())
+            self.landmarks = {int(lid): point.copy()
+                              for lid, point in zip(state['landmark_ids'], state['landmark_points'])}
+
+    def request_optimization(self):
+        """Запуск оптимизации окна (в рабочем потоке или синхронно)"""
+        snapshot = self.snapshot()
+        if snapshot is None:
+            return
+        if not self.background:
+            self._process(snapshot)
+            return
+
+        self._ensure_worker()
+        # Очередь на один элемент: если оптимизатор занят, старый запрос заменяется новым
+        try:
+            self._requests.get_nowait()
+        except queue.Empty:
+            pass
+        self._requests.put(snapshot)
+
+    def poll(self) -> List[dict]:
+        """Неблокирующее получение готовых результатов в порядке завершения"""
+        results = []
+        while True:
+            try:
+                results.append(self._results.get_nowait())
+            except queue.Empty:
+                return results
+
+    def close(self):
+        """Остановка рабочего потока"""
+        if self._worker is not None:
+            try:
+                self._requests.get_nowait()
+            except queue.Empty:
+                pass
+            self._requests.put(None)
+            self._worker.join()
+            self._worker = None
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._worker_loop, name="local-ba", daemon=True)
+            self._worker.start()
+
+    def _worker_loop(self):
+        while True:
+            snapshot = self._requests.get()
+            if snapshot is None:
+                return
+            self._process(snapshot)
+
+    def _process(self, snapshot: dict):
+        """Оптимизация запроса; при ошибке запрос отбрасывается, ошибка передается в poll"""
+        keyframe_id = next(reversed(snapshot['keyframes']))
+        try:
+            result = self._optimize_timed(snapshot)
+        except Exception as error:
+            self.failures += 1
+            self._results.put({'keyframe_id': keyframe_id, 'error': f"{type(error).__name__}: {error}"})
+            return
+        if result is not None:
+            self._apply(result)
+            self._results.put(result)
+
+    def _apply(self, result: dict):
+        """Запись результата в окно (точки и кадры могли уже выйти из окна)"""
+        with self._lock:
+            for keyframe_id, pose in result['keyframes'].items():
+                if keyframe_id in self.keyframes:
+                    self.keyframes[keyframe_id] = pose
+            for landmark_id, point in zip(result['landmark_ids'].tolist(), result['points']):
+                if landmark_id in self.landmarks:
+                    self.landmarks[landmark_id] = point
+        self.optimizations += 1
+
+    def optimize(self, snapshot: dict) -> Optional[dict]:
+        """Оптимизация поз окна и видимых точек"""
+        keyframe_ids = list(snapshot['keyframes'])
+        fixed_ids = keyframe_ids[:self.fixed_keyframes]
+        free_ids = keyframe_ids[self.fixed_keyframes:]
+        pose_index = {kid: i for i, kid in enumerate(keyframe_ids)}
+
+        # Плоские массивы наблюдений: индекс позы, индекс точки, пиксель
+        landmark_ids = np.array(sorted(snapshot['landmarks']), dtype=np.int64)
+        if len(landmark_ids) == 0:
+            return None
+        obs_pose, obs_landmark, obs_uv = [], [], []
+        for keyframe_id, (ids, uv) in snapshot['observations'].items():
+            known = np.isin(ids, landmark_ids)
+            obs_pose.append(np.full(known.sum(), pose_index[keyframe_id]))
+            obs_landmark.append(ids[known])
+            obs_uv.append(uv[known])
+        obs_pose = np.concatenate(obs_pose)
+        obs_point = np.searchsorted(landmark_ids, np.concatenate(obs_landmark))
+        obs_uv = np.vstack(obs_uv)
+
+        # Оптимизируются только точки, видимые хотя бы с двух кадров окна
+        views = np.bincount(obs_point, minlength=len(landmark_ids))
+        keep = views[obs_point] >= 2
+        if keep.sum() < 10:
+            return None
+        obs_pose, obs_point, obs_uv = obs_pose[keep], obs_point[keep], obs_uv[keep]
+        used_points, obs_point = np.unique(obs_point, return_inverse=True)
+        landmark_ids = landmark_ids[used_points]
+
+        pose_params = pose_to_params(np.array([snapshot['keyframes'][kid] for kid in keyframe_ids]))
+        points = np.array([snapshot['landmarks'][lid] for lid in landmark_ids.tolist()])
+        n_fixed = len(fixed_ids)
+        n_free = len(free_ids)
+
+        x0 = np.concatenate([pose_params[n_fixed:].ravel(), points.ravel()])
+        fixed_params = pose_params[:n_fixed]
+        K = self.camera_matrix
+
+        def residuals(x):
+            free = x[:n_free * 6].reshape(-1, 6)
+            all_poses = np.vstack([fixed_params, free])
+            pts = x[n_free * 6:].reshape(-1, 3)
+            camera_params = all_poses[obs_pose]
+            points_camera = rotate(pts[obs_point], camera_params[:, :3]) + camera_params[:, 3:6]
+            # Точки за камерой: глубина ограничивается снизу, ошибка остается большой и конечной
+            depth = np.maximum(points_camera[:, 2:3], self.min_depth)
+            projected = points_camera[:, :2] / depth
+            projected = projected * [K[0, 0], K[1, 1]] + [K[0, 2], K[1, 2]]
+            return (projected - obs_uv).ravel()
+
+        sparsity = self._jacobian_sparsity(n_fixed, n_free, len(landmark_ids), obs_pose, obs_point)
+        solution = least_squares(residuals, x0, jac_sparsity=sparsity, method='trf',
+                                 x_scale='jac', loss='huber', f_scale=self.huber_px,
+                                 max_nfev=self.max_iterations)
+
+        free = solution.x[:n_free * 6].reshape(-1, 6)
+        optimized_points = solution.x[n_free * 6:].reshape(-1, 3)
+        return {
+            'keyframe_id': keyframe_ids[-1],
+            'keyframes': dict(zip(free_ids, params_to_pose(free))),
+            'landmark_ids': landmark_ids,
+            'points': optimized_points,
+            'initial_cost': float(0.5 * np.sum(residuals(x0) ** 2)),
+            'final_cost': float(0.5 * np.sum(solution.fun ** 2)),
+            'observations': len(obs_uv)
+        }
+
+    def _optimize_timed(self, snapshot: dict) -> Optional[dict]:
+        # Время оптимизации относится к последнему ключевому кадру окна
+        with self.profiler.stage('local_ba', next(reversed(snapshot['keyframes']))):
+            return self.optimize(snapshot)
+
+    def _jacobian_sparsity(self, n_fixed, n_free, n_points, obs_pose, obs_point):
+        """Разреженная структура Якобиана: каждое наблюдение зависит от одной позы и одной точки"""
+        n_obs = len(obs_pose)
+        sparsity = lil_matrix((2 * n_obs, 6 * n_free + 3 * n_points), dtype=int)
+        rows = np.arange(n_obs)
+
+        free_obs = obs_pose >= n_fixed
+        for k in range(6):
+            columns = 6 * (obs_pose[free_obs] - n_fixed) + k
+            sparsity[2 * rows[free_obs], columns] = 1
+            sparsity[2 * rows[free_obs] + 1, columns] = 1
+        for k in range(3):
+            columns = 6 * n_free + 3 * obs_point + k
+            sparsity[2 * rows, columns] = 1
+            sparsity[2 * rows + 1, columns] = 1
+        return sparsity
@@ -0,0 +1,253 @@
+from typing import List
+
+import numpy as np
+
+from results_stream import POINT_DTYPE, POSE_DTYPE, to_dicts, to_records
+from voxel_grid import VoxelGrid
+
+# Точка карты: координаты, цвет, число наблюдений, кадры первого/последнего наблюдения
+MAP_POINT_DTYPE = np.dtype([
+    ('x', '<f4'), ('y', '<f4'), ('z', '<f4'),
+    ('r', 'u1'), ('g', 'u1'), ('b', 'u1'),
+    ('observations', '<u4'),
+    ('first_seen', '<i8'), ('last_seen', '<i8'),
+    ('active', 'u1')
+])
+
+# Поля точки карты, попадающие в результаты: те же, что у прореженного облака
+EXPORT_POINT_FIELDS = POINT_DTYPE.names
+
+
+class RecordBuffer:
+    """Растущий структурированный NumPy массив с амортизированной дозаписью
+
+    Емкость удваивается при переполнении, `data` и `tail` возвращают
+    представления без копирования. Словари создаются только в `to_dicts`.
+    """
+
+    def __init__(self, dtype: np.dtype, capacity: int = 1024):
+        self.dtype = np.dtype(dtype)
+        self._data = np.zeros(max(1, capacity), dtype=self.dtype)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, index):
+        return self.data[index]
+
+    @property
+    def data(self) -> np.ndarray:
+        """Заполненная часть буфера (представление)"""
+        return self._data[:self._size]
+
+    def _reserve(self, size: int):
+        if size <= len(self._data):
+            return
+        capacity = len(self._data)
+        while capacity < size:
+            capacity *= 2
+        grown = np.zeros(capacity, dtype=self.dtype)
+        grown[:self._size] = self._data[:self._size]
+        self._data = grown
+
+    def append(self, **fields) -> int:
+        """Добавление одной записи, возвращает ее индекс"""
+        self._reserve(self._size + 1)
+        record = self._data[self._size]
+        for name, value in fields.items():
+            record[name] = value
+        self._size += 1
+        return self._size - 1
+
+    def extend(self, records) -> slice:
+        """Добавление пачки записей (массив или список словарей)"""
+        records = to_records(records, self.dtype)
+        start = self._size
+        self._reserve(start + len(records))
+        self._data[start:start + len(records)] = records
+        self._size += len(records)
+        return slice(start, self._size)
+
+    def extend_columns(self, **columns) -> slice:
+        """Добавление пачки записей из отдельных столбцов одинаковой длины"""
+        count = len(next(iter(columns.values())))
+        start = self._size
+        self._reserve(start + count)
+        block = self._data[start:start + count]
+        for name, values in columns.items():
+            block[name] = values
+        self._size += count
+        return slice(start, self._size)
+
+    def tail(self, count: int) -> np.ndarray:
+        """Последние `count` записей (представление)"""
+        return self._data[max(0, self._size - count):self._size]
+
+    def clear(self):
+        self._size = 0
+
+    def to_dicts(self, start: int = 0, stop: int = None) -> List[dict]:
+        """Словари для JSON и API - только на границе модуля"""
+        return to_dicts(self.data[start:stop])
+
+
+def trajectory_buffer(capacity: int = 1024) -> RecordBuffer:
+    """Буфер траектории камеры"""
+    return RecordBuffer(POSE_DTYPE, capacity)
+
+
+def point_cloud_buffer(capacity: int = 4096) -> RecordBuffer:
+    """Буфер облака точек карты"""
+    return RecordBuffer(MAP_POINT_DTYPE, capacity)
+
+
+class LandmarkStore(RecordBuffer):
+    """База точек карты: id точки - номер строки, он не меняется до конца прогона
+
+    Кроме координат хранит дескриптор последнего наблюдения, число
+    наблюдений и кадры первого/последнего наблюдения. Отбракованные
+    точки помечаются неактивными (id не переиспользуются, поэтому
+    ссылки из окна BA и ключевых кадров остаются корректными) и не
+    попадают в `to_dicts`, `active_ids` и `active_count`.
+    """
+
+    def __init__(self, capacity: int = 4096, descriptor_size: int = 32):
+        super().__init__(MAP_POINT_DTYPE, capacity)
+        self.descriptor_size = descriptor_size
+        self._descriptors = np.zeros((len(self._data), descriptor_size), dtype=np.uint8)
+        self.has_descriptor = np.zeros(len(self._data), dtype=bool)
+        self.active_count = 0
+        self.culled_count = 0
+        # Точки с first_seen раньше этого кадра уже прошли проверку возраста
+        self._checked_until = -np.iinfo(np.int64).max
+        # Слабые точки, пропущенные как защищенные: проверяются на следующих cull
+        self._deferred = np.zeros(0, dtype=np.int64)
+
+    def _reserve(self, size: int):
+        super()._reserve(size)
+        if len(self._descriptors) < len(self._data):
+            grown = np.zeros((len(self._data), self.descriptor_size), dtype=np.uint8)
+            grown[:len(self._descriptors)] = self._descriptors
+            self._descriptors = grown
+            has_descriptor = np.zeros(len(self._data), dtype=bool)
+            has_descriptor[:len(self.has_descriptor)] = self.has_descriptor
+            self.has_descriptor = has_descriptor
+
+    @property
+    def descriptors(self) -> np.ndarray:
+        return self._descriptors[:self._size]
+
+    def add(self, points_world: np.ndarray, frame_id: int, descriptors: np.ndarray = None,
+            observations: int = 2, color=(100, 200, 255)) -> np.ndarray:
+        """Новые точки карты, возвращает их id"""
+        if len(points_world) == 0:
+            return np.zeros(0, dtype=np.int64)
+        added = self.extend_columns(
+            x=points_world[:, 0], y=points_world[:, 1], z=points_world[:, 2],
+            r=color[0], g=color[1], b=color[2], observations=observations,
+            first_seen=frame_id, last_seen=frame_id, active=1
+        )
+        if descriptors is not None:
+            self._descriptors[added] = descriptors
+            self.has_descriptor[added] = True
+        self.active_count += added.stop - added.start
+        return np.arange(added.start, added.stop, dtype=np.int64)
+
+    def observe(self, ids: np.ndarray, frame_id: int, descriptors: np.ndarray = None):
+        """Повторное наблюдение точек: счетчик, кадр и дескриптор последнего наблюдения"""
+        if len(ids) == 0:
+            return
+        data = self.data
+        # np.add.at учитывает повторяющиеся id
+        np.add.at(data['observations'], ids, 1)
+        data['last_seen'][ids] = frame_id
+        if descriptors is not None:
+            self._descriptors[ids] = descriptors
+            self.has_descriptor[ids] = True
+
+    def descriptor_distance(self, ids: np.ndarray, descriptors: np.ndarray) -> np.ndarray:
+        """Расстояние Хэмминга между дескрипторами точек и парными дескрипторами"""
+        return np.unpackbits(self._descriptors[ids] ^ descriptors, axis=1).sum(axis=1)
+
+    def cull(self, frame_id: int, min_observations: int = 3, min_age: int = 30,
+             protected: np.ndarray = None) -> np.ndarray:
+        """Отбраковка точек старше min_age кадров, увиденных меньше min_observations раз"""
+        data = self.data
+        # Точки добавляются по возрастанию first_seen, поэтому уже проверенные
+        # (пережившие порог возраста) отсекаются бинарным поиском
+        start = int(np.searchsorted(data['first_seen'], self._checked_until, side='left'))
+        window = data[start:]
+        old = window['first_seen'] <= frame_id - min_age
+        weak = (window['active'] == 1) & old & (window['observations'] < min_observations)
+        culled = np.flatnonzero(weak) + start
+        if len(self._deferred):
+            # Отложенные точки могли с тех пор набрать наблюдения или уже быть отбракованы
+            deferred = self._deferred
+            still_weak = (data['active'][deferred] == 1) & (data['observations'][deferred] < min_observations)
+            culled = np.concatenate([deferred[still_weak], culled])
+        if protected is not None and len(culled):
+            skipped = np.isin(culled, protected)
+            self._deferred = culled[skipped]
+            culled = culled[~skipped]
+        else:
+            self._deferred = np.zeros(0, dtype=np.int64)
+        if old.any():
+            self._checked_until = frame_id - min_age + 1
+        data['active'][culled] = 0
+        self.active_count -= len(culled)
+        self.culled_count += len(culled)
+        return culled
+
+    def active_ids(self, start: int = 0) -> np.ndarray:
+        return np.flatnonzero(self.data['active'][start:]) + start
+
+    def clear(self):
+        super().clear()
+        self.active_count = 0
+        self.culled_count = 0
+        self._checked_until = -np.iinfo(np.int64).max
+        self._deferred = np.zeros(0, dtype=np.int64)
+
+    def to_dicts(self, start: int = 0, stop: int = None) -> List[dict]:
+        """Только активные точки, поля EXPORT_POINT_FIELDS"""
+        records = self.data[start:stop]
+        records = records[records['active'] == 1]
+        return to_dicts(records[list(EXPORT_POINT_FIELDS)])
+    
+    def export(self, start: int = 0, voxel_size: float = None, max_points: int = None) -> np.ndarray:
+        """Активные точки с id >= start, прореженные сеткой вокселей при заданных ограничениях
+
+        Без voxel_size и max_points возвращает точки как есть. При одном
+        max_points начальный размер вокселя - тысячная доля размера облака.
+        В обоих случаях результат - массив POINT_DTYPE.
+        """
+        records = self.data[start:]
+        records = records[records['active'] == 1]
+        if voxel_size is None and max_points is None:
+            return to_records(records, POINT_DTYPE)
+        if voxel_size is None:
+            xyz = np.stack([records['x'], records['y'], records['z']], axis=1)
+            extent = float(np.ptp(xyz, axis=0).max()) if len(xyz) else 0.0
+            voxel_size = max(extent / 1000, 1e-6)
+        return VoxelGrid.from_points(records, voxel_size).lod(max_points=max_points)
+
+    def get_state(self) -> dict:
+        return {
+            'points': self.data,
+            'descriptors': self.descriptors,
+            'has_descriptor': self.has_descriptor[:self._size],
+            'culled_count': np.array(self.culled_count),
+            'checked_until': np.array(self._checked_until),
+            'deferred': self._deferred
+        }
+
+    def set_state(self, state: dict):
+        self.clear()
+        self.extend(state['points'])
+        self._descriptors[:self._size] = state['descriptors']
+        self.has_descriptor[:self._size] = state['has_descriptor']
+        self.active_count = int(self.data['active'].sum())
+        self.culled_count = int(state['culled_count'])
+        self._checked_until = int(state['checked_until'])
+        self._deferred = np.asarray(state['deferred'], dtype=np.int64)
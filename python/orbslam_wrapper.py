@@ -3,12 +3,146 @@ import json
 import os
 from pathlib import Path
 
+import numpy as np
+
+from results_stream import POINT_DTYPE, POSE_DTYPE
+from se3 import make_pose, poses_to_records
+
+# Скалярные типы свойств PLY -> коды NumPy (без порядка байт)
+PLY_TYPES = {
+    'char': 'i1', 'int8': 'i1', 'uchar': 'u1', 'uint8': 'u1',
+    'short': 'i2', 'int16': 'i2', 'ushort': 'u2', 'uint16': 'u2',
+    'int': 'i4', 'int32': 'i4', 'uint': 'u4', 'uint32': 'u4',
+    'float': 'f4', 'float32': 'f4', 'double': 'f8', 'float64': 'f8'
+}
+PLY_BYTE_ORDER = {'ascii': '<', 'binary_little_endian': '<', 'binary_big_endian': '>'}
+
+
+def read_ply_header(file_path):
+    """Заголовок PLY: формат, элементы [(имя, число, dtype)] и размер заголовка в байтах
+
+    Списочные свойства (грани) не имеют фиксированного размера, у таких
+    элементов dtype = None.
+    """
+    elements = []
+    ply_format = None
+    with open(file_path, 'rb') as f:
+        if f.readline().strip() != b'ply':
+            raise ValueError(f"Not a PLY file: {file_path}")
+        while True:
+            line = f.readline()
+            if not line:
+                raise ValueError(f"PLY header is not terminated: {file_path}")
+            words = line.decode('ascii', errors='replace').split()
+            if not words or words[0] in ('comment', 'obj_info'):
+                continue
+            if words[0] == 'end_header':
+                break
+            if words[0] == 'format':
+                ply_format = words[1]
+                if ply_format not in PLY_BYTE_ORDER:
+                    raise ValueError(f"Unsupported PLY format: {ply_format}")
+            elif words[0] == 'element':
+                elements.append([words[1], int(words[2]), []])
+            elif words[0] == 'property' and elements:
+                fields = elements[-1][2]
+                if words[1] == 'list' or fields is None:
+                    elements[-1][2] = None
+                else:
+                    if words[1] not in PLY_TYPES:
+                        raise ValueError(f"Unsupported PLY property type: {words[1]}")
+                    if ply_format is None:
+                        raise ValueError(f"PLY property before format line: {file_path}")
+                    fields.append((words[2], PLY_BYTE_ORDER[ply_format] + PLY_TYPES[words[1]]))
+        header_size = f.tell()
+    return ply_format, [(name, count, np.dtype(fields) if fields is not None else None)
+                        for name, count, fields in elements], header_size
+
+
+def load_ply_vertices(file_path) -> np.ndarray:
+    """Вершины PLY как структурированный массив со свойствами из заголовка
+
+    Бинарное тело отображается в память (memmap) без чтения целиком,
+    ASCII разбирается одним вызовом np.fromstring.
+    """
+    ply_format, elements, header_size = read_ply_header(file_path)
+    offset = header_size
+    for name, count, dtype in elements:
+        if name == 'vertex':
+            break
+        if dtype is None or ply_format == 'ascii':
+            raise ValueError(f"PLY element '{name}' before vertices is not supported: {file_path}")
+        offset += count * dtype.itemsize
+    else:
+        return np.zeros(0, dtype=POINT_DTYPE)
+    if dtype is None:
+        raise ValueError(f"PLY vertices with list properties are not supported: {file_path}")
+
+    if ply_format != 'ascii':
+        return np.memmap(file_path, dtype=dtype, mode='r', offset=offset, shape=(count,))
+    with open(file_path, 'rb') as f:
+        f.seek(offset)
+        values = np.fromstring(f.read().decode('ascii'), sep=' ')
+    # После вершин могут идти грани - берутся только первые count строк
+    table = values[:count * len(dtype.names)].reshape(-1, len(dtype.names))
+    vertices = np.zeros(len(table), dtype=dtype)
+    for column, name in enumerate(dtype.names):
+        vertices[name] = table[:, column]
+    return vertices
+
+
+def read_trajectory_rows(file_path) -> np.ndarray:
+    """Построчный разбор траектории: нечисловые и короткие строки пропускаются
+
+    Ширина строки берется по большинству: 12 значений - KITTI, иначе
+    первые 8 значений строк TUM.
+    """
+    rows = []
+    with open(file_path, 'r') as f:
+        for line in f:
+            if line.startswith('#'):
+                continue
+            try:
+                rows.append([float(value) for value in line.split()])
+            except ValueError:
+                continue
+    widths = [len(row) for row in rows if len(row) >= 8]
+    if not widths:
+        return np.zeros((0, 8))
+    width = 12 if max(set(widths), key=widths.count) == 12 else 8
+    return np.array([row[:width] for row in rows
+                     if len(row) == width or (width == 8 and len(row) > 8)])
+
+
+def load_trajectory(file_path) -> np.ndarray:
+    """Траектория в формате TUM (t x y z qx qy qz qw) или KITTI (матрица 3x4) как POSE_DTYPE"""
+    try:
+        table = np.loadtxt(file_path, comments='#', ndmin=2)
+    except ValueError:
+        # Рваные или испорченные строки: медленный разбор с их пропуском
+        table = read_trajectory_rows(file_path)
+    if table.size == 0:
+        return np.zeros(0, dtype=POSE_DTYPE)
+    if table.shape[1] == 12:
+        # KITTI: матрицы камера -> мир построчно, меток времени нет
+        matrices = table.reshape(-1, 3, 4)
+        return poses_to_records(make_pose(matrices[:, :, :3], matrices[:, :, 3]))
+    if table.shape[1] < 8:
+        raise ValueError(f"Unknown trajectory format ({table.shape[1]} columns): {file_path}")
+    records = np.zeros(len(table), dtype=POSE_DTYPE)
+    records['frame_id'] = np.arange(len(table))
+    for column, name in enumerate(('timestamp', 'x', 'y', 'z', 'qx', 'qy', 'qz', 'qw')):
+        records[name] = table[:, column]
+    return records
+
+
 class ORBSLAMWrapper:
     def __init__(self, vocab_path, config_path):
         self.vocab_path = vocab_path
         self.config_path = config_path
-        self.trajectory = []
-        self.point_cloud = []
+        # Результаты хранятся структурированными массивами (см. results_stream)
+        self.trajectory = np.zeros(0, dtype=POSE_DTYPE)
+        self.point_cloud = np.zeros(0, dtype=POINT_DTYPE)
     
     def process_video(self, video_path, output_dir):
         """Запуск ORB-SLAM3 на видеофайле"""
@@ -59,50 +193,29 @@ class ORBSLAMWrapper:
         }
     
     def _parse_trajectory(self, file_path):
-        """Парсинг файла траектории ORB-SLAM3"""
-        trajectory = []
-        with open(file_path, 'r') as f:
-            for line in f:
-                if line.startswith('#'):
-                    continue
-                values = list(map(float, line.strip().split()))
-                if len(values) >= 8:  # timestamp, x, y, z, qx, qy, qz, qw
-                    pose = {
-                        'timestamp': values[0],
-                        'x': values[1], 'y': values[2], 'z': values[3],
-                        'qx': values[4], 'qy': values[5], 'qz': values[6], 'qw': values[7],
-                        'frame_id': len(trajectory)
-                    }
-                    trajectory.append(pose)
-        return trajectory
+        """Парсинг файла траектории ORB-SLAM3 (формат TUM или KITTI) в массив POSE_DTYPE"""
+        return load_trajectory(file_path)
     
     def _parse_point_cloud(self, file_path):
-        """Парсинг PLY файла облака точек"""
-        points = []
+        """Парсинг PLY файла облака точек (ASCII или бинарного) в массив POINT_DTYPE"""
         try:
-            with open(file_path, 'r') as f:
-                lines = f.readlines()
-            
-            # Находим начало данных
-            data_start = 0
-            for i, line in enumerate(lines):
-                if "end_header" in line:
-                    data_start = i + 1
-                    break
-            
-            # Парсим точки
-            for line in lines[data_start:]:
-                values = list(map(float, line.strip().split()))
-                if len(values) >= 6:  # x, y, z, r, g, b
-                    point = {
-                        'x': values[0], 'y': values[1], 'z': values[2],
-                        'r': int(values[3]), 'g': int(values[4]), 'b': int(values[5])
-                    }
-                    points.append(point)
-        
-        except Exception as e:
+            vertices = load_ply_vertices(file_path)
+            missing = [name for name in ('x', 'y', 'z') if name not in vertices.dtype.names]
+            if missing:
+                raise ValueError(f"PLY vertices have no {', '.join(missing)} properties: {file_path}")
+        except (OSError, ValueError) as e:
             print(f"Error parsing point cloud: {e}")
+            return np.zeros(0, dtype=POINT_DTYPE)
         
+        points = np.zeros(len(vertices), dtype=POINT_DTYPE)
+        names = vertices.dtype.names
+        for name in ('x', 'y', 'z'):
+            points[name] = vertices[name]
+        # Цвет в ORB-SLAM3 и других экспортерах - red/green/blue или r/g/b
+        for channel, aliases in (('r', ('red', 'r')), ('g', ('green', 'g')), ('b', ('blue', 'b'))):
+            source = next((alias for alias in aliases if alias in names), None)
+            if source is not None:
+                points[channel] = vertices[source]
         return points
     
     def _estimate_total_frames(self):
@@ -0,0 +1,146 @@
+import contextlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+# Общий пустой контекст: выключенный профилировщик не создает объектов на замер
+_DISABLED = contextlib.nullcontext()
+
+
+class _StageTimer:
+    __slots__ = ('profiler', 'name', 'frame_id', 'start')
+
+    def __init__(self, profiler: 'StageProfiler', name: str, frame_id: int):
+        self.profiler = profiler
+        self.name = name
+        self.frame_id = frame_id
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        end = time.perf_counter_ns()
+        # list.append атомарен, замеры из потоков трекинга, картирования и BA не блокируют друг друга
+        self.profiler._events.append((self.name, self.frame_id, threading.current_thread().name,
+                                      self.start, end - self.start))
+        return False
+
+
+class StageProfiler:
+    """Таймеры стадий SLAM на perf_counter_ns
+
+    `stage(name)` - контекстный менеджер замера; выключенный профилировщик
+    возвращает общий nullcontext, поэтому инструментирование горячего пути
+    почти ничего не стоит. Замеры пишутся из любых потоков и относятся к
+    кадру, заданному в этом потоке через `set_frame`; `count` добавляет к
+    кадру счетчики (особенности, инлаеры). Итоги:
+    `summary` (p50/p95/p99 по стадиям), `frames` (разбивка по кадрам) и
+    `write_chrome_trace` (JSON для chrome://tracing и Perfetto).
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._events = []
+        self._counts = {}
+        self._local = threading.local()
+        self._origin = time.perf_counter_ns()
+
+    def stage(self, name: str, frame_id: int = None):
+        if not self.enabled:
+            return _DISABLED
+        if frame_id is None:
+            frame_id = getattr(self._local, 'frame_id', -1)
+        return _StageTimer(self, name, frame_id)
+
+    def set_frame(self, frame_id: int):
+        """Кадр, к которому относятся следующие замеры текущего потока"""
+        if self.enabled:
+            self._local.frame_id = frame_id
+
+    def add(self, name: str, start_ns: int, end_ns: int, frame_id: int = None):
+        """Замер уже измеренного интервала perf_counter_ns"""
+        if not self.enabled:
+            return
+        if frame_id is None:
+            frame_id = getattr(self._local, 'frame_id', -1)
+        self._events.append((name, frame_id, threading.current_thread().name, start_ns, end_ns - start_ns))
+
+    def count(self, frame_id: int, **counts):
+        """Счетчики кадра (число особенностей, соответствий, инлаеров)"""
+        if self.enabled:
+            self._counts.setdefault(frame_id, {}).update(counts)
+
+    def reset(self):
+        self._events = []
+        self._counts = {}
+        self._origin = time.perf_counter_ns()
+
+    def summary(self) -> dict:
+        """Число вызовов, суммарное время и перцентили длительности по стадиям, мс"""
+        durations = {}
+        for name, _, _, _, duration in list(self._events):
+            durations.setdefault(name, []).append(duration)
+        summary = {}
+        for name, values in durations.items():
+            values = np.array(values) / 1e6
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            summary[name] = {
+                'count': len(values),
+                'total_ms': float(values.sum()),
+                'mean_ms': float(values.mean()),
+                'p50_ms': float(p50),
+                'p95_ms': float(p95),
+                'p99_ms': float(p99),
+                'max_ms': float(values.max())
+            }
+        return summary
+
+    def frames(self) -> List[dict]:
+        """Разбивка по кадрам: время стадий (мс) и счетчики"""
+        frames = {}
+        for name, frame_id, _, _, duration in list(self._events):
+            if frame_id < 0:
+                continue
+            stages = frames.setdefault(frame_id, {}).setdefault('stages', {})
+            stages[name] = stages.get(name, 0.0) + duration / 1e6
+        for frame_id, counts in self._counts.items():
+            frames.setdefault(frame_id, {}).update(counts)
+        return [dict(frame_id=frame_id, **frames[frame_id]) for frame_id in sorted(frames)]
+
+    def report(self) -> dict:
+        return {'stages': self.summary(), 'frames': self.frames()}
+
+    def write_chrome_trace(self, path) -> Path:
+        """Trace Event Format: полные события ('X') с микросекундными метками"""
+        pid = os.getpid()
+        thread_ids = {}
+        events = []
+        for name, frame_id, thread, start, duration in list(self._events):
+            tid = thread_ids.setdefault(thread, len(thread_ids))
+            events.append({
+                'name': name, 'ph': 'X', 'pid': pid, 'tid': tid,
+                'ts': (start - self._origin) / 1e3, 'dur': duration / 1e3,
+                'args': {'frame_id': frame_id} if frame_id >= 0 else {}
+            })
+        for thread, tid in thread_ids.items():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                           'args': {'name': thread}})
+        path = Path(path)
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        return path
+
+
+def format_profile(summary: dict) -> str:
+    """Таблица перцентилей по стадиям для консоли, самые дорогие стадии сверху"""
+    lines = [f"{'Стадия':<20}{'Вызовов':>9}{'Всего, мс':>12}{'p50':>9}{'p95':>9}{'p99':>9}"]
+    for name, stats in sorted(summary.items(), key=lambda item: -item[1]['total_ms']):
+        lines.append(f"{name:<20}{stats['count']:>9}{stats['total_ms']:>12.1f}"
+                     f"{stats['p50_ms']:>9.2f}{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}")
+    return '\n'.join(lines)
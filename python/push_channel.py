@@ -0,0 +1,104 @@
+import contextlib
+import json
+import sys
+import threading
+from typing import TextIO
+
+import numpy as np
+
+from voxel_grid import VoxelGrid
+
+PUSH_VERSION = 1
+
+
+class PushChannel:
+    """Инкрементальный канал результатов для фронтенда в формате NDJSON
+
+    Каждое сообщение - одна JSON строка с возрастающим `seq`, поэтому
+    фронтенд может обновлять сцену с частотой кадров, не перечитывая
+    траекторию целиком, и замечать пропуски. Типы сообщений:
+
+    - start: метаданные прогона (total_frames, источник, версия формата);
+    - pose: поза кадра и ее приращение `delta` относительно предыдущей;
+    - points: новые точки карты плоскими массивами `xyz` и `rgb`,
+      `start` - индекс первой точки в облаке;
+    - end: итог прогона.
+
+    С `voxel_size` отправляется только первая точка каждого вокселя, поэтому
+    объем передаваемого облака ограничен размером сцены.
+    """
+
+    def __init__(self, stream: TextIO, precision: int = 4, voxel_size: float = None):
+        self.stream = stream
+        self.precision = precision
+        self.grid = VoxelGrid(voxel_size) if voxel_size else None
+        self.seq = 0
+        self.point_count = 0
+        self._last_pose = None
+        self._lock = threading.Lock()
+
+    def start(self, **metadata):
+        self._send('start', version=PUSH_VERSION, **metadata)
+
+    def pose(self, pose: dict, **extra):
+        """Поза кадра (словарь как в траектории) с приращением к предыдущей"""
+        position = [pose['x'], pose['y'], pose['z']]
+        last = self._last_pose
+        delta = [0.0, 0.0, 0.0] if last is None else [a - b for a, b in zip(position, last)]
+        self._last_pose = position
+        self._send('pose',
+                   frame_id=int(pose['frame_id']),
+                   timestamp=round(float(pose['timestamp']), 6),
+                   position=self._round(position),
+                   orientation=self._round([pose['qx'], pose['qy'], pose['qz'], pose['qw']]),
+                   delta=self._round(delta),
+                   **extra)
+
+    def points(self, points: np.ndarray):
+        """Новые точки карты (структурированный массив с x, y, z, r, g, b)"""
+        xyz = np.stack([points['x'], points['y'], points['z']], axis=1).astype(np.float64)
+        rgb = np.stack([points['r'], points['g'], points['b']], axis=1)
+        if self.grid is not None:
+            opened = self.grid.insert(xyz, rgb)
+            xyz, rgb = xyz[opened], rgb[opened]
+        if len(xyz) == 0:
+            return
+        start = self.point_count
+        self.point_count += len(xyz)
+        self._send('points', start=start, count=len(xyz),
+                   xyz=np.round(xyz, self.precision).ravel().tolist(),
+                   rgb=rgb.ravel().tolist())
+
+    def end(self, **summary):
+        self._send('end', **summary)
+
+    def _round(self, values) -> list:
+        return [round(float(value), self.precision) for value in values]
+
+    def _send(self, message_type: str, **fields):
+        with self._lock:
+            self.seq += 1
+            message = {'seq': self.seq, 'type': message_type}
+            message.update(fields)
+            self.stream.write(json.dumps(message, separators=(',', ':'), default=_json_default) + '\n')
+            # Сброс после каждого сообщения: фронтенд читает поток построчно
+            self.stream.flush()
+
+
+def _json_default(obj):
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    return str(obj)
+
+
+@contextlib.contextmanager
+def stdout_channel(enabled: bool = True, voxel_size: float = None):
+    """Канал на stdout; обычный вывод print на время работы уходит в stderr"""
+    if not enabled:
+        yield None
+        return
+    channel = PushChannel(sys.stdout, voxel_size=voxel_size)
+    with contextlib.redirect_stdout(sys.stderr):
+        yield channel
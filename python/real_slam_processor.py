@@ -1,240 +1,788 @@
 import numpy as np
 import cv2
+import itertools
 import json
+import threading
 from pathlib import Path
-from typing import List, Tuple, Optional
+from typing import Callable, List, Tuple, Optional
 import time
+from scipy.spatial import cKDTree
+
+from checkpoint import checkpoint_path, load_checkpoint, remove_checkpoint, save_checkpoint
+from frame_reader import LiveFrameReader, VideoFrameReader
+from grid_matcher import GridMatcher
+from klt_tracker import KLTTracker
+from local_ba import SlidingWindowBA
+from map_storage import LandmarkStore, trajectory_buffer
+from profiler import StageProfiler, format_profile
+from push_channel import PushChannel, stdout_channel
+from results_stream import ResultsStreamWriter, to_dicts
+from se3 import compose, invert, make_pose, matrix_to_quaternion
+from slam_pipeline import SLAMPipeline, format_metrics
+from tiled_orb import TiledORBExtractor
 
 class FeatureMatcher:
-    def __init__(self):
+    def __init__(self, grid_matcher: GridMatcher = None, min_predicted_matches: int = 30,
+                 extract_threads: int = 0, extract_grid: Tuple[int, int] = (4, 3)):
         self.orb = cv2.ORB_create(nfeatures=2000, scaleFactor=1.2, nlevels=8)
-        self.bf = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True)
+        # Многопоточное извлечение по ячейкам; 0 - один вызов detectAndCompute на весь кадр
+        self.tiled_extractor = TiledORBExtractor(nfeatures=2000, scale_factor=1.2, nlevels=8,
+                                                 grid=extract_grid, threads=extract_threads
+                                                 ) if extract_threads > 0 else None
+        # Сопоставление по сетке ячеек вместо полного перебора N*M
+        self.grid_matcher = grid_matcher or GridMatcher()
+        self.min_predicted_matches = min_predicted_matches
         self.last_keypoints = None
         self.last_descriptors = None
-        self.last_frame = None
+        self.last_index = None
+        # Особенности последнего кадра из track, ждут решения о ключевом кадре
+        self._pending = None
+        # Флаг вместо копии предыдущего кадра - для сопоставления нужны только особенности
+        self.has_last_frame = False
+        
+        # Предсказание сдвига текущий кадр -> ключевой кадр по постоянной скорости в пикселях
+        self.last_offset = None
+        self.velocity = None
+        self.predicted_offset = None
+        # Таймеры стадий; MonoSLAM подставляет свой общий профилировщик
+        self.profiler = StageProfiler()
         
     def extract_features(self, image: np.ndarray) -> Tuple[List[cv2.KeyPoint], np.ndarray]:
-        """Извлечение ORB особенностей"""
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        """Извлечение ORB особенностей (кадр в градациях серого или BGR)"""
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        if self.tiled_extractor is not None:
+            return self.tiled_extractor.detect_and_compute(gray)
         keypoints, descriptors = self.orb.detectAndCompute(gray, None)
         return keypoints, descriptors
     
-    def match_features(self, kp1: List[cv2.KeyPoint], desc1: np.ndarray, 
-                      kp2: List[cv2.KeyPoint], desc2: np.ndarray) -> List[cv2.DMatch]:
-        """Сопоставление особенностей между кадрами"""
-        if desc1 is None or desc2 is None:
-            return []
-            
-        matches = self.bf.match(desc1, desc2)
-        matches = sorted(matches, key=lambda x: x.distance)
-        return matches[:100]  # Ограничиваем количество матчей
+    def track(self, image: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Особенности кадра и их соответствия особенностям ключевого кадра
+
+        Возвращает координаты (N,2) особенностей кадра, индексы в ключевом
+        кадре и индексы в текущем кадре для каждого соответствия.
+        """
+        with self.profiler.stage('orb_extract'):
+            keypoints, descriptors = self.extract_features(image)
+        self._pending = (keypoints, descriptors)
+        features_xy = np.float32([kp.pt for kp in keypoints]).reshape(-1, 2)
+        
+        if not self.has_last_frame or descriptors is None:
+            return features_xy, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        
+        with self.profiler.stage('match'):
+            query_idx, train_idx, _ = self.grid_matcher.match(
+                self.last_index, features_xy, descriptors, self.predicted_offset
+            )
+            if len(query_idx) < self.min_predicted_matches and self.predicted_offset is not None:
+                # Предсказание не подошло - повтор в широком окне
+                query_idx, train_idx, _ = self.grid_matcher.match(self.last_index, features_xy, descriptors)
+        
+        self._update_motion(query_idx, train_idx, features_xy)
+        return features_xy, query_idx, train_idx
+    
+    def set_keyframe(self) -> np.ndarray:
+        """Последний обработанный кадр становится ключевым, возвращает его особенности"""
+        if self._pending is None:
+            raise RuntimeError("set_keyframe() requires a frame passed to track() first")
+        self.last_keypoints, self.last_descriptors = self._pending
+        self.has_last_frame = True
+        features_xy = np.float32([kp.pt for kp in self.last_keypoints]).reshape(-1, 2)
+        self.last_index = self.grid_matcher.build_index(features_xy, self.last_descriptors)
+        
+        # Относительно нового ключевого кадра текущий сдвиг нулевой
+        self.last_offset = np.zeros(2, dtype=np.float32)
+        self.predicted_offset = -self.velocity if self.velocity is not None else None
+        return features_xy
+    
+    def close(self):
+        """Остановка пула потоков извлечения по ячейкам"""
+        if self.tiled_extractor is not None:
+            self.tiled_extractor.close()
+    
+    def get_state(self) -> dict:
+        """Особенности ключевого кадра и модель движения для контрольной точки"""
+        state = {'has_last_frame': np.array(self.has_last_frame)}
+        if self.last_keypoints is not None:
+            keypoints = self.last_keypoints
+            state['keypoints'] = np.array([(kp.pt[0], kp.pt[1], kp.size, kp.angle, kp.response)
+                                           for kp in keypoints], dtype=np.float32).reshape(-1, 5)
+            state['keypoint_octaves'] = np.array([kp.octave for kp in keypoints], dtype=np.int32)
+            if self.last_descriptors is not None:
+                state['descriptors'] = self.last_descriptors
+        for name in ('last_offset', 'velocity', 'predicted_offset'):
+            if getattr(self, name) is not None:
+                state[name] = np.asarray(getattr(self, name))
+        return state
+    
+    def set_state(self, state: dict):
+        self.has_last_frame = bool(state['has_last_frame'])
+        # Кадр, отслеженный до восстановления, к восстановленной карте не относится
+        self._pending = None
+        if 'keypoints' in state:
+            self.last_keypoints = [cv2.KeyPoint(float(x), float(y), float(size), float(angle),
+                                                float(response), int(octave))
+                                   for (x, y, size, angle, response), octave
+                                   in zip(state['keypoints'], state['keypoint_octaves'])]
+            self.last_descriptors = state.get('descriptors')
+            self.last_index = self.grid_matcher.build_index(state['keypoints'][:, :2], self.last_descriptors)
+        for name in ('last_offset', 'velocity', 'predicted_offset'):
+            setattr(self, name, state.get(name))
+    
+    def _update_motion(self, query_idx: np.ndarray, train_idx: np.ndarray, features_xy: np.ndarray):
+        if len(query_idx) < 8:
+            self.last_offset = self.velocity = self.predicted_offset = None
+            return
+        offset = np.median(self.last_index.points_xy[query_idx] - features_xy[train_idx], axis=0)
+        if self.last_offset is not None:
+            self.velocity = self.last_offset - offset
+        self.last_offset = offset
+        self.predicted_offset = offset - self.velocity if self.velocity is not None else None
 
 class PoseEstimator:
     def __init__(self, camera_matrix: np.ndarray, dist_coeffs: np.ndarray = None):
         self.camera_matrix = camera_matrix
         self.dist_coeffs = dist_coeffs if dist_coeffs is not None else np.zeros(5)
         
-    def estimate_pose(self, points1: np.ndarray, points2: np.ndarray) -> Tuple[np.ndarray, np.ndarray, bool]:
-        """Оценка позы камеры используя Essential Matrix"""
+    def estimate_pose(self, points1: np.ndarray,
+                      points2: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, bool]:
+        """Оценка позы камеры используя Essential Matrix
+
+        Возвращает R, t (x2 = R @ x1 + t), маску инлаеров и флаг успеха.
+        """
+        no_inliers = np.zeros(len(points1), dtype=bool)
         if len(points1) < 8:
-            return np.eye(3), np.zeros(3), False
+            return np.eye(3), np.zeros(3), no_inliers, False
             
         # Вычисление Essential Matrix
         E, mask = cv2.findEssentialMat(points1, points2, self.camera_matrix, 
                                       method=cv2.RANSAC, prob=0.999, threshold=1.0)
         
         if E is None or E.shape != (3, 3):
-            return np.eye(3), np.zeros(3), False
+            return np.eye(3), np.zeros(3), no_inliers, False
             
-        # Восстановление позы из Essential Matrix
-        points, R, t, mask = cv2.recoverPose(E, points1, points2, self.camera_matrix)
+        # Восстановление позы из Essential Matrix (только по инлаерам RANSAC)
+        points, R, t, mask = cv2.recoverPose(E, points1, points2, self.camera_matrix, mask=mask)
         
-        return R, t[:, 0], True
+        return R, t[:, 0], mask.ravel() > 0, True
 
 class BundleAdjustment:
-    def __init__(self):
-        self.points_3d = []  # 3D точки в мире
-        self.camera_poses = []  # Позы камеры
-        
-    def add_frame(self, R: np.ndarray, t: np.ndarray, points: np.ndarray):
-        """Добавление нового кадра и точек"""
-        # Преобразование в однородные координаты
-        pose = np.eye(4)
-        pose[:3, :3] = R
-        pose[:3, 3] = t
-        
-        self.camera_poses.append(pose)
-        
-        # Триангуляция новых 3D точек
-        new_points = self._triangulate_points(pose, points)
-        self.points_3d.extend(new_points)
-        
-    def _triangulate_points(self, pose: np.ndarray, points: np.ndarray) -> List[np.ndarray]:
-        """Триангуляция 3D точек из 2D соответствий"""
-        # Упрощенная триангуляция - в реальности нужны два кадра
-        points_3d = []
-        for point in points:
-            # Преобразование в нормализованные координаты камеры
-            point_3d = np.array([point[0], point[1], 1.0])
-            # Преобразование в мировые координаты
-            point_world = pose @ np.append(point_3d, 1.0)
-            points_3d.append(point_world[:3])
+    def __init__(self, min_parallax_deg: float = 1.0, max_reprojection_error: float = 2.0,
+                 max_depth: float = 200.0, window_size: int = 7, background: bool = True):
+        # Пороги отбора триангулированных точек
+        self.min_parallax_cos = np.cos(np.deg2rad(min_parallax_deg))
+        self.max_reprojection_error = max_reprojection_error
+        self.max_depth = max_depth  # в единицах базы между кадрами
+        
+        # Оптимизация по скользящему окну ключевых кадров
+        self.window = SlidingWindowBA(None, window_size=window_size, background=background)
+        
+    @property
+    def camera_poses(self) -> List[np.ndarray]:
+        """Позы ключевых кадров текущего окна"""
+        return list(self.window.keyframes.values())
+        
+    def triangulate(self, pose: np.ndarray, camera_matrix: np.ndarray, R: np.ndarray, t: np.ndarray,
+                    points1: np.ndarray, points2: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Триангуляция точек по паре кадров
+
+        pose - поза первого кадра пары (камера -> мир), R, t - относительное
+        движение из PoseEstimator, points1/points2 - инлаерные соответствия.
+        Возвращает мировые координаты принятых точек и маску принятия.
+        """
+        points_camera, accepted = self._triangulate_points(camera_matrix, R, t, points1, points2)
+        # Перевод из системы первой камеры в мировую
+        points_world = points_camera @ pose[:3, :3].T + pose[:3, 3]
+        return points_world, accepted
+    
+    def add_keyframe(self, keyframe_id: int, pose: np.ndarray, camera_matrix: np.ndarray,
+                     landmark_ids: np.ndarray, uv: np.ndarray):
+        """Добавление ключевого кадра в окно и запуск локальной оптимизации"""
+        self.window.camera_matrix = camera_matrix
+        self.window.add_keyframe(keyframe_id, pose, landmark_ids, uv)
+        self.window.request_optimization()
+    
+    def add_landmarks(self, keyframe_id: int, landmark_ids: np.ndarray,
+                      points_world: np.ndarray, uv: np.ndarray):
+        """Регистрация новых точек вместе с их наблюдением в опорном ключевом кадре"""
+        self.window.add_landmarks(landmark_ids, points_world)
+        self.window.add_observations(keyframe_id, landmark_ids, uv)
+    
+    def window_landmarks(self) -> np.ndarray:
+        """id точек карты в текущем окне"""
+        return self.window.landmark_ids()
+    
+    def remove_landmarks(self, landmark_ids: np.ndarray):
+        """Исключение отбракованных точек из окна"""
+        if len(landmark_ids):
+            self.window.remove_landmarks(landmark_ids)
+    
+    def poll(self) -> List[dict]:
+        """Готовые результаты оптимизации окна"""
+        return self.window.poll()
+    
+    def close(self):
+        self.window.close()
+        
+    def _triangulate_points(self, camera_matrix: np.ndarray, R: np.ndarray, t: np.ndarray,
+                            points1: np.ndarray, points2: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Пакетная двухкадровая триангуляция с отбором по глубине, параллаксу и репроекции"""
+        points1 = np.asarray(points1, dtype=np.float64).reshape(-1, 2)
+        points2 = np.asarray(points2, dtype=np.float64).reshape(-1, 2)
+        if len(points1) == 0:
+            return np.zeros((0, 3)), np.zeros(0, dtype=bool)
+        
+        P1 = camera_matrix @ np.hstack([np.eye(3), np.zeros((3, 1))])
+        P2 = camera_matrix @ np.hstack([R, t.reshape(3, 1)])
+        points_h = cv2.triangulatePoints(P1, P2, points1.T, points2.T)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            points_c1 = (points_h[:3] / points_h[3]).T
+            points_c2 = points_c1 @ R.T + t
+            
+            # Глубина должна быть положительной в обеих камерах
+            depth1 = points_c1[:, 2]
+            depth2 = points_c2[:, 2]
             
-        return points_3d
+            # Ошибка репроекции в обоих кадрах
+            proj1 = points_c1 @ camera_matrix.T
+            proj2 = points_c2 @ camera_matrix.T
+            error1 = np.linalg.norm(proj1[:, :2] / proj1[:, 2:] - points1, axis=1)
+            error2 = np.linalg.norm(proj2[:, :2] / proj2[:, 2:] - points2, axis=1)
+            
+            # Угол параллакса между лучами из центров двух камер
+            center2 = -R.T @ t
+            rays1 = points_c1
+            rays2 = points_c1 - center2
+            cos_parallax = np.einsum('ij,ij->i', rays1, rays2) / (
+                np.linalg.norm(rays1, axis=1) * np.linalg.norm(rays2, axis=1))
+            
+            accepted = (np.isfinite(points_c1).all(axis=1)
+                        & (depth1 > 0) & (depth2 > 0)
+                        & (depth1 < self.max_depth * np.linalg.norm(t))
+                        & (error1 < self.max_reprojection_error)
+                        & (error2 < self.max_reprojection_error)
+                        & (cos_parallax < self.min_parallax_cos))
+        
+        return points_c1[accepted], accepted
+
+class KeyframeSelector:
+    """Политика выбора ключевых кадров по доле отслеженных точек, параллаксу и времени"""
+    
+    def __init__(self, min_tracked_ratio: float = 0.5, min_parallax_px: float = 25.0,
+                 max_interval: int = 20, min_interval: int = 2, min_tracked: int = 15):
+        self.min_tracked_ratio = min_tracked_ratio
+        self.min_parallax_px = min_parallax_px
+        self.max_interval = max_interval
+        self.min_interval = min_interval
+        self.min_tracked = min_tracked
+        # Наибольшее число соответствий с текущим ключевым кадром
+        self.reference_tracked = 0
+        
+    def reset(self):
+        """Сброс статистики при создании нового ключевого кадра"""
+        self.reference_tracked = 0
+    
+    def get_state(self) -> dict:
+        return {'reference_tracked': np.array(self.reference_tracked)}
+    
+    def set_state(self, state: dict):
+        self.reference_tracked = int(state['reference_tracked'])
+        
+    def is_keyframe(self, frames_since_keyframe: int, tracked: int, parallax_px: float) -> bool:
+        """Решение, нужна ли на этом кадре тяжелая обработка"""
+        self.reference_tracked = max(self.reference_tracked, tracked)
+        
+        # Трекинг почти потерян - новая опора нужна немедленно
+        if tracked < self.min_tracked:
+            return True
+        if frames_since_keyframe < self.min_interval:
+            return False
+        if frames_since_keyframe >= self.max_interval:
+            return True
+        if parallax_px >= self.min_parallax_px:
+            return True
+        return tracked < self.min_tracked_ratio * self.reference_tracked
 
 class MonoSLAM:
-    def __init__(self, camera_width: int = 752, camera_height: int = 480):
-        self.feature_matcher = FeatureMatcher()
+    def __init__(self, camera_width: int = 752, camera_height: int = 480,
+                 keyframe_selector: KeyframeSelector = None, frontend: str = "orb",
+                 extract_threads: int = 0):
+        # Фронтенд: ORB детекция на каждом кадре или KLT трекинг с редкой переинициализацией
+        if frontend == "klt":
+            self.frontend = KLTTracker()
+        elif frontend == "orb":
+            self.frontend = FeatureMatcher(extract_threads=extract_threads)
+        else:
+            raise ValueError(f"Unknown tracking frontend: {frontend}")
         self.bundle_adjustment = BundleAdjustment()
+        self.keyframe_selector = keyframe_selector or KeyframeSelector()
+        
+        # Таймеры стадий трекинга, картирования и BA (выключены, пока не задано enabled)
+        self.profiler = StageProfiler()
+        self.frontend.profiler = self.profiler
+        self.bundle_adjustment.window.profiler = self.profiler
         
         # Параметры камеры по умолчанию (можно загрузить из калибровки)
+        self.pose_estimator = PoseEstimator(None)
         self.camera_matrix = np.array([
             [458.654, 0, 367.215],
             [0, 457.296, 248.375],
             [0, 0, 1]
         ])
         
-        self.pose_estimator = PoseEstimator(self.camera_matrix)
-        
-        self.trajectory = []
-        self.point_cloud = []
+        # Колоночное хранение: структурированные массивы вместо списков словарей
+        self.trajectory = trajectory_buffer()
+        # База точек карты: id точки - номер строки, отбраковка помечает точку неактивной
+        self.point_cloud = LandmarkStore()
         self.current_pose = np.eye(4)
+        # Метки кадров датасета по frame_id (секунды); без них время считается по frame_rate
+        self.frame_timestamps = None
+        self.frame_rate = 30.0
+        # Время захвата кадров живого потока без FPS: frame_id -> секунды от начала потока
+        self.capture_times = {}
+        
+        # Опорный ключевой кадр: дескрипторы/треки хранит фронтенд
+        self.keyframe_xy = np.zeros((0, 2), dtype=np.float32)
+        self.keyframe_pose = np.eye(4)
+        self.keyframe_id = None
+        self.keyframe_count = 0
+        # id точки карты для каждой особенности ключевого кадра (-1 - нет точки), ведет картирование
+        self.keyframe_landmarks = np.zeros(0, dtype=np.int64)
+        # Уточненные BA позы ключевых кадров (id -> поза) для трекинга; пишет картирование,
+        # забирает трекинг, поэтому чтение со сбросом идет под блокировкой
+        self._keyframe_corrections = {}
+        self._corrections_lock = threading.Lock()
         
+        # Слияние: новая точка заменяется точкой окна BA, проекция которой ближе
+        # fusion_radius_px, глубина совпадает с точностью fusion_depth_ratio,
+        # а дескриптор отличается не более чем на fusion_max_hamming бит
+        self.fusion_radius_px = 4.0
+        self.fusion_depth_ratio = 0.2
+        self.fusion_max_hamming = 50
+        # Отбраковка: точки старше cull_min_age кадров, увиденные реже cull_min_observations раз
+        self.cull_min_observations = 3
+        self.cull_min_age = 30
+        
+    @property
+    def camera_matrix(self) -> np.ndarray:
+        return self._camera_matrix
+    
+    @camera_matrix.setter
+    def camera_matrix(self, camera_matrix: np.ndarray):
+        """Смена калибровки сбрасывает кэш обратной матрицы"""
+        self._camera_matrix = np.asarray(camera_matrix, dtype=np.float64)
+        self._camera_matrix_inv = None
+        self.pose_estimator.camera_matrix = self._camera_matrix
+        self.bundle_adjustment.window.camera_matrix = self._camera_matrix
+    
+    @property
+    def camera_matrix_inv(self) -> np.ndarray:
+        """Обратная матрица камеры, вычисляется один раз на калибровку"""
+        if self._camera_matrix_inv is None:
+            self._camera_matrix_inv = np.linalg.inv(self._camera_matrix)
+        return self._camera_matrix_inv
+    
+    def back_project(self, points_2d: np.ndarray, depth, pose: np.ndarray = None) -> np.ndarray:
+        """Пакетная обратная проекция (N,2) пикселей на глубину depth в мировые (N,3) точки"""
+        if pose is None:
+            pose = self.current_pose
+        points_2d = np.asarray(points_2d, dtype=np.float64).reshape(-1, 2)
+        depth = np.broadcast_to(np.asarray(depth, dtype=np.float64), (len(points_2d),))
+        
+        # Нормализованные лучи камеры для всех точек сразу
+        K_inv = self.camera_matrix_inv
+        rays = points_2d @ K_inv[:, :2].T + K_inv[:, 2]
+        points_camera = rays * depth[:, None]
+        
+        return points_camera @ pose[:3, :3].T + pose[:3, 3]
+    
     def process_frame(self, frame: np.ndarray, frame_id: int) -> dict:
         """Обработка одного кадра SLAM"""
-        start_time = time.time()
+        points_before = len(self.point_cloud)
+        
+        # Результаты локальной BA из рабочего потока
+        self.poll_mapping()
         
-        # Извлечение особенностей
-        keypoints, descriptors = self.feature_matcher.extract_features(frame)
+        result, keyframe_job = self.track_frame(frame, frame_id)
+        if keyframe_job is not None:
+            self.map_keyframe(keyframe_job)
         
-        if self.feature_matcher.last_frame is not None:
-            # Сопоставление с предыдущим кадром
-            matches = self.feature_matcher.match_features(
-                self.feature_matcher.last_keypoints, self.feature_matcher.last_descriptors,
-                keypoints, descriptors
+        result['points'] = self._get_current_points_dict()
+        result['new_points'] = self.point_cloud.data[points_before:]
+        return result
+    
+    def track_frame(self, frame: np.ndarray, frame_id: int) -> Tuple[dict, Optional[dict]]:
+        """Трекинг кадра: поза относительно ключевого кадра и решение о ключевом кадре
+        
+        Возвращает результат кадра и задание для картирования (None, если кадр
+        не ключевой). Карту не трогает, поэтому может работать параллельно с
+        map_keyframe в другом потоке.
+        """
+        start_time = time.perf_counter_ns()
+        self.profiler.set_frame(frame_id)
+        
+        # Поза опорного кадра, уточненная локальной BA
+        with self._corrections_lock:
+            if self.keyframe_id in self._keyframe_corrections:
+                self.keyframe_pose = self._keyframe_corrections[self.keyframe_id]
+                self._keyframe_corrections = {}
+        
+        # Особенности кадра и соответствия с ключевым кадром
+        with self.profiler.stage('frontend'):
+            features_xy, query_idx, train_idx = self.frontend.track(frame)
+        
+        is_keyframe = True
+        tracked = len(query_idx)
+        matches = None
+        if self.frontend.has_last_frame:
+            if tracked > 8:
+                # Подготовка точек для оценки позы
+                points1 = self.keyframe_xy[query_idx]
+                points2 = features_xy[train_idx]
+                parallax_px = float(np.median(np.linalg.norm(points2 - points1, axis=1)))
+            else:
+                parallax_px = 0.0
+            
+            is_keyframe = self.keyframe_selector.is_keyframe(
+                frame_id - self.keyframe_id, tracked, parallax_px
             )
             
-            if len(matches) > 8:
-                # Подготовка точек для оценки позы
-                points1 = np.float32([self.feature_matcher.last_keypoints[m.queryIdx].pt for m in matches])
-                points2 = np.float32([keypoints[m.trainIdx].pt for m in matches])
-                
-                # Оценка позы камеры
-                R, t, success = self.pose_estimator.estimate_pose(points1, points2)
+            if tracked > 8:
+                # Оценка позы камеры относительно ключевого кадра
+                with self.profiler.stage('pose_ransac'):
+                    R, t, inliers, success = self.pose_estimator.estimate_pose(points1, points2)
                 
                 if success:
-                    # Обновление текущей позы
-                    delta_pose = np.eye(4)
-                    delta_pose[:3, :3] = R
-                    delta_pose[:3, 3] = t
-                    self.current_pose = self.current_pose @ delta_pose
-                    
-                    # Добавление в bundle adjustment
-                    self.bundle_adjustment.add_frame(R, t, points2)
-                    
-                    # Обновление облака точек
-                    self._update_point_cloud(keypoints, descriptors, matches)
-        
-        # Сохранение текущего кадра для следующей итерации
-        self.feature_matcher.last_keypoints = keypoints
-        self.feature_matcher.last_descriptors = descriptors
-        self.feature_matcher.last_frame = frame.copy()
+                    # Обновление текущей позы: x2 = R x1 + t, поза хранится как камера -> мир
+                    self.current_pose = compose(self.keyframe_pose, invert(make_pose(R, t)))
+                    matches = (query_idx[inliers], train_idx[inliers], R, t,
+                               points1[inliers], points2[inliers], len(features_xy))
+        
+        keyframe_job = None
+        if is_keyframe:
+            # Текущий кадр становится опорным для следующих
+            with self.profiler.stage('set_keyframe'):
+                keyframe_xy = self.frontend.set_keyframe()
+            keyframe_job = {
+                'frame_id': frame_id,
+                'pose': self.current_pose.copy(),
+                'keyframe_xy': keyframe_xy,
+                'reference_id': self.keyframe_id,
+                'reference_pose': self.keyframe_pose.copy(),
+                'matches': matches,
+                # Дескрипторы особенностей ключевого кадра (у KLT их нет)
+                'descriptors': getattr(self.frontend, 'last_descriptors', None)
+            }
+            
+            self.keyframe_xy = keyframe_xy
+            self.keyframe_pose = self.current_pose.copy()
+            self.keyframe_id = frame_id
+            self.keyframe_count += 1
+            self.keyframe_selector.reset()
         
         # Сохранение траектории
         self._update_trajectory(frame_id)
         
-        processing_time = time.time() - start_time
+        end_time = time.perf_counter_ns()
+        processing_time = (end_time - start_time) / 1e9
+        self.profiler.add('track_frame', start_time, end_time)
+        self.profiler.count(frame_id, features=len(features_xy), tracked=tracked,
+                            inliers=len(matches[0]) if matches is not None else 0,
+                            keyframe=is_keyframe)
         
-        return {
+        result = {
             'pose': self._get_current_pose_dict(frame_id),
-            'points': self._get_current_points_dict(),
             'processing_time': processing_time,
-            'features_count': len(keypoints)
+            'features_count': len(features_xy),
+            'tracked_count': tracked,
+            'is_keyframe': is_keyframe
         }
+        return result, keyframe_job
+    
+    def map_keyframe(self, job: dict) -> slice:
+        """Картирование ключевого кадра: триангуляция, вставка в карту, отбраковка и запрос BA
+        
+        Задания должны приходить в порядке ключевых кадров. Возвращает срез
+        добавленных строк point_cloud.
+        """
+        start_time = time.perf_counter_ns()
+        self.profiler.set_frame(job['frame_id'])
+        points_before = len(self.point_cloud)
+        self.poll_mapping()
+        
+        landmark_ids = None
+        if job['matches'] is not None:
+            # Триангуляция и вставка в карту только на ключевых кадрах
+            landmark_ids = self._update_map(job)
+        
+        # Фронтенд может добавить новые особенности после уже отслеженных
+        keyframe_xy = job['keyframe_xy']
+        ids = np.full(len(keyframe_xy), -1, dtype=np.int64)
+        if landmark_ids is not None:
+            ids[:len(landmark_ids)] = landmark_ids
+        observed = ids >= 0
+        with self.profiler.stage('ba_request'):
+            self.bundle_adjustment.add_keyframe(job['frame_id'], job['pose'], self.camera_matrix,
+                                                ids[observed], keyframe_xy[observed])
+        self.keyframe_landmarks = ids
+        
+        # Точки, видимые из нового ключевого кадра, не отбраковываются
+        with self.profiler.stage('cull'):
+            culled = self.point_cloud.cull(job['frame_id'], self.cull_min_observations,
+                                           self.cull_min_age, protected=ids[observed])
+            self.bundle_adjustment.remove_landmarks(culled)
+        self.profiler.add('map_keyframe', start_time, time.perf_counter_ns())
+        self.profiler.count(job['frame_id'], new_points=len(self.point_cloud) - points_before,
+                            culled=len(culled))
+        return slice(points_before, len(self.point_cloud))
+    
+    def poll_mapping(self):
+        """Перенос готовых результатов локальной BA в карту"""
+        for ba_result in self.bundle_adjustment.poll():
+            if 'error' in ba_result:
+                # Окно не изменилось, карта продолжает жить с прежними позами и точками
+                print(f"Локальная BA ключевого кадра {ba_result['keyframe_id']} отброшена: {ba_result['error']}")
+                continue
+            with self.profiler.stage('apply_ba'):
+                self._apply_ba_result(ba_result)
+    
+    def frame_timestamp(self, frame_id: int) -> float:
+        """Время кадра в секундах: метка датасета или номер кадра / frame_rate"""
+        if self.frame_timestamps is not None and 0 <= frame_id < len(self.frame_timestamps):
+            return float(self.frame_timestamps[frame_id])
+        if frame_id in self.capture_times:
+            return self.capture_times[frame_id]
+        return frame_id / self.frame_rate
     
     def _update_trajectory(self, frame_id: int):
         """Обновление траектории камеры"""
         position = self.current_pose[:3, 3]
-        rotation = self.current_pose[:3, :3]
-        
-        # Преобразование матрицы вращения в кватернион
-        q = self._rotation_matrix_to_quaternion(rotation)
-        
-        self.trajectory.append({
-            'x': float(position[0]),
-            'y': float(position[1]),
-            'z': float(position[2]),
-            'qx': float(q[0]),
-            'qy': float(q[1]),
-            'qz': float(q[2]),
-            'qw': float(q[3]),
-            'frame_id': frame_id,
-            'timestamp': frame_id * 0.033
-        })
-    
-    def _update_point_cloud(self, keypoints: List[cv2.KeyPoint], 
-                          descriptors: np.ndarray, matches: List[cv2.DMatch]):
-        """Обновление облака точек"""
-        # Фильтрация новых точек (не совпадающих с существующими)
-        new_points_indices = set(range(len(keypoints))) - set([m.trainIdx for m in matches])
-        
-        for idx in list(new_points_indices)[:50]:  # Ограничиваем количество новых точек
-            kp = keypoints[idx]
-            point_3d = self._project_to_3d(kp.pt)
-            
-            if point_3d is not None:
-                self.point_cloud.append({
-                    'x': float(point_3d[0]),
-                    'y': float(point_3d[1]),
-                    'z': float(point_3d[2]),
-                    'r': 100,
-                    'g': 200,
-                    'b': 255
-                })
-    
-    def _project_to_3d(self, point_2d: Tuple[float, float]) -> Optional[np.ndarray]:
-        """Проекция 2D точки в 3D пространство (упрощенная)"""
-        # В реальном SLAM здесь используется триангуляция между несколькими кадрами
-        # и оптимизация через bundle adjustment
-        
-        # Упрощенная проекция - предполагаем фиксированную глубину
-        depth = 5.0  # метры
-        point_normalized = np.linalg.inv(self.camera_matrix) @ np.array([point_2d[0], point_2d[1], 1.0])
-        point_3d_camera = point_normalized * depth
-        point_3d_world = self.current_pose @ np.append(point_3d_camera, 1.0)
-        
-        return point_3d_world[:3]
-    
-    def _rotation_matrix_to_quaternion(self, R: np.ndarray) -> np.ndarray:
-        """Преобразование матрицы вращения в кватернион"""
-        # Упрощенное преобразование
-        # В реальности нужно использовать правильную математику
-        return np.array([0.0, 0.0, 0.0, 1.0])  # Заглушка
+        q = matrix_to_quaternion(self.current_pose[:3, :3])
+        
+        self.trajectory.append(
+            frame_id=frame_id, timestamp=self.frame_timestamp(frame_id),
+            x=position[0], y=position[1], z=position[2],
+            qx=q[0], qy=q[1], qz=q[2], qw=q[3]
+        )
+    
+    def _update_map(self, job: dict) -> np.ndarray:
+        """Связывание инлаеров с точками карты, слияние повторно найденных точек и триангуляция новых"""
+        query_idx, train_idx, R, t, points1, points2, keypoints_count = job['matches']
+        frame_id = job['frame_id']
+        reference_id = job['reference_id']
+        descriptors = job['descriptors']
+        if descriptors is not None:
+            descriptors = descriptors[train_idx]
+        landmark_ids = np.full(keypoints_count, -1, dtype=np.int64)
+        
+        # Особенности, у которых в опорном кадре уже есть точка карты - повторные наблюдения
+        known_ids = self.keyframe_landmarks[query_idx]
+        known = known_ids >= 0
+        landmark_ids[train_idx[known]] = known_ids[known]
+        self.point_cloud.observe(known_ids[known], frame_id,
+                                 descriptors[known] if descriptors is not None else None)
+        
+        # Остальные триангулируются относительно опорного ключевого кадра;
+        # пары без параллакса отсеиваются по лучам еще до триангуляции
+        with self.profiler.stage('triangulate'):
+            candidates = np.flatnonzero(~known)
+            candidates = candidates[self._wide_parallax(R, t, points1[candidates], points2[candidates])]
+            points_world, accepted = self.bundle_adjustment.triangulate(
+                job['reference_pose'], self.camera_matrix, R, t, points1[candidates], points2[candidates]
+            )
+        new = candidates[accepted]
+        new_descriptors = descriptors[new] if descriptors is not None else None
+        
+        # Точки, потерянные трекингом и найденные снова, сливаются с уже существующими
+        with self.profiler.stage('fusion'):
+            fused_ids = self._find_fused_landmarks(job['pose'], points2[new], points_world,
+                                                   new_descriptors, known_ids[known])
+        fused = fused_ids >= 0
+        self.profiler.count(frame_id, reobserved=int(known.sum()), fused=int(fused.sum()))
+        landmark_ids[train_idx[new[fused]]] = fused_ids[fused]
+        self.point_cloud.observe(fused_ids[fused], frame_id,
+                                 new_descriptors[fused] if descriptors is not None else None)
+        self.bundle_adjustment.window.add_observations(reference_id, fused_ids[fused], points1[new[fused]])
+        
+        new_ids = self.point_cloud.add(points_world[~fused], frame_id,
+                                       new_descriptors[~fused] if descriptors is not None else None)
+        landmark_ids[train_idx[new[~fused]]] = new_ids
+        self.bundle_adjustment.add_landmarks(reference_id, new_ids, points_world[~fused],
+                                             points1[new[~fused]])
+        return landmark_ids
+    
+    def _wide_parallax(self, R: np.ndarray, t: np.ndarray, points1: np.ndarray,
+                       points2: np.ndarray) -> np.ndarray:
+        """Маска пар, лучи которых расходятся не меньше минимального параллакса
+
+        Лучи обоих кадров строятся back_project в системе первой камеры:
+        вторая камера задается обратным движением (x2 = R x1 + t).
+        """
+        if len(points1) == 0:
+            return np.zeros(0, dtype=bool)
+        camera2 = invert(make_pose(R, t))
+        rays1 = self.back_project(points1, 1.0, np.eye(4))
+        rays2 = self.back_project(points2, 1.0, camera2) - camera2[:3, 3]
+        cos_parallax = np.einsum('ij,ij->i', rays1, rays2) / (
+            np.linalg.norm(rays1, axis=1) * np.linalg.norm(rays2, axis=1))
+        return cos_parallax < self.bundle_adjustment.min_parallax_cos
+    
+    def _find_fused_landmarks(self, pose: np.ndarray, uv: np.ndarray, points_world: np.ndarray,
+                              descriptors: Optional[np.ndarray], exclude: np.ndarray) -> np.ndarray:
+        """id точки окна BA для каждой новой точки (-1 - совпадения нет)
+        
+        Точки окна проецируются в ключевой кадр и ищутся в KD-дереве вокруг
+        пикселей новых точек; совпадение подтверждается глубиной и, если
+        есть, дескриптором. Одна точка карты сливается не более одного раза.
+        """
+        fused = np.full(len(uv), -1, dtype=np.int64)
+        candidates = np.setdiff1d(self.bundle_adjustment.window_landmarks(), exclude)
+        if len(candidates) == 0 or len(uv) == 0:
+            return fused
+        
+        data = self.point_cloud.data[candidates]
+        candidates_world = np.stack([data['x'], data['y'], data['z']], axis=1).astype(np.float64)
+        # Мир -> камера ключевого кадра (поза хранится как камера -> мир)
+        candidates_camera = (candidates_world - pose[:3, 3]) @ pose[:3, :3]
+        in_front = candidates_camera[:, 2] > 0
+        candidates, candidates_camera = candidates[in_front], candidates_camera[in_front]
+        if len(candidates) == 0:
+            return fused
+        projected = candidates_camera @ self.camera_matrix.T
+        projected = projected[:, :2] / projected[:, 2:]
+        
+        distance, index = cKDTree(projected).query(uv, distance_upper_bound=self.fusion_radius_px)
+        matched = np.isfinite(distance)
+        index = np.where(matched, index, 0)
+        depth = ((points_world - pose[:3, 3]) @ pose[:3, :3])[:, 2]
+        matched &= np.abs(candidates_camera[index, 2] - depth) < self.fusion_depth_ratio * depth
+        ids = candidates[index]
+        if descriptors is not None:
+            has_descriptor = self.point_cloud.has_descriptor[ids]
+            matched &= ~has_descriptor | (self.point_cloud.descriptor_distance(ids, descriptors)
+                                          <= self.fusion_max_hamming)
+        
+        matched_idx = np.flatnonzero(matched)
+        _, first = np.unique(ids[matched_idx], return_index=True)
+        fused[matched_idx[first]] = ids[matched_idx[first]]
+        return fused
+    
+    def _apply_ba_result(self, result: dict):
+        """Перенос оптимизированных точек и позы опорного кадра в карту"""
+        landmark_ids = result['landmark_ids']
+        points = result['points']
+        data = self.point_cloud.data
+        data['x'][landmark_ids] = points[:, 0]
+        data['y'][landmark_ids] = points[:, 1]
+        data['z'][landmark_ids] = points[:, 2]
+        
+        # Поза опорного кадра подхватывается трекингом в начале следующего кадра
+        with self._corrections_lock:
+            self._keyframe_corrections = result['keyframes']
+    
+    def get_state(self) -> dict:
+        """Полное состояние трекера и карты плоским словарем массивов
+        
+        Ключи вложенных компонентов имеют префикс (landmarks., frontend., selector., ba.).
+        Вызывать, когда трекинг и картирование не работают с состоянием.
+        """
+        with self._corrections_lock:
+            corrections = dict(self._keyframe_corrections)
+        state = {
+            'frontend_type': np.array(type(self.frontend).__name__),
+            'camera_matrix': self.camera_matrix,
+            'current_pose': self.current_pose,
+            'trajectory': self.trajectory.data,
+            'keyframe_xy': self.keyframe_xy,
+            'keyframe_pose': self.keyframe_pose,
+            'keyframe_id': np.array(-1 if self.keyframe_id is None else self.keyframe_id),
+            'keyframe_count': np.array(self.keyframe_count),
+            'keyframe_landmarks': self.keyframe_landmarks,
+            'correction_ids': np.array(list(corrections), dtype=np.int64),
+            'correction_poses': np.array(list(corrections.values())).reshape(-1, 4, 4)
+        }
+        for prefix, component in (('landmarks', self.point_cloud), ('frontend', self.frontend),
+                                  ('selector', self.keyframe_selector), ('ba', self.bundle_adjustment.window)):
+            for key, value in component.get_state().items():
+                state[f"{prefix}.{key}"] = value
+        return state
+    
+    def set_state(self, state: dict):
+        """Восстановление состояния, сохраненного get_state"""
+        frontend_type = str(state['frontend_type'])
+        if frontend_type != type(self.frontend).__name__:
+            raise ValueError(f"Checkpoint frontend {frontend_type} does not match {type(self.frontend).__name__}")
+        
+        self.camera_matrix = state['camera_matrix']
+        self.current_pose = state['current_pose'].copy()
+        self.trajectory.clear()
+        self.trajectory.extend(state['trajectory'])
+        self.keyframe_xy = state['keyframe_xy'].astype(np.float32)
+        self.keyframe_pose = state['keyframe_pose'].copy()
+        keyframe_id = int(state['keyframe_id'])
+        self.keyframe_id = None if keyframe_id < 0 else keyframe_id
+        self.keyframe_count = int(state['keyframe_count'])
+        self.keyframe_landmarks = state['keyframe_landmarks'].astype(np.int64)
+        with self._corrections_lock:
+            self._keyframe_corrections = {int(kid): pose for kid, pose
+                                          in zip(state['correction_ids'], state['correction_poses'])}
+        
+        for prefix, component in (('landmarks', self.point_cloud), ('frontend', self.frontend),
+                                  ('selector', self.keyframe_selector), ('ba', self.bundle_adjustment.window)):
+            component.set_state({key[len(prefix) + 1:]: value for key, value in state.items()
+                                 if key.startswith(prefix + '.')})
+    
+    def close(self):
+        """Остановка фоновой оптимизации и потоков фронтенда"""
+        self.bundle_adjustment.close()
+        self.frontend.close()
     
     def _get_current_pose_dict(self, frame_id: int) -> dict:
         """Получение текущей позы в виде словаря"""
-        if not self.trajectory:
+        if len(self.trajectory) == 0:
             return {
                 'x': 0.0, 'y': 0.0, 'z': 0.0,
                 'qx': 0.0, 'qy': 0.0, 'qz': 0.0, 'qw': 1.0,
                 'frame_id': frame_id,
-                'timestamp': frame_id * 0.033
+                'timestamp': self.frame_timestamp(frame_id)
             }
-        return self.trajectory[-1]
+        return self.trajectory.to_dicts(-1)[0]
     
     def _get_current_points_dict(self) -> List[dict]:
-        """Получение текущего облака точек"""
-        return self.point_cloud[-100:] if self.point_cloud else []
+        """Превью облака: новейшие точки карты, равномерно прореженные по пространству"""
+        # Прореживается только хвост карты, поэтому стоимость кадра не растет с ее размером
+        start = max(0, len(self.point_cloud) - 2000)
+        return to_dicts(self.point_cloud.export(start, max_points=100))
 
 class SLAMProcessor:
-    def __init__(self, dataset_type: str = "euroc"):
-        self.slam = MonoSLAM()
+    def __init__(self, dataset_type: str = "euroc", frontend: str = "orb", extract_threads: int = 0):
+        self.slam = MonoSLAM(frontend=frontend, extract_threads=extract_threads)
         self.processed_frames = 0
         
-    def process_video(self, video_path: str, output_path: str = None) -> dict:
-        """Обработка видео через реальный SLAM"""
-        cap = cv2.VideoCapture(video_path)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    def process_video(self, video_path: str, output_path: str = None, prefetch: int = 8,
+                      push: PushChannel = None, checkpoint_interval: int = 0,
+                      resume: bool = False, voxel_size: float = None, max_points: int = None,
+                      profile: bool = False, trace_path: str = None) -> dict:
+        """Обработка видео через реальный SLAM
+
+        voxel_size/max_points ограничивают облако в итоговом JSON (см. LandmarkStore.export),
+        profile/trace_path включают таймеры стадий (см. StageProfiler).
+        """
+        self.slam.profiler.enabled = profile or trace_path is not None
+        # Продолжение прерванного прогона с последней контрольной точки
+        checkpoint_file = checkpoint_path(output_path) if output_path else None
+        progress = None
+        if resume and checkpoint_file and checkpoint_file.exists():
+            progress = load_checkpoint(checkpoint_file, self.slam)
+            print(f"Продолжение с контрольной точки {checkpoint_file}")
+        start_frame = progress['frame_id'] + 1 if progress else 0
+        
+        # Декодирование видео идет в отдельном потоке с ограниченной очередью
+        reader = VideoFrameReader(video_path, prefetch=prefetch, grayscale=True, start_frame=start_frame)
+        total_frames = reader.total_frames
+        if reader.fps > 0:
+            # Время поз в траектории - по частоте кадров видео
+            self.slam.frame_rate = reader.fps
         
         results = {
             'trajectory': [],
@@ -244,44 +792,55 @@ class SLAMProcessor:
             'processing_times': []
         }
         
-        frame_count = 0
+        writer = ResultsStreamWriter(output_path, metadata={'total_frames': total_frames},
+                                     append=progress is not None) if output_path else None
+        if progress is not None:
+            # Записи после контрольной точки будут получены заново
+            writer.truncate(progress['pose_count'], progress['point_count'])
         
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-                
-            # Пропускаем каждый второй кадр для производительности
-            if frame_count % 2 == 0:
-                frame_count += 1
-                continue
-                
-            # Обработка кадра через SLAM
-            slam_result = self.slam.process_frame(frame, frame_count)
-            
-            if slam_result:
-                results['trajectory'] = self.slam.trajectory
-                results['point_cloud'] = self.slam.point_cloud
-                results['processed_frames'] = frame_count
-                results['processing_times'].append(slam_result['processing_time'])
-                
-            frame_count += 1
-            
-            # Сохранение прогресса каждые 50 кадров
-            if frame_count % 50 == 0 and output_path:
-                self._save_intermediate_results(results, output_path, frame_count)
+        def on_checkpoint(frame_id):
+            save_checkpoint(checkpoint_file, self.slam, frame_id=frame_id,
+                            pose_count=writer.pose_count, point_count=writer.point_count)
+        if push:
+            push.start(video=str(video_path), total_frames=total_frames)
+        
+        def on_result(slam_result):
+            results['processing_times'].append(slam_result['processing_time'])
+            frame_count = len(results['processing_times'])
+            if push:
+                push.pose(slam_result['pose'], processed_frames=frame_count)
+            if frame_count % 50 == 0:
                 print(f"Обработано кадров: {frame_count}/{total_frames}")
-                
+        
+        # Чтение, трекинг, картирование и запись идут в отдельных потоках
+        pipeline = SLAMPipeline(self.slam, writer, flush_interval=50, on_result=on_result,
+                                on_points=push.points if push else None,
+                                checkpoint_interval=checkpoint_interval if writer else 0,
+                                on_checkpoint=on_checkpoint, start_frame=start_frame)
+        try:
             # Ограничиваем обработку для демонстрации
-            if frame_count > 300:
-                break
-                
-        cap.release()
+            results['pipeline'] = pipeline.run(itertools.islice(reader, max(0, 301 - start_frame)))
+        finally:
+            reader.close()
+        results['processed_frames'] = start_frame + pipeline.frame_count
+        print(format_metrics(results['pipeline']))
+        
+        self.slam.close()
+        self._report_profile(results, trace_path)
+        
+        # Словари создаются один раз на границе API
+        results['trajectory'] = self.slam.trajectory.to_dicts()
+        results['point_cloud'] = to_dicts(self.slam.point_cloud.export(0, voxel_size, max_points))
         
         # Финальное сохранение
         if output_path:
+            writer.close(processed_frames=results['processed_frames'])
             self._save_results(results, output_path)
+            remove_checkpoint(checkpoint_file)
             
+        if push:
+            push.end(processed_frames=results['processed_frames'])
+        
         # Статистика обработки
         if results['processing_times']:
             avg_time = np.mean(results['processing_times'])
@@ -289,16 +848,101 @@ class SLAMProcessor:
             
         return results
     
-    def process_live_stream(self, stream_url: str, duration: int = 30) -> dict:
-        """Обработка живого видеопотока с дрона"""
-        # Реализация обработки живого потока
-        pass
+    def process_live_stream(self, stream_url: str, duration: int = 30, output_path: str = None,
+                            latency_budget: float = 0.5, on_pose: Callable[[dict], None] = None,
+                            push: PushChannel = None, voxel_size: float = None,
+                            max_points: int = None, profile: bool = False,
+                            trace_path: str = None) -> dict:
+        """Обработка живого видеопотока с дрона
+        
+        Всегда обрабатывается самый свежий кадр: устаревшие вытесняются в
+        потоке захвата, а кадры старше latency_budget секунд отбрасываются
+        перед трекингом. Каждая поза сразу передается в on_pose.
+        """
+        self.slam.profiler.enabled = profile or trace_path is not None
+        reader = LiveFrameReader(stream_url, grayscale=True)
+        if not reader.isOpened():
+            reader.close()
+            raise RuntimeError(f"Cannot open video stream: {stream_url}")
+        
+        def timed_frames():
+            # Источник без FPS: время кадра - момент захвата относительно первого кадра
+            stream_start = None
+            for frame_id, frame, capture_time in reader:
+                if stream_start is None:
+                    stream_start = capture_time
+                self.slam.capture_times[frame_id] = capture_time - stream_start
+                yield frame_id, frame, capture_time
+        
+        if reader.fps > 0:
+            self.slam.frame_rate = reader.fps
+            frames = reader
+        else:
+            frames = timed_frames()
+        
+        results = {
+            'trajectory': [],
+            'point_cloud': [],
+            'processed_frames': 0,
+            'stream_url': str(stream_url),
+            'processing_times': []
+        }
+        writer = ResultsStreamWriter(output_path, metadata={'stream_url': str(stream_url)}) if output_path else None
+        poses_before = len(self.slam.trajectory)
+        points_before = len(self.slam.point_cloud)
+        if push:
+            push.start(stream_url=str(stream_url), total_frames=0)
+        
+        def on_result(slam_result):
+            results['processing_times'].append(slam_result['processing_time'])
+            if push:
+                push.pose(slam_result['pose'], latency=round(slam_result.get('latency', 0.0), 4))
+            if on_pose:
+                on_pose(slam_result)
+        
+        pipeline = SLAMPipeline(self.slam, writer, frame_queue=1, flush_interval=50,
+                                on_result=on_result, max_latency=latency_budget,
+                                on_points=push.points if push else None)
+        # По истечении duration захват останавливается, конвейер дорабатывает взятые кадры
+        timer = threading.Timer(duration, reader.close) if duration else None
+        if timer:
+            timer.daemon = True
+            timer.start()
+        try:
+            results['pipeline'] = pipeline.run(frames)
+        finally:
+            if timer:
+                timer.cancel()
+            reader.close()
+        
+        results['processed_frames'] = pipeline.frame_count
+        results['captured_frames'] = reader.captured_frames
+        results['dropped_frames'] = reader.dropped_frames + pipeline.late_frames
+        print(format_metrics(results['pipeline']))
+        print(f"Захвачено кадров: {reader.captured_frames}, отброшено: {results['dropped_frames']}")
+        
+        self.slam.close()
+        self._report_profile(results, trace_path)
+        results['trajectory'] = self.slam.trajectory.to_dicts(poses_before)
+        results['point_cloud'] = to_dicts(self.slam.point_cloud.export(points_before, voxel_size, max_points))
+        
+        if output_path:
+            writer.close(processed_frames=results['processed_frames'])
+            self._save_results(results, output_path)
+        if push:
+            push.end(processed_frames=results['processed_frames'], dropped_frames=results['dropped_frames'])
+        
+        return results
     
-    def _save_intermediate_results(self, results: dict, output_path: str, frame_count: int):
-        """Сохранение промежуточных результатов"""
-        intermediate_file = Path(output_path).with_suffix(f'.frame_{frame_count}.json')
-        with open(intermediate_file, 'w') as f:
-            json.dump(results, f, indent=2, default=self._json_serializer)
+    def _report_profile(self, results: dict, trace_path: str = None):
+        """Сводка таймеров стадий в результатах и консоли, Chrome trace по запросу"""
+        profiler = self.slam.profiler
+        if not profiler.enabled:
+            return
+        results['profile'] = profiler.report()
+        print(format_profile(results['profile']['stages']))
+        if trace_path:
+            profiler.write_chrome_trace(trace_path)
     
     def _save_results(self, results: dict, output_path: str):
         """Сохранение финальных результатов"""
@@ -321,20 +965,53 @@ def main():
     import argparse
     
     parser = argparse.ArgumentParser(description='Real MonoSLAM Processor')
-    parser.add_argument('--video', type=str, required=True, help='Path to input video')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--video', type=str, help='Path to input video')
+    source.add_argument('--live', type=str, help='Live stream URL, device index or local file')
+    parser.add_argument('--duration', type=int, default=30, help='Live processing duration, seconds')
+    parser.add_argument('--latency-budget', type=float, default=0.5,
+                       help='Drop live frames older than this many seconds')
+    parser.add_argument('--push', action='store_true',
+                       help='Stream poses and new points to stdout as NDJSON, logs go to stderr')
+    parser.add_argument('--checkpoint-interval', type=int, default=500,
+                       help='Frames between state checkpoints for --video (0 - disabled)')
+    parser.add_argument('--resume', action='store_true', help='Continue --video from the last checkpoint')
+    parser.add_argument('--voxel-size', type=float, default=None,
+                       help='Downsample exported and pushed points to one per voxel of this size')
+    parser.add_argument('--max-points', type=int, default=None,
+                       help='Upper bound on exported point cloud size')
+    parser.add_argument('--profile', action='store_true',
+                       help='Record per-stage timings and print p50/p95/p99 per stage')
+    parser.add_argument('--trace', type=str, default=None,
+                       help='Write a Chrome trace JSON of stage timings to this path')
     parser.add_argument('--output', type=str, required=True, help='Path to output JSON')
     parser.add_argument('--dataset', type=str, choices=['euroc', 'tum', 'custom'], 
                        default='custom', help='Dataset type')
+    parser.add_argument('--frontend', type=str, choices=['orb', 'klt'], default='orb',
+                       help='Tracking frontend')
+    parser.add_argument('--extract-threads', type=int, default=0,
+                       help='Threads for tiled ORB extraction (0 - single call)')
     
     args = parser.parse_args()
     
-    processor = SLAMProcessor(args.dataset)
-    results = processor.process_video(args.video, args.output)
-    
-    print(f"\nОбработка завершена!")
-    print(f"Обработано кадров: {results['processed_frames']}")
-    print(f"Точек в облаке: {len(results['point_cloud'])}")
-    print(f"Поз в траектории: {len(results['trajectory'])}")
+    processor = SLAMProcessor(args.dataset, args.frontend, args.extract_threads)
+    with stdout_channel(args.push, args.voxel_size) as push:
+        if args.live:
+            results = processor.process_live_stream(args.live, args.duration, args.output,
+                                                    args.latency_budget, push=push,
+                                                    voxel_size=args.voxel_size, max_points=args.max_points,
+                                                    profile=args.profile, trace_path=args.trace)
+        else:
+            results = processor.process_video(args.video, args.output, push=push,
+                                              checkpoint_interval=args.checkpoint_interval,
+                                              resume=args.resume, voxel_size=args.voxel_size,
+                                              max_points=args.max_points, profile=args.profile,
+                                              trace_path=args.trace)
+        
+        print(f"\nОбработка завершена!")
+        print(f"Обработано кадров: {results['processed_frames']}")
+        print(f"Точек в облаке: {len(results['point_cloud'])}")
+        print(f"Поз в траектории: {len(results['trajectory'])}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
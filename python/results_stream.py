@@ -0,0 +1,223 @@
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+# Записи фиксированной длины, little-endian, без выравнивания
+POSE_DTYPE = np.dtype([
+    ('frame_id', '<i8'), ('timestamp', '<f8'),
+    ('x', '<f8'), ('y', '<f8'), ('z', '<f8'),
+    ('qx', '<f8'), ('qy', '<f8'), ('qz', '<f8'), ('qw', '<f8')
+])
+
+POINT_DTYPE = np.dtype([
+    ('x', '<f4'), ('y', '<f4'), ('z', '<f4'),
+    ('r', 'u1'), ('g', 'u1'), ('b', 'u1')
+])
+
+STREAM_VERSION = 1
+
+
+def stream_paths(output_path) -> dict:
+    """Пути файлов потока результатов рядом с выходным JSON"""
+    output_path = Path(output_path)
+    return {
+        'manifest': output_path.with_suffix('.manifest.json'),
+        'poses': output_path.with_suffix('.poses.bin'),
+        'points': output_path.with_suffix('.points.bin')
+    }
+
+
+def to_records(items, dtype: np.dtype) -> np.ndarray:
+    """Преобразование списка словарей (или готового массива) в структурированный массив"""
+    if isinstance(items, np.ndarray):
+        if items.dtype == dtype:
+            return items
+        records = np.zeros(len(items), dtype=dtype)
+        for name in dtype.names:
+            records[name] = items[name]
+        return records
+
+    items = list(items)
+    records = np.zeros(len(items), dtype=dtype)
+    for name in dtype.names:
+        records[name] = [item.get(name, 0) for item in items]
+    return records
+
+
+def to_dicts(records: np.ndarray) -> List[dict]:
+    """Преобразование структурированного массива в список словарей для JSON"""
+    names = records.dtype.names
+    columns = [records[name].tolist() for name in names]
+    return [dict(zip(names, values)) for values in zip(*columns)]
+
+
+class ResultsStreamWriter:
+    """Потоковая запись результатов SLAM в бинарные файлы с дозаписью
+
+    Позы и точки дописываются в конец `.poses.bin` / `.points.bin`
+    записями фиксированной длины. Небольшой `.manifest.json` хранит
+    формат записей и число уже сброшенных на диск записей, поэтому
+    читатель может дочитывать только новые данные.
+    """
+
+    def __init__(self, output_path, metadata: Optional[dict] = None, append: bool = False):
+        self.output_path = Path(output_path)
+        self.paths = stream_paths(self.output_path)
+        self.metadata = metadata or {}
+
+        mode = 'ab' if append else 'wb'
+        self._poses_file = open(self.paths['poses'], mode)
+        self._points_file = open(self.paths['points'], mode)
+        self.pose_count = self._poses_file.tell() // POSE_DTYPE.itemsize
+        self.point_count = self._points_file.tell() // POINT_DTYPE.itemsize
+        self.status = 'running'
+        self._write_manifest()
+
+    def append_poses(self, poses: Iterable) -> int:
+        """Дозапись поз (словари или массив POSE_DTYPE)"""
+        records = to_records(poses, POSE_DTYPE)
+        self._poses_file.write(records.tobytes())
+        self.pose_count += len(records)
+        return len(records)
+
+    def append_pose(self, pose: dict) -> int:
+        return self.append_poses([pose])
+
+    def append_points(self, points: Iterable) -> int:
+        """Дозапись точек облака (словари или массив POINT_DTYPE)"""
+        records = to_records(points, POINT_DTYPE)
+        self._points_file.write(records.tobytes())
+        self.point_count += len(records)
+        return len(records)
+
+    def flush(self, **progress):
+        """Сброс буферов на диск и обновление манифеста"""
+        self._poses_file.flush()
+        self._points_file.flush()
+        self.metadata.update(progress)
+        self._write_manifest()
+
+    def truncate(self, pose_count: int, point_count: int):
+        """Отбрасывание записей после заданных счетчиков (продолжение с контрольной точки)"""
+        self._poses_file.truncate(pose_count * POSE_DTYPE.itemsize)
+        self._points_file.truncate(point_count * POINT_DTYPE.itemsize)
+        self.pose_count = pose_count
+        self.point_count = point_count
+        self._write_manifest()
+
+    def close(self, status: str = 'finished', **progress):
+        """Финальный сброс и закрытие файлов"""
+        if self._poses_file.closed:
+            return
+        self.status = status
+        self.flush(**progress)
+        self._poses_file.close()
+        self._points_file.close()
+
+    def _write_manifest(self):
+        manifest = {
+            'version': STREAM_VERSION,
+            'status': self.status,
+            'updated': datetime.now().isoformat(),
+            'metadata': self.metadata,
+            'poses': {
+                'file': self.paths['poses'].name,
+                'dtype': POSE_DTYPE.descr,
+                'record_size': POSE_DTYPE.itemsize,
+                'count': self.pose_count
+            },
+            'points': {
+                'file': self.paths['points'].name,
+                'dtype': POINT_DTYPE.descr,
+                'record_size': POINT_DTYPE.itemsize,
+                'count': self.point_count
+            }
+        }
+        # Атомарная замена - читатель никогда не видит наполовину записанный манифест
+        tmp_path = self.paths['manifest'].with_name(self.paths['manifest'].name + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, default=str)
+        os.replace(tmp_path, self.paths['manifest'])
+
+
+class ResultsStreamReader:
+    """Чтение потока результатов по манифесту, в том числе во время записи"""
+
+    def __init__(self, output_path):
+        self.paths = stream_paths(output_path)
+
+    def manifest(self) -> dict:
+        with open(self.paths['manifest'], 'r') as f:
+            return json.load(f)
+
+    def poses(self, start: int = 0) -> np.ndarray:
+        """Позы начиная с записи `start` (memmap без копирования)"""
+        return self._read('poses', POSE_DTYPE, start)
+
+    def points(self, start: int = 0) -> np.ndarray:
+        """Точки облака начиная с записи `start` (memmap без копирования)"""
+        return self._read('points', POINT_DTYPE, start)
+
+    def _read(self, key: str, dtype: np.dtype, start: int) -> np.ndarray:
+        count = self.manifest()[key]['count'] - start
+        if count <= 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(self.paths[key], dtype=dtype, mode='r',
+                         offset=start * dtype.itemsize, shape=(count,))
+
+    def to_results(self) -> dict:
+        """Сборка результатов в привычном JSON формате"""
+        manifest = self.manifest()
+        results = dict(manifest['metadata'])
+        results['trajectory'] = to_dicts(self.poses())
+        results['point_cloud'] = to_dicts(self.points())
+        return results
+
+    def export_json(self, json_path=None) -> Path:
+        """Экспорт потока в JSON по запросу"""
+        json_path = Path(json_path) if json_path else self.paths['manifest'].with_name(
+            self.paths['manifest'].name.replace('.manifest.json', '.json'))
+        with open(json_path, 'w') as f:
+            json.dump(self.to_results(), f, indent=2, default=str)
+        return json_path
+
+    def export_trajectory(self, path, trajectory_format: str = 'tum') -> Path:
+        """Траектория в текстовом формате TUM (t x y z qx qy qz qw) или KITTI (матрица 3x4)"""
+        poses = self.poses()
+        path = Path(path)
+        if trajectory_format == 'tum':
+            columns = np.column_stack([poses[name] for name in
+                                       ('timestamp', 'x', 'y', 'z', 'qx', 'qy', 'qz', 'qw')])
+            np.savetxt(path, columns, fmt='%.9f')
+        elif trajectory_format == 'kitti':
+            from se3 import records_to_poses
+            # Все позы переводятся в матрицы одним пакетным вызовом
+            np.savetxt(path, records_to_poses(poses)[:, :3, :].reshape(-1, 12), fmt='%.9f')
+        else:
+            raise ValueError(f"Unknown trajectory format: {trajectory_format}")
+        return path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Export streamed SLAM results to JSON')
+    parser.add_argument('--results', type=str, required=True, help='Output path used for processing')
+    parser.add_argument('--json', type=str, default=None, help='JSON export path')
+    parser.add_argument('--trajectory', type=str, default=None,
+                        help='Export only the trajectory as text to this path instead of JSON')
+    parser.add_argument('--trajectory-format', type=str, choices=['tum', 'kitti'], default='tum',
+                        help='Text trajectory format')
+
+    args = parser.parse_args()
+
+    reader = ResultsStreamReader(args.results)
+    if args.trajectory:
+        exported = reader.export_trajectory(args.trajectory, args.trajectory_format)
+    else:
+        exported = reader.export_json(args.json)
+    print(f"Результаты экспортированы: {exported}")
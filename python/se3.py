@@ -0,0 +1,177 @@
+import numpy as np
+
+from results_stream import POSE_DTYPE
+
+# Пакетные операции SO(3)/SE(3): повороты (..., 3, 3), позы (..., 4, 4),
+# кватернионы (..., 4) в порядке (x, y, z, w), как в POSE_DTYPE и scipy
+
+
+def matrix_to_quaternion(R: np.ndarray) -> np.ndarray:
+    """Кватернионы (..., 4) матриц поворота (..., 3, 3), знак выбирается с w >= 0
+
+    Метод Шеппарда: компонента считается от наибольшего из следа и
+    диагональных элементов, поэтому точность не падает у поворотов на 180°.
+    """
+    R = np.asarray(R, dtype=np.float64)
+    shape = R.shape[:-2]
+    R = R.reshape(-1, 3, 3)
+    diagonal = np.diagonal(R, axis1=1, axis2=2)
+    trace = diagonal.sum(axis=1)
+    choice = np.argmax(np.column_stack([diagonal, trace]), axis=1)
+
+    q = np.empty((len(R), 4))
+    for i in range(3):
+        rows = np.flatnonzero(choice == i)
+        j, k = (i + 1) % 3, (i + 2) % 3
+        m = R[rows]
+        q[rows, i] = 1 - trace[rows] + 2 * m[:, i, i]
+        q[rows, j] = m[:, j, i] + m[:, i, j]
+        q[rows, k] = m[:, k, i] + m[:, i, k]
+        q[rows, 3] = m[:, k, j] - m[:, j, k]
+    rows = np.flatnonzero(choice == 3)
+    m = R[rows]
+    q[rows, 0] = m[:, 2, 1] - m[:, 1, 2]
+    q[rows, 1] = m[:, 0, 2] - m[:, 2, 0]
+    q[rows, 2] = m[:, 1, 0] - m[:, 0, 1]
+    q[rows, 3] = 1 + trace[rows]
+
+    q /= np.linalg.norm(q, axis=1, keepdims=True)
+    q[q[:, 3] < 0] *= -1
+    return q.reshape(shape + (4,))
+
+
+def quaternion_to_matrix(q: np.ndarray) -> np.ndarray:
+    """Матрицы поворота (..., 3, 3) кватернионов (..., 4); кватернионы нормируются"""
+    q = np.asarray(q, dtype=np.float64)
+    q = q / np.linalg.norm(q, axis=-1, keepdims=True)
+    x, y, z, w = np.moveaxis(q, -1, 0)
+    R = np.empty(q.shape[:-1] + (3, 3))
+    R[..., 0, 0] = 1 - 2 * (y * y + z * z)
+    R[..., 0, 1] = 2 * (x * y - z * w)
+    R[..., 0, 2] = 2 * (x * z + y * w)
+    R[..., 1, 0] = 2 * (x * y + z * w)
+    R[..., 1, 1] = 1 - 2 * (x * x + z * z)
+    R[..., 1, 2] = 2 * (y * z - x * w)
+    R[..., 2, 0] = 2 * (x * z - y * w)
+    R[..., 2, 1] = 2 * (y * z + x * w)
+    R[..., 2, 2] = 1 - 2 * (x * x + y * y)
+    return R
+
+
+def rotvec_to_matrix(rotvec: np.ndarray) -> np.ndarray:
+    """Матрицы поворота (..., 3, 3) векторов Родрига (..., 3)"""
+    rotvec = np.asarray(rotvec, dtype=np.float64)
+    theta = np.linalg.norm(rotvec, axis=-1)
+    # sin(θ)/θ и (1 - cos(θ))/θ² с рядом Тейлора у нуля
+    small = theta < 1e-6
+    safe = np.where(small, 1.0, theta)
+    a = np.where(small, 1 - theta ** 2 / 6, np.sin(safe) / safe)
+    b = np.where(small, 0.5 - theta ** 2 / 24, (1 - np.cos(safe)) / safe ** 2)
+    x, y, z = np.moveaxis(rotvec, -1, 0)
+    K = np.zeros(rotvec.shape[:-1] + (3, 3))
+    K[..., 0, 1], K[..., 0, 2] = -z, y
+    K[..., 1, 0], K[..., 1, 2] = z, -x
+    K[..., 2, 0], K[..., 2, 1] = -y, x
+    return np.eye(3) + a[..., None, None] * K + b[..., None, None] * (K @ K)
+
+
+def matrix_to_rotvec(R: np.ndarray) -> np.ndarray:
+    """Векторы Родрига (..., 3) матриц поворота (..., 3, 3), через кватернион"""
+    q = matrix_to_quaternion(R)
+    vector = q[..., :3]
+    sin_half = np.linalg.norm(vector, axis=-1)
+    angle = 2 * np.arctan2(sin_half, q[..., 3])
+    small = sin_half < 1e-9
+    # angle / sin(angle/2) -> 2 при angle -> 0
+    scale = np.where(small, 2.0, angle / np.where(small, 1.0, sin_half))
+    return vector * scale[..., None]
+
+
+def make_pose(R: np.ndarray, t: np.ndarray) -> np.ndarray:
+    """Позы (..., 4, 4) из поворотов (..., 3, 3) и сдвигов (..., 3)"""
+    R = np.asarray(R, dtype=np.float64)
+    pose = np.zeros(R.shape[:-2] + (4, 4))
+    pose[..., :3, :3] = R
+    pose[..., :3, 3] = t
+    pose[..., 3, 3] = 1.0
+    return pose
+
+
+def invert(pose: np.ndarray) -> np.ndarray:
+    """Обратные жесткие преобразования (..., 4, 4) без общего обращения матриц"""
+    pose = np.asarray(pose, dtype=np.float64)
+    R_inv = np.swapaxes(pose[..., :3, :3], -1, -2)
+    return make_pose(R_inv, -(R_inv @ pose[..., :3, 3, None])[..., 0])
+
+
+def compose(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Композиция a ∘ b с транслированием по пакетным осям"""
+    return np.matmul(a, b)
+
+
+def relative(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Движение от a к b: a⁻¹ ∘ b"""
+    return np.matmul(invert(a), b)
+
+
+def slerp(q0: np.ndarray, q1: np.ndarray, alpha) -> np.ndarray:
+    """Сферическая интерполяция кватернионов (..., 4) с долей alpha (...)"""
+    q0 = np.asarray(q0, dtype=np.float64)
+    q1 = np.asarray(q1, dtype=np.float64)
+    alpha = np.asarray(alpha, dtype=np.float64)[..., None]
+    dot = np.sum(q0 * q1, axis=-1, keepdims=True)
+    # Кратчайшая дуга: q и -q - один поворот
+    q1 = np.where(dot < 0, -q1, q1)
+    dot = np.abs(dot)
+    theta = np.arccos(np.clip(dot, -1.0, 1.0))
+    sin_theta = np.sin(theta)
+    close = sin_theta < 1e-6
+    safe = np.where(close, 1.0, sin_theta)
+    w0 = np.where(close, 1 - alpha, np.sin((1 - alpha) * theta) / safe)
+    w1 = np.where(close, alpha, np.sin(alpha * theta) / safe)
+    q = w0 * q0 + w1 * q1
+    return q / np.linalg.norm(q, axis=-1, keepdims=True)
+
+
+def interpolate_poses(times: np.ndarray, poses: np.ndarray, query_times: np.ndarray) -> np.ndarray:
+    """Позы (M, 4, 4) в моменты query_times по отсортированным (times, poses)
+
+    Сдвиг интерполируется линейно, поворот - slerp; вне диапазона times
+    берутся крайние позы.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    poses = np.asarray(poses, dtype=np.float64)
+    query_times = np.asarray(query_times, dtype=np.float64)
+    if len(times) == 1:
+        return np.repeat(poses, len(query_times), axis=0)
+    right = np.clip(np.searchsorted(times, query_times), 1, len(times) - 1)
+    left = right - 1
+    span = times[right] - times[left]
+    alpha = np.clip((query_times - times[left]) / np.where(span > 0, span, 1.0), 0.0, 1.0)
+
+    quaternions = matrix_to_quaternion(poses[:, :3, :3])
+    rotation = quaternion_to_matrix(slerp(quaternions[left], quaternions[right], alpha))
+    translation = poses[left, :3, 3] + alpha[:, None] * (poses[right, :3, 3] - poses[left, :3, 3])
+    return make_pose(rotation, translation)
+
+
+def records_to_poses(records: np.ndarray) -> np.ndarray:
+    """Позы (N, 4, 4) записей POSE_DTYPE"""
+    if len(records) == 0:
+        return np.zeros((0, 4, 4))
+    quaternions = np.stack([records['qx'], records['qy'], records['qz'], records['qw']], axis=-1)
+    return make_pose(quaternion_to_matrix(quaternions),
+                     np.stack([records['x'], records['y'], records['z']], axis=-1))
+
+
+def poses_to_records(poses: np.ndarray, frame_ids=None, timestamps=None) -> np.ndarray:
+    """Записи POSE_DTYPE поз (N, 4, 4) одним векторным преобразованием"""
+    poses = np.asarray(poses, dtype=np.float64).reshape(-1, 4, 4)
+    records = np.zeros(len(poses), dtype=POSE_DTYPE)
+    records['frame_id'] = np.arange(len(poses)) if frame_ids is None else frame_ids
+    if timestamps is not None:
+        records['timestamp'] = timestamps
+    records['x'], records['y'], records['z'] = poses[:, :3, 3].T
+    quaternions = matrix_to_quaternion(poses[:, :3, :3])
+    records['qx'], records['qy'], records['qz'], records['qw'] = quaternions.T
+    return records
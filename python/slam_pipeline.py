@@ -0,0 +1,313 @@
+import queue
+import threading
+import time
+from typing import Callable, Iterable, Optional, Tuple
+
+import numpy as np
+
+from results_stream import ResultsStreamWriter
+
+# Маркер конца потока в очередях между стадиями
+_END_OF_STREAM = object()
+
+
+class _Checkpoint:
+    """Маркер контрольной точки: проходит все стадии, трекинг и картирование ждут записи"""
+
+    def __init__(self, frame_id: int):
+        self.frame_id = frame_id
+        self.done = threading.Event()
+
+
+class StageQueue:
+    """Ограниченная очередь между стадиями со статистикой глубины
+
+    Глубина замеряется при каждой постановке элемента; `full_waits` -
+    сколько раз производитель ждал свободного места (стадия-потребитель
+    не успевает).
+    """
+
+    def __init__(self, name: str, maxsize: int):
+        self.name = name
+        self.maxsize = max(1, maxsize)
+        self._queue = queue.Queue(maxsize=self.maxsize)
+        self.puts = 0
+        self.full_waits = 0
+        self.max_depth = 0
+        self._depth_sum = 0
+
+    def put(self, item, abort: threading.Event) -> bool:
+        """Блокирующая постановка, прерывается при аварийной остановке конвейера"""
+        waited = False
+        while not abort.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+            except queue.Full:
+                waited = True
+                continue
+            if item is _END_OF_STREAM:
+                return True
+            depth = self._queue.qsize()
+            self.puts += 1
+            self.full_waits += waited
+            self.max_depth = max(self.max_depth, depth)
+            self._depth_sum += depth
+            return True
+        return False
+
+    def get(self, timeout: float = None):
+        """Элемент очереди или queue.Empty по таймауту"""
+        return self._queue.get(timeout=timeout)
+
+    def stats(self) -> dict:
+        return {
+            'maxsize': self.maxsize,
+            'items': self.puts,
+            'max_depth': self.max_depth,
+            'mean_depth': self._depth_sum / self.puts if self.puts else 0.0,
+            'full_waits': self.full_waits
+        }
+
+
+class SLAMPipeline:
+    """Конвейер SLAM: чтение -> трекинг -> картирование -> запись результатов
+
+    Каждая стадия работает в своем потоке, между стадиями ограниченные
+    очереди. Трекинг (MonoSLAM.track_frame) отдает задания ключевых
+    кадров в очередь картирования и сразу переходит к следующему кадру,
+    поэтому триангуляция и BA могут отставать от трекинга на
+    `keyframe_queue` ключевых кадров. Ошибка любой стадии останавливает
+    весь конвейер и пробрасывается из `run`.
+
+    Кадр может нести третьим элементом время захвата (time.monotonic()),
+    тогда для позы считается сквозная задержка, а кадры старше
+    `max_latency` секунд отбрасываются до трекинга.
+
+    Каждые `checkpoint_interval` кадров конвейер дожидается, пока
+    картирование и запись догонят трекинг, и вызывает `on_checkpoint`
+    (frame_id) в потоке записи - состояние MonoSLAM в этот момент
+    согласовано с уже записанными результатами.
+
+    `start_frame` - номер первого кадра прогона (после --start или
+    --resume): прогресс в манифесте пишется как start_frame + число поз,
+    то есть в абсолютных номерах кадров, как и в итоговом JSON.
+    """
+
+    def __init__(self, slam, writer: Optional[ResultsStreamWriter] = None,
+                 frame_queue: int = 8, keyframe_queue: int = 64, result_queue: int = 256,
+                 flush_interval: int = 50, on_result: Callable[[dict], None] = None,
+                 max_latency: float = None, on_points: Callable[[np.ndarray], None] = None,
+                 checkpoint_interval: int = 0, on_checkpoint: Callable[[int], None] = None,
+                 start_frame: int = 0):
+        self.slam = slam
+        self.start_frame = start_frame
+        self.writer = writer
+        self.flush_interval = flush_interval
+        self.on_result = on_result
+        self.on_points = on_points
+        self.max_latency = max_latency
+        self.checkpoint_interval = checkpoint_interval if on_checkpoint else 0
+        self.on_checkpoint = on_checkpoint
+
+        self.frames = StageQueue('frames', frame_queue)
+        self.keyframes = StageQueue('keyframes', keyframe_queue)
+        self.results = StageQueue('results', result_queue)
+
+        self._stop = threading.Event()
+        self._abort = threading.Event()
+        self._errors = []
+        self._busy = {'reader': 0.0, 'tracker': 0.0, 'mapper': 0.0, 'writer': 0.0}
+        self.frame_count = 0
+        self.keyframe_count = 0
+        self.point_count = 0
+        self.late_frames = 0
+        self.checkpoints = 0
+        self.latencies = []
+
+    def stop(self):
+        """Прекратить чтение новых кадров; уже прочитанные будут обработаны"""
+        self._stop.set()
+
+    def run(self, frames: Iterable[Tuple[int, np.ndarray]]) -> dict:
+        """Прогон кадров (frame_id, frame) через конвейер, возвращает метрики"""
+        start_time = time.time()
+        threads = [
+            threading.Thread(target=self._guard, args=(self._read, frames), name="slam-reader"),
+            threading.Thread(target=self._guard, args=(self._track,), name="slam-tracker"),
+            threading.Thread(target=self._guard, args=(self._map,), name="slam-mapper"),
+            threading.Thread(target=self._guard, args=(self._write,), name="slam-writer")
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(timeout=0.5)
+        except KeyboardInterrupt:
+            self._abort.set()
+            for thread in threads:
+                thread.join()
+            raise
+
+        if self._errors:
+            raise self._errors[0]
+        return self.metrics(time.time() - start_time)
+
+    def metrics(self, elapsed: float = None) -> dict:
+        """Пропускная способность, загрузка стадий и глубина очередей"""
+        metrics = {
+            'frames': self.frame_count,
+            'keyframes': self.keyframe_count,
+            'points': self.point_count,
+            'checkpoints': self.checkpoints,
+            'busy_time': dict(self._busy),
+            'queues': {q.name: q.stats() for q in (self.frames, self.keyframes, self.results)}
+        }
+        if self.latencies or self.late_frames:
+            latencies = np.array(self.latencies)
+            metrics['latency'] = {
+                'late_frames': self.late_frames,
+                'p50': float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+                'p95': float(np.percentile(latencies, 95)) if len(latencies) else 0.0,
+                'max': float(latencies.max()) if len(latencies) else 0.0
+            }
+        if elapsed is not None:
+            metrics['elapsed'] = elapsed
+            metrics['fps'] = self.frame_count / elapsed if elapsed > 0 else 0.0
+        return metrics
+
+    def _guard(self, target: Callable, *args):
+        try:
+            target(*args)
+        except BaseException as error:
+            self._errors.append(error)
+            self._abort.set()
+
+    def _next(self, stage_queue: StageQueue):
+        """Следующий элемент или _END_OF_STREAM при аварийной остановке"""
+        while not self._abort.is_set():
+            try:
+                return stage_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END_OF_STREAM
+
+    def _wait(self, marker: _Checkpoint) -> bool:
+        while not marker.done.wait(timeout=0.1):
+            if self._abort.is_set():
+                return False
+        return True
+
+    def _read(self, frames):
+        iterator = iter(frames)
+        while not self._stop.is_set() and not self._abort.is_set():
+            start = time.perf_counter()
+            item = next(iterator, _END_OF_STREAM)
+            self._busy['reader'] += time.perf_counter() - start
+            if item is _END_OF_STREAM or not self.frames.put(item, self._abort):
+                break
+        self.frames.put(_END_OF_STREAM, self._abort)
+
+    def _track(self):
+        while True:
+            item = self._next(self.frames)
+            if item is _END_OF_STREAM:
+                break
+            frame_id, frame = item[:2]
+            capture_time = item[2] if len(item) > 2 else None
+            if (capture_time is not None and self.max_latency is not None
+                    and time.monotonic() - capture_time > self.max_latency):
+                # Кадр уже не уложится в бюджет задержки
+                self.late_frames += 1
+                continue
+            start = time.perf_counter()
+            result, keyframe_job = self.slam.track_frame(frame, frame_id)
+            self._busy['tracker'] += time.perf_counter() - start
+            self.frame_count += 1
+            if capture_time is not None:
+                result['capture_time'] = capture_time
+
+            if keyframe_job is not None and not self.keyframes.put(keyframe_job, self._abort):
+                break
+            if not self.results.put(('pose', result), self._abort):
+                break
+            if self.checkpoint_interval and self.frame_count % self.checkpoint_interval == 0:
+                marker = _Checkpoint(frame_id)
+                if not self.keyframes.put(marker, self._abort) or not self._wait(marker):
+                    break
+        self.keyframes.put(_END_OF_STREAM, self._abort)
+
+    def _map(self):
+        while not self._abort.is_set():
+            try:
+                job = self.keyframes.get(timeout=0.1)
+            except queue.Empty:
+                # Пока нет ключевых кадров, переносим в карту готовые результаты BA
+                self.slam.poll_mapping()
+                continue
+            if job is _END_OF_STREAM:
+                break
+            if isinstance(job, _Checkpoint):
+                # Все ключевые кадры до маркера уже в карте, ждем записи
+                if not self.results.put(job, self._abort) or not self._wait(job):
+                    break
+                continue
+            start = time.perf_counter()
+            added = self.slam.map_keyframe(job)
+            # Копия: буфер карты может быть перевыделен или уточнен BA до записи
+            new_points = self.slam.point_cloud.data[added].copy()
+            self._busy['mapper'] += time.perf_counter() - start
+            self.keyframe_count += 1
+            if len(new_points) and not self.results.put(('points', new_points), self._abort):
+                break
+        self.results.put(_END_OF_STREAM, self._abort)
+
+    def _write(self):
+        poses = 0
+        while True:
+            item = self._next(self.results)
+            if item is _END_OF_STREAM:
+                break
+            if isinstance(item, _Checkpoint):
+                if self.writer:
+                    self.writer.flush(processed_frames=self.start_frame + poses)
+                self.on_checkpoint(item.frame_id)
+                self.checkpoints += 1
+                item.done.set()
+                continue
+            kind, payload = item
+            start = time.perf_counter()
+            if kind == 'pose':
+                poses += 1
+                if 'capture_time' in payload:
+                    payload['latency'] = time.monotonic() - payload['capture_time']
+                    self.latencies.append(payload['latency'])
+                if self.writer:
+                    self.writer.append_pose(payload['pose'])
+                    if poses % self.flush_interval == 0:
+                        self.writer.flush(processed_frames=self.start_frame + poses)
+                if self.on_result:
+                    self.on_result(payload)
+            else:
+                self.point_count += len(payload)
+                if self.writer:
+                    self.writer.append_points(payload)
+                if self.on_points:
+                    self.on_points(payload)
+            self._busy['writer'] += time.perf_counter() - start
+
+
+def format_metrics(metrics: dict) -> str:
+    """Краткая сводка метрик конвейера для консоли"""
+    queues = ', '.join(
+        f"{name} {stats['mean_depth']:.1f}/{stats['max_depth']}/{stats['maxsize']}"
+        for name, stats in metrics['queues'].items()
+    )
+    busy = ', '.join(f"{stage} {seconds:.2f}с" for stage, seconds in metrics['busy_time'].items())
+    summary = (f"Конвейер: {metrics['frames']} кадров, {metrics.get('fps', 0.0):.1f} кадр/с, "
+               f"ключевых {metrics['keyframes']}; очереди (средн/макс/емк): {queues}; занятость: {busy}")
+    if 'latency' in metrics:
+        latency = metrics['latency']
+        summary += (f"; задержка p50 {latency['p50'] * 1000:.0f} мс, p95 {latency['p95'] * 1000:.0f} мс, "
+                    f"отброшено по бюджету {latency['late_frames']}")
+    return summary
@@ -5,6 +5,9 @@ import numpy as np
 from pathlib import Path
 from typing import List, Dict, Any
 import argparse
+import yaml
+
+from results_stream import ResultsStreamWriter
 
 class SlamProcessor:
     def __init__(self, dataset_type: str):
@@ -14,7 +17,12 @@ class SlamProcessor:
         self.processed_frames = 0
         
     def process_video(self, video_path: str, output_path: str = None):
-        """Обработка видео и генерация SLAM данных"""
+        """Обработка видео и генерация SLAM данных с учетом конфигурации"""
+        
+        config_file = f"config/{self.dataset_type}_config.yaml"
+        if os.path.exists(config_file):
+            self.config = self._load_config(config_file)
+            print(f"Используется конфигурация: {config_file}")
         
         # Загрузка видео
         cap = cv2.VideoCapture(video_path)
@@ -28,6 +36,7 @@ class SlamProcessor:
         }
         
         frame_count = 0
+        writer = ResultsStreamWriter(output_path, metadata={'total_frames': total_frames}) if output_path else None
         
         while cap.isOpened():
             ret, frame = cap.read()
@@ -41,17 +50,21 @@ class SlamProcessor:
                 results['trajectory'].append(slam_data['pose'])
                 results['point_cloud'].extend(slam_data['points'])
                 results['processed_frames'] = frame_count
+                if writer:
+                    writer.append_pose(slam_data['pose'])
+                    writer.append_points(slam_data['points'])
                 
             frame_count += 1
             
-            # Сохранение промежуточных результатов каждые 10 кадров
-            if frame_count % 10 == 0 and output_path:
-                self._save_intermediate_results(results, output_path, frame_count)
+            # Сброс потока результатов на диск каждые 10 кадров
+            if frame_count % 10 == 0 and writer:
+                writer.flush(processed_frames=results['processed_frames'])
                 
         cap.release()
         
         # Финальное сохранение
         if output_path:
+            writer.close(processed_frames=results['processed_frames'])
             self._save_results(results, output_path)
             
         return results
@@ -77,14 +90,6 @@ class SlamProcessor:
             }
         }
     
-    def process_video(self, video_path, dataset_type="euroc"):
-        """Обработка с учетом конфигурации"""
-        
-        config_file = f"config/{dataset_type}_config.yaml"
-        if os.path.exists(config_file):
-            self.config = self._load_config(config_file)
-            print(f"Используется конфигурация: {config_file}")
-    
     def _process_frame(self, frame: np.ndarray, frame_id: int) -> Dict[str, Any]:
         """Обработка одного кадра (имитация SLAM алгоритма)"""
         
@@ -123,13 +128,6 @@ class SlamProcessor:
             'points': points
         }
     
-    def _save_intermediate_results(self, results: Dict, output_path: str, frame_count: int):
-        """Сохранение промежуточных результатов"""
-        intermediate_file = Path(output_path).with_suffix(f'.frame_{frame_count}.json')
-        
-        with open(intermediate_file, 'w') as f:
-            json.dump(results, f, indent=2)
-    
     def _save_results(self, results: Dict, output_path: str):
         """Сохранение финальных результатов"""
         with open(output_path, 'w') as f:
@@ -0,0 +1,132 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+
+
+class TiledORBExtractor:
+    """Параллельное извлечение ORB по уровням пирамиды и ячейкам изображения
+
+    Пирамида строится один раз, каждый уровень делится на ячейки со своей
+    квотой особенностей (как в ORB-SLAM), ячейки обрабатываются в пуле
+    потоков - detectAndCompute отпускает GIL. Результаты склеиваются с
+    подавлением немаксимумов по сетке радиуса `nms_radius`.
+    """
+
+    def __init__(self, nfeatures: int = 2000, scale_factor: float = 1.2, nlevels: int = 8,
+                 grid: Tuple[int, int] = (4, 3), threads: int = 4, fast_threshold: int = 20,
+                 nms_radius: int = 3, min_cell_size: int = 128):
+        self.nfeatures = nfeatures
+        self.scale_factor = scale_factor
+        self.nlevels = nlevels
+        self.grid = grid
+        self.threads = max(1, threads)
+        self.fast_threshold = fast_threshold
+        self.nms_radius = nms_radius
+        self.min_cell_size = min_cell_size
+        # Поле вокруг ячейки, чтобы дескриптор у ее края считался по реальным пикселям
+        self.border = 31 + 1
+
+        # Геометрическое распределение квоты по уровням пирамиды
+        factor = 1.0 / scale_factor
+        first = nfeatures * (1 - factor) / (1 - factor ** nlevels)
+        self.level_quota = [int(round(first * factor ** level)) for level in range(nlevels)]
+        self.level_quota[0] += nfeatures - sum(self.level_quota)
+        self.scales = [scale_factor ** level for level in range(nlevels)]
+
+        # Пул создается при первом кадре и заново после close
+        self._executor = None
+        self._local = threading.local()
+
+    def detect_and_compute(self, gray: np.ndarray) -> Tuple[List[cv2.KeyPoint], np.ndarray]:
+        """Аналог ORB.detectAndCompute для всего кадра"""
+        pyramid = [gray]
+        for level in range(1, self.nlevels):
+            height, width = gray.shape[:2]
+            size = (int(round(width / self.scales[level])), int(round(height / self.scales[level])))
+            pyramid.append(cv2.resize(pyramid[-1], size, interpolation=cv2.INTER_LINEAR))
+
+        jobs = []
+        for level, image in enumerate(pyramid):
+            jobs.extend(self._level_jobs(level, image))
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="orb-tile")
+        results = list(self._executor.map(lambda job: self._extract_cell(pyramid, *job), jobs))
+
+        keypoints = [kp for cell_keypoints, _ in results for kp in cell_keypoints]
+        descriptors = [desc for _, desc in results if desc is not None and len(desc)]
+        if not keypoints:
+            return [], None
+        descriptors = np.vstack(descriptors)
+        return self._suppress(keypoints, descriptors)
+
+    def _level_jobs(self, level: int, image: np.ndarray) -> list:
+        """Ячейки уровня: на грубых уровнях их меньше, чтобы ячейка не была меньше min_cell_size"""
+        height, width = image.shape[:2]
+        cols = max(1, min(self.grid[0], width // self.min_cell_size))
+        rows = max(1, min(self.grid[1], height // self.min_cell_size))
+        quota = max(1, self.level_quota[level] // (cols * rows))
+
+        xs = np.linspace(0, width, cols + 1).astype(int)
+        ys = np.linspace(0, height, rows + 1).astype(int)
+        return [(level, xs[c], ys[r], xs[c + 1], ys[r + 1], quota)
+                for r in range(rows) for c in range(cols)]
+
+    def _orb(self) -> cv2.ORB:
+        # Объекты OpenCV не разделяются между потоками
+        orb = getattr(self._local, 'orb', None)
+        if orb is None:
+            orb = cv2.ORB_create(nlevels=1, edgeThreshold=31, patchSize=31,
+                                 fastThreshold=self.fast_threshold)
+            self._local.orb = orb
+        return orb
+
+    def _extract_cell(self, pyramid, level, x0, y0, x1, y1, quota):
+        image = pyramid[level]
+        height, width = image.shape[:2]
+        px0, py0 = max(0, x0 - self.border), max(0, y0 - self.border)
+        px1, py1 = min(width, x1 + self.border), min(height, y1 + self.border)
+
+        orb = self._orb()
+        orb.setMaxFeatures(quota * 2)
+        cell_keypoints, cell_descriptors = orb.detectAndCompute(image[py0:py1, px0:px1], None)
+        if cell_descriptors is None:
+            return [], None
+
+        scale = self.scales[level]
+        points = np.float32([kp.pt for kp in cell_keypoints]) + np.float32([px0, py0])
+        # Точки из поля соседней ячейки отбрасываются - их найдет соседняя ячейка
+        inside = np.flatnonzero((points[:, 0] >= x0) & (points[:, 0] < x1)
+                                & (points[:, 1] >= y0) & (points[:, 1] < y1))
+        responses = np.float32([cell_keypoints[i].response for i in inside])
+        rows = inside[np.argsort(-responses, kind='stable')[:quota]]
+
+        kept_keypoints = []
+        for row in rows:
+            kp = cell_keypoints[row]
+            x, y = points[row]
+            kept_keypoints.append(cv2.KeyPoint(float(x * scale), float(y * scale), kp.size * scale,
+                                               kp.angle, kp.response, level, kp.class_id))
+        return kept_keypoints, cell_descriptors[rows]
+
+    def _suppress(self, keypoints: List[cv2.KeyPoint],
+                  descriptors: np.ndarray) -> Tuple[List[cv2.KeyPoint], np.ndarray]:
+        """Подавление немаксимумов: на уровне пирамиды одна точка на клетку nms_radius"""
+        points = np.float32([kp.pt for kp in keypoints])
+        responses = np.float32([kp.response for kp in keypoints])
+        levels = np.int64([kp.octave for kp in keypoints])
+        cells = np.floor(points / (self.nms_radius * np.float32(self.scales)[levels][:, None])).astype(np.int64)
+
+        order = np.argsort(-responses, kind='stable')
+        keys = np.stack([levels[order], cells[order, 0], cells[order, 1]], axis=1)
+        _, first = np.unique(keys, axis=0, return_index=True)
+        keep = np.sort(order[first])
+        return [keypoints[i] for i in keep], descriptors[keep]
+
+    def close(self):
+        """Остановка пула потоков ячеек"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
@@ -0,0 +1,260 @@
+import json
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from results_stream import POSE_DTYPE, to_records
+from se3 import invert, records_to_poses
+
+# Расположение ground truth относительно папки последовательности (mav0 или ее родителя)
+GROUNDTRUTH_FILES = (
+    "state_groundtruth_estimate0/data.csv",
+    "mav0/state_groundtruth_estimate0/data.csv",
+    "mocap0/data.csv",
+    "mav0/mocap0/data.csv",
+    "groundtruth.txt"
+)
+
+
+def find_groundtruth(dataset_path) -> Optional[Path]:
+    """Файл ground truth последовательности EuRoC / TUM VI / TUM RGB-D, если он есть"""
+    dataset_path = Path(dataset_path)
+    for relative in GROUNDTRUTH_FILES:
+        path = dataset_path / relative
+        if path.exists():
+            return path
+    return None
+
+
+def load_groundtruth(path) -> np.ndarray:
+    """Ground truth как массив POSE_DTYPE, отсортированный по времени (секунды)
+
+    CSV в раскладке ASL (EuRoC, TUM VI): метка в наносекундах, позиция,
+    кватернион (w, x, y, z). Текстовый формат TUM: метка в секундах,
+    позиция, кватернион (x, y, z, w).
+    """
+    path = Path(path)
+    if path.suffix == '.csv':
+        table = np.loadtxt(path, delimiter=',', comments='#', usecols=range(8), ndmin=2)
+        timestamps = table[:, 0] / 1e9
+        quaternions = table[:, [5, 6, 7, 4]]
+    else:
+        table = np.loadtxt(path, comments='#', usecols=range(8), ndmin=2)
+        timestamps = table[:, 0]
+        quaternions = table[:, 4:8]
+
+    order = np.argsort(timestamps, kind='stable')
+    records = np.zeros(len(table), dtype=POSE_DTYPE)
+    records['frame_id'] = np.arange(len(table))
+    records['timestamp'] = timestamps[order]
+    records['x'], records['y'], records['z'] = table[order, 1:4].T
+    records['qx'], records['qy'], records['qz'], records['qw'] = quaternions[order].T
+    return records
+
+
+def associate(timestamps: np.ndarray, reference: np.ndarray,
+              max_difference: float = 0.02) -> Tuple[np.ndarray, np.ndarray]:
+    """Сопоставление меток с ближайшими в отсортированном reference
+
+    Возвращает индексы пар (в timestamps, в reference) с разницей не больше
+    max_difference секунд; каждая метка reference используется не больше раза.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    reference = np.asarray(reference, dtype=np.float64)
+    if len(timestamps) == 0 or len(reference) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    right = np.clip(np.searchsorted(reference, timestamps), 1, len(reference) - 1)
+    left = right - 1
+    nearest = np.where(np.abs(reference[left] - timestamps) <= np.abs(reference[right] - timestamps),
+                       left, right)
+    if len(reference) == 1:
+        nearest = np.zeros(len(timestamps), dtype=np.int64)
+    difference = np.abs(reference[nearest] - timestamps)
+    matched = np.flatnonzero(difference <= max_difference)
+
+    # При повторах остается самая близкая по времени пара
+    order = matched[np.argsort(difference[matched], kind='stable')]
+    _, first = np.unique(nearest[order], return_index=True)
+    pairs = np.sort(order[first])
+    return pairs, nearest[pairs]
+
+
+def align_sim3(source: np.ndarray, target: np.ndarray) -> Tuple[float, np.ndarray, np.ndarray]:
+    """Преобразование подобия (Умэяма): target ~ s * R @ source + t для (N,3) точек"""
+    source = np.asarray(source, dtype=np.float64)
+    target = np.asarray(target, dtype=np.float64)
+    if len(source) == 0:
+        return 1.0, np.eye(3), np.zeros(3)
+
+    mean_source = source.mean(axis=0)
+    mean_target = target.mean(axis=0)
+    centered_source = source - mean_source
+    centered_target = target - mean_target
+    variance = np.mean(np.sum(centered_source ** 2, axis=1))
+    if len(source) < 3 or variance < 1e-12:
+        # Вырожденное перекрытие: только сдвиг
+        return 1.0, np.eye(3), mean_target - mean_source
+
+    covariance = centered_target.T @ centered_source / len(source)
+    U, D, Vt = np.linalg.svd(covariance)
+    S = np.eye(3)
+    if np.linalg.det(U) * np.linalg.det(Vt) < 0:
+        S[2, 2] = -1
+    R = U @ S @ Vt
+    scale = float(np.trace(np.diag(D) @ S) / variance)
+    t = mean_target - scale * R @ mean_source
+    return scale, R, t
+
+
+def error_statistics(errors: np.ndarray) -> dict:
+    errors = np.asarray(errors, dtype=np.float64)
+    if len(errors) == 0:
+        return {'rmse': 0.0, 'mean': 0.0, 'median': 0.0, 'std': 0.0, 'max': 0.0}
+    return {
+        'rmse': float(np.sqrt(np.mean(errors ** 2))),
+        'mean': float(errors.mean()),
+        'median': float(np.median(errors)),
+        'std': float(errors.std()),
+        'max': float(errors.max())
+    }
+
+
+def absolute_trajectory_error(positions: np.ndarray, reference: np.ndarray) -> Tuple[np.ndarray, tuple]:
+    """Ошибки положения (N,) после Sim(3) выравнивания и само выравнивание (s, R, t)"""
+    scale, R, t = align_sim3(positions, reference)
+    aligned = scale * positions @ R.T + t
+    return np.linalg.norm(aligned - reference, axis=1), (scale, R, t)
+
+
+def relative_pose_error(poses: np.ndarray, reference: np.ndarray, delta: int = 1,
+                        scale: float = 1.0) -> Tuple[np.ndarray, np.ndarray]:
+    """Ошибки относительных движений на шаге delta: перемещение и угол (градусы)
+
+    poses и reference - (N,4,4); перемещения оценки умножаются на scale
+    выравнивания, поэтому ошибка в единицах reference.
+    """
+    if len(poses) <= delta:
+        return np.zeros(0), np.zeros(0)
+    poses = poses.copy()
+    poses[:, :3, 3] *= scale
+    motion = invert(poses[:-delta]) @ poses[delta:]
+    reference_motion = invert(reference[:-delta]) @ reference[delta:]
+    error = invert(reference_motion) @ motion
+    translation = np.linalg.norm(error[:, :3, 3], axis=1)
+    cosine = (np.trace(error[:, :3, :3], axis1=1, axis2=2) - 1) / 2
+    rotation = np.degrees(np.arccos(np.clip(cosine, -1.0, 1.0)))
+    return translation, rotation
+
+
+def evaluate_trajectory(trajectory, groundtruth: np.ndarray, timestamps: np.ndarray = None,
+                        max_difference: float = 0.02, delta: int = 1) -> dict:
+    """ATE (Sim(3) выравнивание) и RPE оценки относительно ground truth
+
+    trajectory - массив POSE_DTYPE или список словарей поз. Если задан
+    timestamps (метки кадров датасета), время позы берется по frame_id,
+    иначе из поля timestamp.
+    """
+    trajectory = to_records(trajectory, POSE_DTYPE)
+    estimate_times = trajectory['timestamp'] if timestamps is None \
+        else np.asarray(timestamps, dtype=np.float64)[trajectory['frame_id']]
+    estimate_index, reference_index = associate(estimate_times, groundtruth['timestamp'], max_difference)
+    evaluation = {'poses': len(trajectory), 'matched': len(estimate_index)}
+    if len(estimate_index) < 3:
+        return evaluation
+
+    poses = records_to_poses(trajectory[estimate_index])
+    reference = records_to_poses(groundtruth[reference_index])
+    errors, (scale, _, _) = absolute_trajectory_error(poses[:, :3, 3], reference[:, :3, 3])
+    translation, rotation = relative_pose_error(poses, reference, delta, scale)
+    evaluation.update({
+        'scale': scale,
+        'ate': error_statistics(errors),
+        'rpe': {
+            'delta': delta,
+            'translation': error_statistics(translation),
+            'rotation_deg': error_statistics(rotation)
+        }
+    })
+    return evaluation
+
+
+def format_evaluation(evaluation: dict) -> str:
+    """Краткая сводка точности для консоли"""
+    if 'ate' not in evaluation:
+        return f"Точность: сопоставлено поз {evaluation['matched']} из {evaluation['poses']}, оценка невозможна"
+    ate = evaluation['ate']
+    rpe = evaluation['rpe']
+    return (f"Точность: поз {evaluation['matched']}/{evaluation['poses']}, масштаб {evaluation['scale']:.3f}; "
+            f"ATE rmse {ate['rmse']:.3f} м (медиана {ate['median']:.3f}, макс {ate['max']:.3f}); "
+            f"RPE[{rpe['delta']}] {rpe['translation']['rmse']:.4f} м, "
+            f"{rpe['rotation_deg']['rmse']:.3f} град")
+
+
+def camera_timestamps(dataset_path) -> Optional[np.ndarray]:
+    """Метки кадров cam0 последовательности (папка mav0 или ее родитель)"""
+    from dataset_index import DatasetIndex
+
+    dataset_path = Path(dataset_path)
+    for camera_dir in (dataset_path / "cam0", dataset_path / "mav0" / "cam0"):
+        if camera_dir.is_dir():
+            return DatasetIndex(camera_dir, cache_size=0).timestamps
+    return None
+
+
+def evaluate_results(results_path, groundtruth_path=None, max_difference: float = 0.02,
+                     delta: int = 1) -> dict:
+    """Оценка JSON результатов процессора: ground truth и метки кадров берутся из датасета"""
+    with open(results_path) as f:
+        results = json.load(f)
+    dataset_path = Path(results.get('dataset', ''))
+    groundtruth_path = groundtruth_path or find_groundtruth(dataset_path)
+    if groundtruth_path is None:
+        raise FileNotFoundError(f"No ground truth for {results_path}, pass --groundtruth")
+
+    timestamps = camera_timestamps(dataset_path) if results.get('dataset') else None
+    evaluation = evaluate_trajectory(results['trajectory'], load_groundtruth(groundtruth_path),
+                                     timestamps, max_difference, delta)
+    evaluation['results'] = str(results_path)
+    evaluation['fps'] = results.get('pipeline', {}).get('fps')
+    return evaluation
+
+
+def accuracy_table(evaluations: List[dict]) -> str:
+    """Пропускная способность против точности по набору прогонов"""
+    lines = [f"{'Результаты':<40}{'Кадр/с':>9}{'Поз':>7}{'ATE, м':>10}{'RPE, м':>10}{'RPE, град':>11}"]
+    for evaluation in evaluations:
+        fps = evaluation.get('fps')
+        fps = f"{fps:.1f}" if fps is not None else "-"
+        if 'ate' in evaluation:
+            rpe = evaluation['rpe']
+            errors = (f"{evaluation['ate']['rmse']:>10.3f}{rpe['translation']['rmse']:>10.4f}"
+                      f"{rpe['rotation_deg']['rmse']:>11.3f}")
+        else:
+            errors = f"{'-':>10}{'-':>10}{'-':>11}"
+        lines.append(f"{Path(evaluation['results']).name:<40}{fps:>9}{evaluation['matched']:>7}{errors}")
+    return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Evaluate SLAM trajectories against ground truth (ATE/RPE)')
+    parser.add_argument('--results', type=str, nargs='+', required=True,
+                        help='Result JSON files of euroc/tum processors')
+    parser.add_argument('--groundtruth', type=str, default=None,
+                        help='Ground truth file (default - found in the dataset folder)')
+    parser.add_argument('--max-difference', type=float, default=0.02,
+                        help='Max timestamp difference for association, seconds')
+    parser.add_argument('--delta', type=int, default=1, help='RPE step in associated poses')
+    parser.add_argument('--output', type=str, default=None, help='Write evaluations as JSON')
+
+    args = parser.parse_args()
+
+    evaluations = [evaluate_results(path, args.groundtruth, args.max_difference, args.delta)
+                   for path in args.results]
+    print(accuracy_table(evaluations))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(evaluations, f, indent=2)
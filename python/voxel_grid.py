@@ -0,0 +1,203 @@
+from typing import Optional
+
+import numpy as np
+
+from results_stream import POINT_DTYPE
+
+# Ключ вокселя: три целые координаты по 21 бит в одном int64
+_KEY_BITS = 21
+_KEY_OFFSET = 1 << (_KEY_BITS - 1)
+_KEY_MASK = (1 << _KEY_BITS) - 1
+
+
+def voxel_keys(coords: np.ndarray) -> np.ndarray:
+    """Упаковка целых координат вокселей (N,3) в ключи int64"""
+    coords = np.clip(coords + _KEY_OFFSET, 0, _KEY_MASK).astype(np.int64)
+    return (coords[:, 0] << (2 * _KEY_BITS)) | (coords[:, 1] << _KEY_BITS) | coords[:, 2]
+
+
+def voxel_downsample(xyz: np.ndarray, rgb: np.ndarray, voxel_size: float,
+                     weights: np.ndarray = None) -> np.ndarray:
+    """Одна усредненная точка на воксель размера voxel_size (массив POINT_DTYPE)"""
+    xyz = np.asarray(xyz, dtype=np.float64).reshape(-1, 3)
+    if len(xyz) == 0:
+        return np.zeros(0, dtype=POINT_DTYPE)
+    weights = np.ones(len(xyz)) if weights is None else np.asarray(weights, dtype=np.float64)
+    keys = voxel_keys(np.floor(xyz / voxel_size).astype(np.int64))
+    _, inverse = np.unique(keys, return_inverse=True)
+    totals = np.bincount(inverse, weights=weights)
+
+    records = np.zeros(len(totals), dtype=POINT_DTYPE)
+    for axis, name in enumerate(('x', 'y', 'z')):
+        records[name] = np.bincount(inverse, weights=xyz[:, axis] * weights) / totals
+    for channel, name in enumerate(('r', 'g', 'b')):
+        records[name] = np.rint(np.bincount(inverse, weights=rgb[:, channel] * weights) / totals)
+    return records
+
+
+class VoxelGrid:
+    """Хэш-сетка вокселей над точками карты
+
+    Воксель хранит сумму координат и цветов попавших в него точек и их
+    число, поэтому вставка - O(1) на точку, а экспорт отдает одну
+    усредненную точку на воксель. Размер выдачи ограничен объемом сцены,
+    а не числом вставленных точек. `lod` укрупняет сетку до нужного
+    разрешения или бюджета точек, `query_radius` и `query_frustum`
+    выбирают воксели в шаре и в пирамиде видимости камеры.
+    """
+
+    def __init__(self, voxel_size: float, capacity: int = 1024):
+        if voxel_size <= 0:
+            raise ValueError(f"Voxel size must be positive: {voxel_size}")
+        self.voxel_size = float(voxel_size)
+        self._slots = {}  # ключ вокселя -> номер строки
+        self._xyz_sum = np.zeros((max(1, capacity), 3))
+        self._rgb_sum = np.zeros((max(1, capacity), 3))
+        self._counts = np.zeros(max(1, capacity), dtype=np.int64)
+        self._size = 0
+        self.point_count = 0
+
+    @classmethod
+    def from_points(cls, points: np.ndarray, voxel_size: float) -> 'VoxelGrid':
+        """Сетка по структурированному массиву точек (x, y, z, r, g, b)"""
+        grid = cls(voxel_size, capacity=max(1024, len(points)))
+        grid.insert(np.stack([points['x'], points['y'], points['z']], axis=1),
+                    np.stack([points['r'], points['g'], points['b']], axis=1))
+        return grid
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _reserve(self, size: int):
+        if size <= len(self._counts):
+            return
+        capacity = len(self._counts)
+        while capacity < size:
+            capacity *= 2
+        for name in ('_xyz_sum', '_rgb_sum', '_counts'):
+            array = getattr(self, name)
+            grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:self._size] = array[:self._size]
+            setattr(self, name, grown)
+
+    def insert(self, xyz: np.ndarray, rgb: np.ndarray = None) -> np.ndarray:
+        """Пакетная вставка точек, возвращает маску точек, открывших новый воксель"""
+        xyz = np.asarray(xyz, dtype=np.float64).reshape(-1, 3)
+        opened = np.zeros(len(xyz), dtype=bool)
+        finite = np.isfinite(xyz).all(axis=1)
+        if not finite.any():
+            return opened
+        xyz = xyz[finite]
+        rgb = np.zeros_like(xyz) if rgb is None else np.asarray(rgb, dtype=np.float64).reshape(-1, 3)[finite]
+
+        coords = np.floor(xyz / self.voxel_size).astype(np.int64)
+        keys, first, inverse = np.unique(voxel_keys(coords), return_index=True, return_inverse=True)
+        # Словарь трогается один раз на воксель пачки, суммы - векторно
+        slots = np.empty(len(keys), dtype=np.int64)
+        new = np.zeros(len(keys), dtype=bool)
+        size = self._size
+        for index, key in enumerate(keys.tolist()):
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = self._slots[key] = size
+                size += 1
+                new[index] = True
+            slots[index] = slot
+
+        self._reserve(size)
+        self._size = size
+        rows = slots[inverse]
+        np.add.at(self._xyz_sum, rows, xyz)
+        np.add.at(self._rgb_sum, rows, rgb)
+        np.add.at(self._counts, rows, 1)
+        self.point_count += len(xyz)
+
+        opened[np.flatnonzero(finite)[first[new]]] = True
+        return opened
+
+    def clear(self):
+        self._slots.clear()
+        self._size = 0
+        self.point_count = 0
+        self._xyz_sum[:] = 0
+        self._rgb_sum[:] = 0
+        self._counts[:] = 0
+
+    @property
+    def counts(self) -> np.ndarray:
+        """Число точек в каждом вокселе"""
+        return self._counts[:self._size]
+
+    @property
+    def centroids(self) -> np.ndarray:
+        """Средние координаты точек вокселей (V,3)"""
+        return self._xyz_sum[:self._size] / self.counts[:, None]
+
+    def to_records(self, rows: np.ndarray = None) -> np.ndarray:
+        """Одна усредненная точка на воксель (массив POINT_DTYPE)"""
+        rows = np.arange(self._size) if rows is None else rows
+        counts = self._counts[rows][:, None]
+        xyz = self._xyz_sum[rows] / counts
+        rgb = np.rint(self._rgb_sum[rows] / counts)
+        records = np.zeros(len(rows), dtype=POINT_DTYPE)
+        records['x'], records['y'], records['z'] = xyz.T
+        records['r'], records['g'], records['b'] = rgb.T
+        return records
+
+    def lod(self, voxel_size: float = None, max_points: int = None) -> np.ndarray:
+        """Облако с разрешением voxel_size и/или не больше max_points точек
+
+        Для бюджета размер вокселя удваивается, пока точек больше max_points.
+        Воксели сливаются с весом по числу точек, поэтому результат совпадает
+        с прореживанием исходных точек на более грубой сетке (с точностью до
+        границ вокселей).
+        """
+        voxel_size = max(voxel_size or self.voxel_size, self.voxel_size)
+        records = self.to_records()
+        if voxel_size > self.voxel_size:
+            records = self._coarsen(voxel_size)
+        while max_points is not None and len(records) > max(1, max_points):
+            voxel_size *= 2
+            records = self._coarsen(voxel_size)
+        return records
+
+    def query_radius(self, center, radius: float) -> np.ndarray:
+        """Воксели, центроиды которых не дальше radius от center (массив POINT_DTYPE)"""
+        center = np.asarray(center, dtype=np.float64)
+        low = np.floor((center - radius) / self.voxel_size).astype(np.int64)
+        high = np.floor((center + radius) / self.voxel_size).astype(np.int64)
+        cells = np.prod(high - low + 1)
+        if cells <= self._size:
+            # Шар покрывает мало ячеек: прямой поиск по хэшу
+            axes = [np.arange(lo, hi + 1) for lo, hi in zip(low, high)]
+            coords = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, 3)
+            rows = [self._slots.get(key) for key in voxel_keys(coords).tolist()]
+            rows = np.array([row for row in rows if row is not None], dtype=np.int64)
+        else:
+            rows = np.arange(self._size)
+        if len(rows) == 0:
+            return np.zeros(0, dtype=POINT_DTYPE)
+        centroids = self._xyz_sum[rows] / self._counts[rows][:, None]
+        inside = np.sum((centroids - center) ** 2, axis=1) <= radius ** 2
+        return self.to_records(rows[inside])
+
+    def query_frustum(self, pose: np.ndarray, camera_matrix: np.ndarray, width: int, height: int,
+                      near: float = 0.0, far: Optional[float] = None) -> np.ndarray:
+        """Воксели в пирамиде видимости камеры (поза камера -> мир)"""
+        centroids = self.centroids
+        points_camera = (centroids - pose[:3, 3]) @ pose[:3, :3]
+        depth = points_camera[:, 2]
+        visible = depth > near
+        if far is not None:
+            visible &= depth < far
+        with np.errstate(divide='ignore', invalid='ignore'):
+            projected = points_camera @ np.asarray(camera_matrix, dtype=np.float64).T
+            u = projected[:, 0] / projected[:, 2]
+            v = projected[:, 1] / projected[:, 2]
+        visible &= (u >= 0) & (u < width) & (v >= 0) & (v < height)
+        return self.to_records(np.flatnonzero(visible))
+
+    def _coarsen(self, voxel_size: float) -> np.ndarray:
+        counts = self.counts
+        return voxel_downsample(self.centroids, self._rgb_sum[:self._size] / counts[:, None],
+                                voxel_size, weights=counts)